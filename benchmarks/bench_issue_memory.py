@@ -0,0 +1,60 @@
+"""Memory of issues kept in the process: the former dict-based Issue versus the slotted one.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_issue_memory [--issues 50000]
+"""
+import argparse
+import gc
+import json
+import re
+import tracemalloc
+from benchmarks.generators import raw_issues
+from ghia.ghia_issue import Issue
+
+
+class LegacyIssue:
+    """Issue representation before the slotted one, kept for comparison"""
+
+    def __init__(self, data):
+        self.data = data
+        self.number = data["number"]
+        self.title = data["title"]
+        self.body = data["body"]
+        self.labels = {label["name"] for label in data["labels"]}
+        self.assignees = {user["login"] for user in data["assignees"]}
+        self.url = data["html_url"]
+        self.repo_slug = re.match("^.*/([^/]+/[^/]+)$", data["repository_url"]).group(1)
+
+
+def measure(factory, payloads):
+    """Returns the bytes held by the issues built from the JSON payloads"""
+    gc.collect()
+    tracemalloc.start()
+    # Decode inside the measurement, so whatever the representation keeps of it is counted
+    issues = [factory(json.loads(payload)) for payload in payloads]
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del issues
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--issues", type=int, default=50000)
+    args = parser.parse_args()
+
+    payloads = [json.dumps(issue) for issue in raw_issues(args.issues)]
+    results = {
+        "issues": args.issues,
+        "legacy_bytes": measure(LegacyIssue, payloads),
+        "slotted_bytes": measure(Issue, payloads),
+        "slotted_raw_bytes": measure(lambda data: Issue(data, keep_raw=True), payloads),
+    }
+    results["saved_ratio"] = round(1 - results["slotted_bytes"] / results["legacy_bytes"], 3)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
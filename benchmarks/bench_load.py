@@ -0,0 +1,63 @@
+"""End-to-end load test: the ghia CLI against the fake GitHub API.
+
+Starts the fake server, runs `python -m ghia` on all of its repositories and reports the
+wall time, the issues processed per second and the API calls the run made.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_load [--repos 3] [--issues 1000] [--latency 0.05] [-- ghia options]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks import fake_github
+from benchmarks.generators import rules_config
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    fake_github.add_arguments(parser)
+    parser.add_argument("--users", type=int, default=50, help="users in the generated rules")
+    parser.add_argument("--patterns", type=int, default=3, help="patterns per user")
+    parser.add_argument("ghia_args", nargs="*", help="options passed to ghia, e.g. -- --jobs 8 --fetch-jobs 4")
+    args = parser.parse_args()
+
+    github = fake_github.from_arguments(args)
+    server = fake_github.start_server(github)
+
+    with tempfile.TemporaryDirectory() as directory:
+        auth = os.path.join(directory, "auth.cfg")
+        rules = os.path.join(directory, "rules.cfg")
+        with open(auth, "w") as file:
+            file.write("[github]\ntoken=fake-token\n")
+        with open(rules, "w") as file:
+            file.write(rules_config(args.users, args.patterns, args.seed))
+
+        command = [sys.executable, "-m", "ghia", "-a", auth, "-r", rules, "--org", fake_github.ORG,
+                   "--state-file", os.path.join(directory, "state.json"), *args.ghia_args]
+        start = time.perf_counter()
+        result = subprocess.run(command, capture_output=True, text=True,
+                                env=dict(os.environ, GHIA_API_URL=server.url))
+        elapsed = time.perf_counter() - start
+
+    server.shutdown()
+    issues = args.repos * args.issues
+    results = {
+        "command": ["ghia", *command[3:]],
+        "exit_code": result.returncode,
+        "issues": issues,
+        "seconds": round(elapsed, 3),
+        "issues_per_second": round(issues / elapsed, 1),
+        "reported_issues": result.stdout.count("\n-> ") + result.stdout.startswith("-> "),
+        "update_errors": result.stderr.count("Could not update issue"),
+        "api": github.stats(),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
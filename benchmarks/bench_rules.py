@@ -0,0 +1,156 @@
+"""Throughput and memory of the rules engine over synthetic issues and rule sets.
+
+For every rule set size and strategy it reports the evaluated issues per second, the cost
+per pattern and issue, and the memory of the compiled rules. Pattern-by-pattern matching
+(Pattern.match), the engine with and without the literal prefilter and issue parsing are
+measured as well. Results are written as JSON.
+
+All ways of matching must give the same results, the script exits with status 1 if they do not.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_rules [--users 10 100 1000 10000] [--output results.json]
+"""
+import argparse
+import configparser
+import datetime
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from benchmarks.generators import raw_issues, rules_config
+from ghia.ghia_issue import Issue
+from ghia.ghia_matcher import RuleEngine
+from ghia.ghia_patterns import GhiaPatterns
+
+STRATEGIES = ("append", "set", "change")
+
+
+def load_rules(users, patterns_per_user, seed):
+    config = configparser.ConfigParser()
+    config.optionxform = str
+    config.read_string(rules_config(users, patterns_per_user, seed))
+    return config
+
+
+def timed(func, items, min_seconds):
+    """Returns items per second of calling func on the items, repeated for at least min_seconds"""
+    count = 0
+    start = time.perf_counter()
+    while True:
+        for item in items:
+            func(item)
+        count += len(items)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return count / elapsed
+
+
+def compiled_memory(config):
+    """Returns (bytes, seconds) of loading and compiling the rules"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    ghia_patterns = GhiaPatterns(config)
+    ghia_patterns.engine
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, elapsed
+
+
+def naive_match(ghia_patterns):
+    """Matches the issue pattern by pattern the way the rules were evaluated before the engine"""
+    def match(issue):
+        return {username for username, patterns in ghia_patterns.patterns.items()
+                if any(pattern.match(issue) for pattern in patterns)}
+    return match
+
+
+def bench_rule_set(users, args, issues):
+    config = load_rules(users, args.patterns, args.seed)
+    memory, compile_seconds = compiled_memory(config)
+    ghia_patterns = GhiaPatterns(config)
+    patterns = users * args.patterns
+
+    result = {
+        "users": users,
+        "patterns": patterns,
+        "rules_bytes": memory,
+        "compile_ms": round(compile_seconds * 1000, 2),
+        "strategies": {},
+    }
+    for strategy in STRATEGIES:
+        ghia_patterns.set_strategy(strategy)
+        rate = timed(ghia_patterns.apply_to, issues, args.min_seconds)
+        result["strategies"][strategy] = {
+            "issues_per_second": round(rate, 1),
+            "ns_per_pattern": round(1e9 / rate / patterns, 2),
+        }
+
+    naive_issues = issues[:args.naive_issues]
+    naive_rate = timed(naive_match(ghia_patterns), naive_issues, args.min_seconds)
+    result["pattern_match"] = {
+        "issues_per_second": round(naive_rate, 1),
+        "ns_per_pattern": round(1e9 / naive_rate / patterns, 2),
+    }
+
+    # The engine prefilters by literals from RuleEngine.PREFILTER_MIN patterns on, measure both ways
+    expected = [ghia_patterns.engine.match(issue) for issue in issues]
+    identical = [naive_match(ghia_patterns)(issue) for issue in naive_issues] == expected[:len(naive_issues)]
+    result["prefilter"] = {}
+    for name, prefilter_min in (("always", 0), ("never", None)):
+        engine = RuleEngine(ghia_patterns.patterns, prefilter_min=prefilter_min)
+        if prefilter_min == 0:
+            # PREFILTER_MIN is compared with these counts of regexes with a literal per field
+            result["prefilter_regexes"] = {field: sum(len(buckets) for buckets in prefilter.buckets)
+                                           for field, prefilter in engine.prefilters.items() if prefilter}
+        identical = identical and [engine.match(issue) for issue in issues] == expected
+        rate = timed(engine.match, issues, args.min_seconds)
+        result["prefilter"][name] = {
+            "issues_per_second": round(rate, 1),
+            "ns_per_pattern": round(1e9 / rate / patterns, 2),
+        }
+    result["identical_results"] = identical
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--patterns", type=int, default=3, help="patterns per user")
+    parser.add_argument("--issues", type=int, default=500)
+    parser.add_argument("--naive-issues", type=int, default=50,
+                        help="issues matched pattern by pattern, which is slow for large rule sets")
+    parser.add_argument("--min-seconds", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="file for the JSON results, stdout by default")
+    args = parser.parse_args()
+
+    raw = raw_issues(args.issues, seed=args.seed)
+    issues = [Issue(data) for data in raw]
+    results = {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "params": vars(args),
+        "issue_parse_per_second": round(timed(Issue, raw, args.min_seconds), 1),
+        "rule_sets": [bench_rule_set(users, args, issues) for users in args.users],
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+    if not all(rule_set["identical_results"] for rule_set in results["rule_sets"]):
+        print("ERROR: the ways of matching gave different results", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
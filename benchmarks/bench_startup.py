@@ -0,0 +1,82 @@
+"""Startup overhead of the CLI: imports, `ghia --help` and loading a large rules file.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_startup [--runs 10] [--users 200] [--patterns 30]
+"""
+import argparse
+import configparser
+import json
+import statistics
+import subprocess
+import sys
+import time
+from benchmarks.generators import raw_issues, rules_config
+from ghia.ghia_issue import Issue
+from ghia.ghia_patterns import GhiaPatterns
+
+
+def import_times(module):
+    """Returns the {module: cumulative microseconds} of a fresh `python -X importtime -c 'import module'`"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def wall_time(args, runs):
+    """Returns the median wall time in milliseconds of running the command"""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(args, capture_output=True, check=True)
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 1)
+
+
+def rules_load(users, patterns):
+    """Returns milliseconds of loading the rules and of the first evaluation which compiles them"""
+    config = configparser.ConfigParser()
+    config.optionxform = str
+    config.read_string(rules_config(users, patterns))
+    issue = Issue(raw_issues(1)[0])
+
+    start = time.perf_counter()
+    ghia_patterns = GhiaPatterns(config)
+    loaded = time.perf_counter()
+    ghia_patterns.decide(issue)
+    evaluated = time.perf_counter()
+    return round((loaded - start) * 1000, 1), round((evaluated - loaded) * 1000, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--patterns", type=int, default=30)
+    args = parser.parse_args()
+
+    cli_imports = import_times("ghia.cli")
+    web_imports = import_times("ghia.web")
+    load_ms, first_decide_ms = rules_load(args.users, args.patterns)
+    results = {
+        "import_ghia_cli_ms": round(cli_imports["ghia.cli"] / 1000, 1),
+        "import_ghia_web_ms": round(web_imports["ghia.web"] / 1000, 1),
+        "cli_imports_flask": "flask" in cli_imports,
+        "python_startup_ms": wall_time([sys.executable, "-c", "pass"], args.runs),
+        "ghia_help_ms": wall_time([sys.executable, "-m", "ghia", "--help"], args.runs),
+        "rules": args.users * args.patterns,
+        "rules_load_ms": load_ms,
+        "rules_first_decide_ms": first_decide_ms,
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
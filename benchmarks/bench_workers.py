@@ -0,0 +1,92 @@
+"""Serial against process-pool rule evaluation, to find where the worker processes pay off.
+
+For every issue count it reports the seconds of evaluating the issues in this process and in
+a pool of worker processes, both with a new pool (startup and compiling the rules included)
+and with a warm one. The crossover is the smallest count at which a new pool is faster; it
+moves down with larger rule sets and longer issue bodies. Results are written as JSON.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_workers [--workers 4] [--counts 100 1000 10000] [--output results.json]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+from benchmarks.bench_rules import load_rules
+from benchmarks.generators import raw_issues
+from ghia.ghia_issue import Issue
+from ghia.ghia_parallel import ProcessEvaluator
+from ghia.ghia_patterns import GhiaPatterns
+
+
+def seconds(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def bench_count(ghia_patterns, issues, args):
+    def serial():
+        for issue in issues:
+            ghia_patterns.decide(issue)
+
+    evaluator = ProcessEvaluator(ghia_patterns, args.workers, chunk_size=args.chunk_size, min_issues=0)
+    try:
+        cold = seconds(lambda: list(evaluator.evaluate(issues)))
+        warm = seconds(lambda: list(evaluator.evaluate(issues)))
+    finally:
+        evaluator.close()
+
+    return {
+        "issues": len(issues),
+        "serial_s": round(seconds(serial), 4),
+        "pool_cold_s": round(cold, 4),
+        "pool_warm_s": round(warm, 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--counts", type=int, nargs="+", default=[100, 300, 1000, 3000, 10000])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--patterns", type=int, default=3, help="patterns per user")
+    parser.add_argument("--body-words", type=int, nargs=2, default=[200, 4000],
+                        help="minimum and maximum words of the issue bodies")
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="file for the JSON results, stdout by default")
+    args = parser.parse_args()
+
+    ghia_patterns = GhiaPatterns(load_rules(args.users, args.patterns, args.seed))
+    ghia_patterns.set_strategy("append")
+    ghia_patterns.engine
+    raw = raw_issues(max(args.counts), seed=args.seed, body_words=tuple(args.body_words))
+    issues = [Issue(data) for data in raw]
+
+    runs = [bench_count(ghia_patterns, issues[:count], args) for count in sorted(args.counts)]
+    crossover = next((run["issues"] for run in runs if run["pool_cold_s"] < run["serial_s"]), None)
+    results = {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "params": vars(args),
+        "runs": runs,
+        "crossover_issues": crossover,
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""Fake GitHub REST API serving generated issues from memory, for load testing without GitHub.
+
+It serves `GET /user`, `GET /orgs/{org}/repos`, paginated `GET /repos/{slug}/issues` with
+Link headers and `PATCH /repos/{slug}/issues/{number}`. Latency, error rate and the rate
+limit are configurable, `GET /_stats` returns the counts of the served calls.
+
+Run from the repository root and point ghia at it:
+
+    python -m benchmarks.fake_github --port 8000 --repos 3 --issues 1000
+    GHIA_API_URL=http://127.0.0.1:8000 ghia -a auth.cfg -r rules.cfg --org bench
+"""
+import argparse
+import collections
+import datetime
+import json
+import random
+import re
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from benchmarks.generators import label, raw_issues, user
+
+ORG = "bench"
+LOGIN = "ghia-bench"
+
+_ISSUES_RE = re.compile(r"^/repos/([^/]+/[^/]+)/issues$")
+_ISSUE_RE = re.compile(r"^/repos/([^/]+/[^/]+)/issues/(\d+)$")
+_ORG_REPOS_RE = re.compile(r"^/orgs/([^/]+)/repos$")
+
+
+def route(path):
+    """Returns the path with the slug and number replaced, to count the calls by endpoint"""
+    path = _ISSUES_RE.sub("/repos/{slug}/issues", path)
+    return _ISSUE_RE.sub("/repos/{slug}/issues/{number}", path)
+
+
+class FakeGitHub:
+    """In-memory store of the repositories with their issues, and the API behaviour settings"""
+
+    DEFAULT_PER_PAGE = 30
+    MAX_PER_PAGE = 100
+
+    def __init__(self, repos=1, issues=1000, seed=0, latency=0.0, jitter=0.0, error_rate=0.0,
+                 rate_limit=5000, rate_window=3600):
+        self.rng = random.Random(seed)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.repos = {}
+        for i in range(repos):
+            slug = f"{ORG}/repo{i}"
+            self.repos[slug] = {issue["number"]: issue for issue in raw_issues(issues, seed=seed + i, repo=slug)}
+
+        self.lock = threading.Lock()
+        self.calls = collections.Counter()
+        self.errors = collections.Counter()
+        self.rate_remaining = rate_limit
+        self.rate_reset = time.time() + rate_window
+
+    def rate_headers(self):
+        """Counts the request against the rate limit, returns its headers and if it is over the limit"""
+        with self.lock:
+            now = time.time()
+            if now >= self.rate_reset:
+                self.rate_remaining = self.rate_limit
+                self.rate_reset = now + self.rate_window
+            limited = self.rate_remaining == 0
+            if not limited:
+                self.rate_remaining -= 1
+            headers = {
+                "X-RateLimit-Limit": str(self.rate_limit),
+                "X-RateLimit-Remaining": str(self.rate_remaining),
+                "X-RateLimit-Reset": str(int(self.rate_reset)),
+            }
+        return headers, limited
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def fails(self):
+        return self.error_rate and random.random() < self.error_rate
+
+    def count(self, call, error=False):
+        with self.lock:
+            self.calls[call] += 1
+            if error:
+                self.errors[call] += 1
+
+    def stats(self):
+        with self.lock:
+            return {"calls": dict(self.calls), "errors": dict(self.errors),
+                    "total_calls": sum(self.calls.values()), "total_errors": sum(self.errors.values())}
+
+    def list_issues(self, slug, query):
+        """Returns the issues of the page and the number of pages"""
+        issues = [issue for issue in self.repos[slug].values() if issue["state"] == "open"]
+        since = query.get("since")
+        if since:
+            issues = [issue for issue in issues if issue["updated_at"] >= since]
+        if query.get("sort") == "updated":
+            issues.sort(key=lambda issue: issue["updated_at"], reverse=query.get("direction") != "asc")
+
+        per_page = min(int(query.get("per_page", self.DEFAULT_PER_PAGE)), self.MAX_PER_PAGE)
+        page = int(query.get("page", 1))
+        pages = max(1, -(-len(issues) // per_page))
+        return issues[(page - 1) * per_page:page * per_page], page, pages
+
+    def update_issue(self, slug, number, update):
+        with self.lock:
+            issue = self.repos[slug].get(number)
+            if issue is None:
+                return None
+            if "assignees" in update:
+                issue["assignees"] = [user(login, self.rng) for login in update["assignees"]]
+                issue["assignee"] = issue["assignees"][0] if issue["assignees"] else None
+            if "labels" in update:
+                issue["labels"] = [label(name, self.rng, slug) for name in update["labels"]]
+            issue["updated_at"] = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+            return dict(issue)
+
+
+def make_handler(github):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are separate writes, with Nagle's algorithm each call waits for a delayed ACK
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status, data, headers=None):
+            body = json.dumps(data).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def link_header(self, path, query, page, pages):
+            links = []
+            for rel, number in (("next", page + 1), ("last", pages)):
+                if page < pages:
+                    params = dict(query, page=str(number))
+                    url = f"http://{self.headers['Host']}{path}?{urllib.parse.urlencode(params)}"
+                    links.append(f'<{url}>; rel="{rel}"')
+            return ", ".join(links)
+
+        def handle_api(self, method):
+            parts = urllib.parse.urlsplit(self.path)
+            path = parts.path
+            query = dict(urllib.parse.parse_qsl(parts.query))
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+            if path == "/_stats":
+                return self.send_json(200, github.stats())
+
+            call = f"{method} {route(path)}"
+            github.delay()
+            headers, limited = github.rate_headers()
+            if limited:
+                github.count(call, error=True)
+                return self.send_json(403, {"message": "API rate limit exceeded"}, headers)
+            if github.fails():
+                github.count(call, error=True)
+                return self.send_json(502, {"message": "Server Error"}, headers)
+            github.count(call)
+
+            if method == "GET" and path == "/user":
+                return self.send_json(200, user(LOGIN, github.rng), headers)
+
+            match = _ORG_REPOS_RE.match(path)
+            if method == "GET" and match:
+                repos = [{"full_name": slug, "has_issues": True, "archived": False}
+                         for slug in github.repos if slug.startswith(match.group(1) + "/")]
+                return self.send_json(200, repos, headers)
+
+            match = _ISSUES_RE.match(path)
+            if method == "GET" and match and match.group(1) in github.repos:
+                issues, page, pages = github.list_issues(match.group(1), query)
+                link = self.link_header(path, query, page, pages)
+                if link:
+                    headers["Link"] = link
+                return self.send_json(200, issues, headers)
+
+            match = _ISSUE_RE.match(path)
+            if method == "PATCH" and match and match.group(1) in github.repos:
+                issue = github.update_issue(match.group(1), int(match.group(2)), json.loads(body or b"{}"))
+                if issue is not None:
+                    return self.send_json(200, issue, headers)
+
+            self.send_json(404, {"message": "Not Found"}, headers)
+
+        def do_GET(self):
+            self.handle_api("GET")
+
+        def do_PATCH(self):
+            self.handle_api("PATCH")
+
+    return Handler
+
+
+def start_server(github, host="127.0.0.1", port=0):
+    """Starts serving in a background thread, returns the server, its url is in `server.url`"""
+    server = ThreadingHTTPServer((host, port), make_handler(github))
+    server.daemon_threads = True
+    server.url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_arguments(parser):
+    parser.add_argument("--repos", type=int, default=1)
+    parser.add_argument("--issues", type=int, default=1000, help="issues per repository")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random +- seconds added to the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls answered by 502")
+    parser.add_argument("--rate-limit", type=int, default=5000, help="calls allowed in the rate window")
+    parser.add_argument("--rate-window", type=int, default=3600, help="seconds until the rate limit resets")
+
+
+def from_arguments(args):
+    return FakeGitHub(args.repos, args.issues, args.seed, args.latency, args.jitter, args.error_rate,
+                      args.rate_limit, args.rate_window)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = start_server(from_arguments(args), args.host, args.port)
+    print(f"Serving the fake GitHub API at {server.url}, organization {ORG!r}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
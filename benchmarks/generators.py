@@ -0,0 +1,143 @@
+"""Generators of synthetic GitHub API data for the benchmarks"""
+import random
+
+
+REPO = "mi-pyt-ghia/benchmark"
+API_URL = "https://api.github.com"
+
+
+def user(login, rng):
+    """Returns a user object as embedded in the issues by the REST API"""
+    user_id = rng.randrange(1, 10 ** 8)
+    return {
+        "login": login,
+        "id": user_id,
+        "node_id": f"MDQ6VXNlcj{user_id}",
+        "avatar_url": f"https://avatars.githubusercontent.com/u/{user_id}?v=4",
+        "gravatar_id": "",
+        "url": f"{API_URL}/users/{login}",
+        "html_url": f"https://github.com/{login}",
+        "followers_url": f"{API_URL}/users/{login}/followers",
+        "following_url": f"{API_URL}/users/{login}/following{{/other_user}}",
+        "gists_url": f"{API_URL}/users/{login}/gists{{/gist_id}}",
+        "starred_url": f"{API_URL}/users/{login}/starred{{/owner}}{{/repo}}",
+        "subscriptions_url": f"{API_URL}/users/{login}/subscriptions",
+        "organizations_url": f"{API_URL}/users/{login}/orgs",
+        "repos_url": f"{API_URL}/users/{login}/repos",
+        "events_url": f"{API_URL}/users/{login}/events{{/privacy}}",
+        "received_events_url": f"{API_URL}/users/{login}/received_events",
+        "type": "User",
+        "site_admin": False,
+    }
+
+
+def label(name, rng, repo=REPO):
+    label_id = rng.randrange(1, 10 ** 9)
+    return {
+        "id": label_id,
+        "node_id": f"MDU6TGFiZWw{label_id}",
+        "url": f"{API_URL}/repos/{repo}/labels/{name}",
+        "name": name,
+        "color": "%06x" % rng.randrange(0, 0xffffff),
+        "default": False,
+        "description": "",
+    }
+
+
+def raw_issue(number, title, body, labels, assignees, rng, repo=REPO, state="open"):
+    """Returns an issue with the same structure and size as the REST API listing returns"""
+    author = user(f"user{rng.randrange(1000)}", rng)
+    return {
+        "url": f"{API_URL}/repos/{repo}/issues/{number}",
+        "repository_url": f"{API_URL}/repos/{repo}",
+        "labels_url": f"{API_URL}/repos/{repo}/issues/{number}/labels{{/name}}",
+        "comments_url": f"{API_URL}/repos/{repo}/issues/{number}/comments",
+        "events_url": f"{API_URL}/repos/{repo}/issues/{number}/events",
+        "html_url": f"https://github.com/{repo}/issues/{number}",
+        "id": rng.randrange(1, 10 ** 9),
+        "node_id": f"MDU6SXNzdWU{number}",
+        "number": number,
+        "title": title,
+        "user": author,
+        "labels": [label(name, rng, repo) for name in labels],
+        "state": state,
+        "locked": False,
+        "assignee": user(assignees[0], rng) if assignees else None,
+        "assignees": [user(login, rng) for login in assignees],
+        "milestone": None,
+        "comments": rng.randrange(20),
+        "created_at": "2019-11-01T10:00:00Z",
+        "updated_at": "2019-11-%02dT%02d:%02d:00Z" % (rng.randrange(1, 29), rng.randrange(24), rng.randrange(60)),
+        "closed_at": None,
+        "author_association": "CONTRIBUTOR",
+        "body": body,
+        "reactions": {
+            "url": f"{API_URL}/repos/{repo}/issues/{number}/reactions",
+            "total_count": 0, "+1": 0, "-1": 0, "laugh": 0, "hooray": 0,
+            "confused": 0, "heart": 0, "rocket": 0, "eyes": 0,
+        },
+        "timeline_url": f"{API_URL}/repos/{repo}/issues/{number}/timeline",
+        "performed_via_github_app": None,
+    }
+
+
+WORDS = ("network protocol server client request response timeout error crash login page button "
+         "database query index cache memory leak thread lock deadlock file upload download http "
+         "localhost port config parser token user admin build test release docs typo feature bug "
+         "report stack trace exception null pointer python flask click render template").split()
+
+LABELS = ("bug enhancement question documentation duplicate wontfix invalid help-wanted "
+          "good-first-issue network networking frontend backend ui security performance").split()
+
+
+def text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def raw_issues(count, seed=0, repo=REPO, body_words=(20, 400), max_labels=4, max_assignees=3, logins=None):
+    """Returns a list of synthetic raw issues"""
+    rng = random.Random(seed)
+    logins = logins or [f"dev{i}" for i in range(50)]
+    issues = []
+    for number in range(1, count + 1):
+        issues.append(raw_issue(
+            number,
+            text(rng, rng.randint(3, 12)).capitalize(),
+            text(rng, int(rng.triangular(body_words[0], body_words[1], body_words[0] * 2))),
+            rng.sample(LABELS, rng.randint(0, max_labels)),
+            rng.sample(logins, rng.randint(0, max_assignees)),
+            rng,
+            repo,
+        ))
+    return issues
+
+
+PATTERN_KINDS = ("title", "text", "label", "any")
+
+
+def pattern(rng):
+    """Returns a rule line in the type:regex format, mixing literal words and small regexes"""
+    kind = rng.choice(PATTERN_KINDS)
+    if kind == "label":
+        return f"label:^{rng.choice(LABELS)}$"
+    first, second = rng.sample(WORDS, 2)
+    regex = rng.choice((
+        first,
+        f"{first}\\s+{second}",
+        f"({first}|{second})",
+        f"\\b{first}s?\\b",
+        f"{first}[0-9]{{1,3}}",
+    ))
+    return f"{kind}:{regex}"
+
+
+def rules_config(users, patterns_per_user, seed=0, fallback="Need assignment"):
+    """Returns the text of a rules config with the given number of users and patterns"""
+    rng = random.Random(seed)
+    lines = ["[patterns]"]
+    for i in range(users):
+        lines.append(f"dev{i}=")
+        lines.extend(f"    {pattern(rng)}" for _ in range(patterns_per_user))
+    if fallback:
+        lines += ["", "[fallback]", f"label={fallback}"]
+    return "\n".join(lines) + "\n"
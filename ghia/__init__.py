@@ -1,5 +1,12 @@
 from .cli import ghia
-from .web import create_app
 
 
 __all__ = ['ghia', 'create_app']
+
+
+def __getattr__(name):
+    # The web app pulls in Flask, it is imported only when asked for, not by every CLI run
+    if name == 'create_app':
+        from .web import create_app
+        return create_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,8 +1,20 @@
+import collections
+import os
 import re
+import time
 import click
 import configparser
+from concurrent.futures import ThreadPoolExecutor
+from .ghia_cache import HttpCache
+from .ghia_graphql import BACKENDS
 from .ghia_patterns import GhiaPatterns
+from .ghia_pipeline import pipeline_stage, run_ahead, BatchSubmitter
+from .ghia_reporters import REPORTERS, get_reporter
 from .ghia_requests import GhiaRequests
+from .ghia_state import RunState
+
+# How many update batches per job may wait for their turn in the report
+UPDATE_WINDOW = 4
 
 
 def validate_credentials_file(ctx, param, value):
@@ -45,9 +57,37 @@ def validate_reposlug(ctx, param, value):
     return value
 
 
+def validate_reposlugs(ctx, param, value):
+    return tuple(validate_reposlug(ctx, param, slug) for slug in value)
+
+
+def read_reposlugs_file(ctx, param, value):
+    """Reads repository slugs from the file, one per line, ignoring blank lines and # comments"""
+    if value is None:
+        return ()
+
+    slugs = []
+    for line in value:
+        line = line.split("#", 1)[0].strip()
+        if line:
+            slugs.append(validate_reposlug(ctx, param, line))
+    return tuple(slugs)
+
+
+class ReposlugsArgument(click.Argument):
+    """Repository slugs argument, named REPOSLUG in error messages like the single slug it replaced"""
+
+    def get_error_hint(self, ctx):
+        # Keeps the quoting of the click version
+        return super().get_error_hint(ctx).replace(self.metavar, "REPOSLUG")
+
+
 @click.command()
-@click.argument('REPOSLUG',
-                callback=validate_reposlug,
+@click.argument('reposlugs',
+                cls=ReposlugsArgument,
+                metavar='REPOSLUG...',
+                nargs=-1,
+                callback=validate_reposlugs,
                 type=click.STRING)
 @click.option('-s', '--strategy',
               help='How to handle assignment collisions.',
@@ -68,19 +108,258 @@ def validate_reposlug(ctx, param, value):
               required=True,
               type=click.File('r'),
               callback=validate_config_file)
-def ghia(reposlug, strategy, dry_run, config_auth, config_rules):
-    """CLI tool for automatic issue assigning of GitHub issues"""
+@click.option('--org',
+              metavar='NAME',
+              help='Process all repositories of the organization.',
+              multiple=True)
+@click.option('--repos-file',
+              metavar='FILENAME',
+              help='File with repository slugs, one per line.',
+              type=click.File('r'),
+              callback=read_reposlugs_file)
+@click.option('--repo-jobs',
+              metavar='N',
+              help='Number of repositories fetched concurrently.',
+              type=click.IntRange(min=1),
+              default=4,
+              show_default=True)
+@click.option('--fetch-jobs',
+              metavar='N',
+              help='Number of issue pages fetched concurrently.',
+              type=click.IntRange(min=1),
+              default=1,
+              show_default=True)
+@click.option('-j', '--jobs',
+              metavar='N',
+              help='Number of issue updates sent concurrently.',
+              type=click.IntRange(min=1),
+              default=1,
+              show_default=True)
+@click.option('--cache-dir',
+              metavar='DIRECTORY',
+              help='Directory for caching issue listings between runs.',
+              type=click.Path(file_okay=False))
+@click.option('--cache-size',
+              metavar='MB',
+              help='Size limit of the cache directory.',
+              type=click.IntRange(min=1),
+              default=100,
+              show_default=True)
+@click.option('-i', '--incremental',
+              is_flag=True,
+              help='Process only issues updated since the last run with the same rules.')
+@click.option('--state-file',
+              metavar='FILENAME',
+              help='File keeping the state of incremental runs.',
+              type=click.Path(dir_okay=False),
+              default=os.path.join(click.get_app_dir('ghia'), 'state.json'),
+              show_default=True)
+@click.option('--backend',
+              help='GitHub API used for listing and updating issues.',
+              type=click.Choice(sorted(BACKENDS)),
+              default='rest',
+              show_default=True)
+@click.option('--api-url',
+              metavar='URL',
+              help='Base URL of the GitHub API.',
+              envvar='GHIA_API_URL',
+              default=GhiaRequests.API_URL,
+              show_default=True)
+@click.option('--profile', 'profile_path',
+              metavar='FILENAME',
+              help='Write cProfile statistics of the run to the file and print its timings.',
+              type=click.Path(dir_okay=False, writable=True))
+@click.option('--profile-memory', 'profile_memory_path',
+              metavar='FILENAME',
+              help='Write the largest memory allocations of the run to the file and print its timings.',
+              type=click.Path(dir_okay=False, writable=True))
+@click.option('--workers',
+              help='Processes evaluating the rules of large repositories, 0 evaluates them in this process.',
+              type=click.IntRange(min=0),
+              default=0,
+              show_default=True)
+@click.option('--reporter',
+              help='Output of the results: colored changes, JSON Lines, counts per user or none.',
+              type=click.Choice(list(REPORTERS)),
+              default='human',
+              show_default=True)
+@click.pass_context
+def ghia(ctx, reposlugs, strategy, dry_run, config_auth, config_rules, org, repos_file, repo_jobs, fetch_jobs, jobs,
+         cache_dir, cache_size, incremental, state_file, backend, api_url, profile_path, profile_memory_path,
+         workers, reporter):
+    """CLI tool for automatic issue assigning of GitHub issues
+
+    Repositories are given as REPOSLUG arguments, in a file or by organization.
+    They share one connection pool and the rate limit budget of the token.
+    """
 
     token = config_auth
     ghia_patterns = config_rules
     ghia_patterns.set_strategy(strategy)
     ghia_patterns.set_dry_run(dry_run)
+    reporter = get_reporter(reporter)
+
+    profile = None
+    if profile_path or profile_memory_path:
+        # cProfile and tracemalloc are imported only by profiled runs
+        from .ghia_profile import RunProfile
+        profile = RunProfile(profile_path, profile_memory_path)
+        profile.instrument(ghia_patterns.engine)
+        profile.start()
+
+    cache = HttpCache(cache_dir, cache_size * 1024 * 1024) if cache_dir else None
+    req = BACKENDS[backend](token, pool_size=repo_jobs * fetch_jobs + jobs, cache=cache, api_url=api_url,
+                            observer=profile)
+
+    slugs = list(reposlugs) + list(repos_file)
+    for name in org:
+        slugs.extend(req.iter_org_repos(name))
+    slugs = list(dict.fromkeys(slugs))
+    if not slugs and not org:
+        raise click.MissingParameter(ctx=ctx, param=ctx.command.params[0])
+
+    state = RunState(state_file) if incremental else None
+    fingerprint = ghia_patterns.fingerprint()
+
+    def evaluate(issue):
+        return issue, ghia_patterns.decide(issue)
+
+    def profiled_evaluate(issue):
+        with profile.phase("evaluate"):
+            decision = ghia_patterns.decide(issue)
+        profile.evaluated()
+        return issue, decision
+
+    def start(slug):
+        """Starts fetching and evaluating the issues of the repository"""
+        client = req.for_repo(slug)
+        since = state.watermark(slug, fingerprint) if state else None
+        listing = client.iter_issues(workers=fetch_jobs, since=since)
+        if profile is not None:
+            listing = profile.timed_iter("list", listing)
+        if since:
+            # The incremental listing is ordered by `updated_at`, which the updates change: pages
+            # requested after an update would skip the issues it moved to the end of the order
+            listing = _drained(listing)
+        issues = pipeline_stage(listing)
+        if evaluator is not None:
+            evaluated = evaluator.evaluate(issues)
+            if profile is not None:
+                # The wait for the worker processes, which includes the wait for the listing
+                evaluated = profile.timed_iter("evaluate", _counted(evaluated, profile))
+            return client, pipeline_stage(evaluated)
+        return client, pipeline_stage(issues, profiled_evaluate if profile is not None else evaluate)
+
+    evaluator = None
+    if workers:
+        # Like multiprocessing, imported only when there are worker processes
+        from .ghia_parallel import ProcessEvaluator
+        evaluator = ProcessEvaluator(ghia_patterns, workers)
+    exit_code = 0
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        # Following repositories are fetched while the current one is reported
+        for slug, (client, evaluated) in run_ahead(slugs, start, repo_jobs):
+            try:
+                watermark = process_repo(reporter, client, evaluated, executor, jobs, dry_run, profile)
+            except SystemExit as e:
+                # The listing failed and the error is printed, continue with other repositories
+                exit_code = e.code
+                continue
+
+            # Dry runs change nothing, so the next run has to see the same issues again
+            if state and not dry_run:
+                state.set_watermark(slug, fingerprint, watermark)
+
+    if evaluator is not None:
+        evaluator.close()
+    ghia_patterns.close()
+    reporter.close()
+    if state and not dry_run:
+        state.save()
+    if profile is not None:
+        profile.finish()
+        profile.print_summary()
+    if exit_code:
+        exit(exit_code)
+
+
+def process_repo(reporter, req, evaluated, executor, jobs, dry_run, profile=None):
+    """Sends the updates of the evaluated issues and reports them in order.
+
+    Returns the watermark of the next incremental run: the latest `updated_at` seen, or
+    the earliest one of the failed updates, so the next run retries them.
+    """
+    last_updated_at = None
+    failed_updated_at = []
+
+    # Updates run in the pool, reports are printed in the issue order once their update is done
+    pending = collections.deque()
+    apply_decisions = req.apply_decisions if profile is None else profile.timed("update", req.apply_decisions)
+    updates = BatchSubmitter(executor, apply_decisions, req.BATCH_SIZE)
+
+    def report_next():
+        issue, _, future = pending[0]
+        if not _is_done(future):
+            # The update might still wait in an incomplete batch
+            updates.flush()
+        if not report_issue(reporter, *pending.popleft(), profile=profile) and issue.updated_at:
+            failed_updated_at.append(issue.updated_at)
+
+    try:
+        for issue, decision in evaluated:
+            if issue.updated_at and (last_updated_at is None or issue.updated_at > last_updated_at):
+                last_updated_at = issue.updated_at
+
+            future = None
+            if decision.changed and not dry_run:
+                # Limit the updates in flight when the rate limit budget runs low
+                while _in_flight(pending) >= req.suggested_workers(jobs) * req.BATCH_SIZE:
+                    report_next()
+                future = updates.add((issue, decision))
+            pending.append((issue, decision, future))
+
+            while len(pending) > jobs * req.BATCH_SIZE * UPDATE_WINDOW or (pending and _is_done(pending[0][2])):
+                report_next()
+    finally:
+        # Report the updates sent so far even if the listing fails midway
+        while pending:
+            report_next()
+
+    return min(failed_updated_at, default=last_updated_at)
+
+
+def _drained(iterable):
+    """Yields the items once the whole iterable is consumed"""
+    yield from list(iterable)
+
+
+def _counted(evaluated, profile):
+    for item in evaluated:
+        profile.evaluated()
+        yield item
+
+
+def _is_done(future):
+    return future is None or future.done()
+
+
+def _in_flight(pending):
+    return sum(1 for _, _, future in pending if not _is_done(future))
+
+
+def report_issue(reporter, issue, decision, future, profile=None):
+    """Waits for the update of the issue if there is one, reports the issue.
 
-    req = GhiaRequests(token, reposlug)
-    issues = req.get_issues()
+    Returns False if the update failed.
+    """
+    updated_issue = decision.apply(issue) if decision.changed else None
+    failed = False
+    if future is not None:
+        updated_issue = future.result()
+        failed = updated_issue is None
 
-    for issue in issues:
-        updated_issue = ghia_patterns.apply_to(issue)
-        if updated_issue and not dry_run:
-            updated_issue = req.update_issue(updated_issue)
-        ghia_patterns.print_report(issue, updated_issue)
+    start = time.perf_counter()
+    reporter.report(issue, decision, updated_issue, failed)
+    if profile is not None:
+        profile.add("output", time.perf_counter() - start)
+    return not failed
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import parse_header_links
+
+
+class CachedResponse:
+    """Response of a conditional request answered by 304 Not Modified, served from the cache"""
+
+    status_code = 200
+
+    def __init__(self, entry, response):
+        self.url = entry["url"]
+        self.text = entry["body"]
+        # Rate limit and other headers are the fresh ones from the 304 response
+        self.headers = CaseInsensitiveDict(response.headers)
+        if entry.get("link"):
+            self.headers["Link"] = entry["link"]
+        self.from_cache = True
+
+    @property
+    def links(self):
+        """Parsed Link header the same way as requests does it"""
+        result = {}
+        for link in parse_header_links(self.headers.get("Link", "")):
+            result[link.get("rel") or link.get("url")] = link
+        return result
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class HttpCache:
+    """On-disk cache of GET responses for conditional requests.
+
+    Entries are keyed by the url and the token and keep the ETag, Last-Modified and Link
+    headers with the body. The least recently used entries are removed when the cache
+    grows over `max_bytes`.
+    """
+
+    HTTP_OK = 200
+    HTTP_NOT_MODIFIED = 304
+    DEFAULT_MAX_BYTES = 100 * 1024 * 1024
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(size for _, _, size in self._entries())
+
+    @staticmethod
+    def key(token, url, params=None):
+        """Returns the cache key of the request"""
+        full_url = requests.Request('GET', url, params=params).prepare().url
+        return hashlib.sha256(f"{token}\n{full_url}".encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def _entries(self):
+        """Yields (path, mtime, size) of all cache entries"""
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            yield path, stat.st_mtime, stat.st_size
+
+    def load(self, key):
+        """Returns the cached entry or None"""
+        try:
+            with open(self._path(key)) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def conditional_headers(self, key):
+        """Returns the headers which make the request conditional on the cached entry"""
+        entry = self.load(key)
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def process(self, key, response):
+        """Stores a fresh response, replaces 304 Not Modified with the cached one"""
+        if response.status_code == self.HTTP_NOT_MODIFIED:
+            entry = self.load(key)
+            if entry is not None:
+                self._touch(key)
+                return CachedResponse(entry, response)
+        elif response.status_code == self.HTTP_OK:
+            self.store(key, response)
+        return response
+
+    def store(self, key, response):
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return
+
+        entry = {
+            "url": response.url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "link": response.headers.get("Link"),
+            "body": response.text,
+        }
+        data = json.dumps(entry).encode()
+        if len(data) > self.max_bytes:
+            return
+
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+
+        with self._lock:
+            try:
+                self._size -= os.path.getsize(path)
+            except OSError:
+                pass
+            os.replace(tmp_path, path)
+            self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _touch(self, key):
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        """Removes the least recently used entries until the cache fits its size cap"""
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        self._size = sum(size for _, _, size in entries)
+        for path, _, size in entries:
+            if self._size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._size -= size
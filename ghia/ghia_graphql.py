@@ -0,0 +1,209 @@
+import threading
+import time
+import requests
+from .ghia_issue import Issue, UPDATE_FIELDS
+from .ghia_requests import GhiaRequests
+
+
+ISSUE_FIELDS = '''
+fragment GhiaIssue on Issue {
+  id
+  number
+  title
+  body
+  url
+  updatedAt
+  labels(first: 100) { nodes { name } }
+  assignees(first: 100) { nodes { login } }
+}
+'''
+
+ISSUES_QUERY = '''
+query GhiaIssues($owner: String!, $name: String!, $cursor: String, $since: DateTime) {
+  repository(owner: $owner, name: $name) {
+    issues(first: 100, after: $cursor, states: OPEN, filterBy: {since: $since},
+           orderBy: {field: UPDATED_AT, direction: ASC}) {
+      pageInfo { hasNextPage endCursor }
+      nodes { ...GhiaIssue }
+    }
+  }
+}
+''' + ISSUE_FIELDS
+
+VIEWER_QUERY = '''
+query GhiaViewer {
+  viewer { login url avatarUrl }
+}
+'''
+
+
+class GhiaGraphQL(GhiaRequests):
+    """GitHub GraphQL API backend with the same interface as the REST one.
+
+    Issues are listed with only the fields GHIA reads, 100 per query. Updates are sent
+    in batches of aliased updateIssue mutations, users and labels are resolved to their
+    node ids once and cached. Unlike the REST listing, pull requests are not listed.
+    """
+
+    BATCH_SIZE = 20
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._ids_lock = threading.Lock()
+        self._user_ids = {}
+        self._label_ids = {}
+
+    def for_repo(self, slug):
+        """Returns a client of another repository, user ids are shared, label ids are per repository"""
+        client = super().for_repo(slug)
+        client._label_ids = {}
+        return client
+
+    def query(self, query, variables=None, operation=None):
+        """Runs the GraphQL query, returns the response JSON or None if the request failed"""
+        try:
+            r = self.request('POST', f'{self.api_url}/graphql', json={
+                "query": query,
+                "variables": variables or {},
+                "operationName": operation,
+            })
+        except requests.exceptions.RequestException:
+            return None
+
+        if r.status_code != self.HTTP_OK:
+            return None
+
+        start = time.perf_counter()
+        data = r.json()
+        if self.observer is not None:
+            self.observer.add("decode", time.perf_counter() - start)
+        return data
+
+    def get_user(self):
+        res = self.query(VIEWER_QUERY, operation="GhiaViewer")
+        if res is None or not (res.get("data") or {}).get("viewer"):
+            raise RuntimeError("Could not fetch Github user identity.")
+
+        viewer = res["data"]["viewer"]
+        return {"login": viewer["login"], "html_url": viewer["url"], "avatar_url": viewer["avatarUrl"]}
+
+    def iter_issues(self, workers=1, since=None):
+        """Yields open issues of the repository page by page.
+
+        Cursor pagination cannot be parallelized, so `workers` is ignored.
+        """
+        owner, name = self.slug.split("/")
+        cursor = None
+        while True:
+            res = self.query(ISSUES_QUERY, {"owner": owner, "name": name, "cursor": cursor, "since": since},
+                             operation="GhiaIssues")
+            repository = ((res or {}).get("data") or {}).get("repository")
+            if repository is None:
+                self._issues_error()
+
+            issues = repository["issues"]
+            for node in issues["nodes"]:
+                yield Issue.from_graphql(node, self.slug)
+
+            if not issues["pageInfo"]["hasNextPage"]:
+                return
+            cursor = issues["pageInfo"]["endCursor"]
+
+    def _missing(self, names, known):
+        with self._ids_lock:
+            return sorted(set(names) - set(known))
+
+    def _store_ids(self, names, alias, data, known):
+        with self._ids_lock:
+            for i, name in enumerate(names):
+                node = data.get(f"{alias}{i}")
+                if node:
+                    known[name] = node["id"]
+
+    def _resolve_users(self, logins):
+        """Fetches node ids of the users not seen yet with one aliased query"""
+        missing = self._missing(logins, self._user_ids)
+        if not missing:
+            return
+
+        variables = {f"u{i}": login for i, login in enumerate(missing)}
+        declarations = ", ".join(f"${var}: String!" for var in variables)
+        fields = " ".join(f"{var}: user(login: ${var}) {{ id }}" for var in variables)
+        res = self.query(f"query GhiaUsers({declarations}) {{ {fields} }}", variables, operation="GhiaUsers")
+        self._store_ids(missing, "u", (res or {}).get("data") or {}, self._user_ids)
+
+    def _resolve_labels(self, names):
+        """Fetches node ids of the repository labels not seen yet with one aliased query"""
+        missing = self._missing(names, self._label_ids)
+        if not missing:
+            return
+
+        owner, name = self.slug.split("/")
+        variables = {f"l{i}": label for i, label in enumerate(missing)}
+        declarations = ", ".join(f"${var}: String!" for var in variables)
+        fields = " ".join(f"{var}: label(name: ${var}) {{ id }}" for var in variables)
+        query = f"query GhiaLabels($owner: String!, $name: String!, {declarations}) " \
+                f"{{ repository(owner: $owner, name: $name) {{ {fields} }} }}"
+        res = self.query(query, dict(variables, owner=owner, name=name), operation="GhiaLabels")
+        repository = ((res or {}).get("data") or {}).get("repository") or {}
+        self._store_ids(missing, "l", repository, self._label_ids)
+
+    def _update_many(self, updates):
+        """Sends the (issue, fields) updates in one request of aliased mutations.
+
+        Only the given fields of each issue are set. Issues referring to users or labels
+        without a node id (e.g. a fallback label which does not exist yet) go through the
+        REST API, which creates missing labels.
+        Returns the list of updated issues with None for the failed ones.
+        """
+        updates = list(updates)
+        self._resolve_users({user for issue, fields in updates if "assignees" in fields
+                             for user in issue.assignees})
+        self._resolve_labels({label for issue, fields in updates if "labels" in fields
+                              for label in issue.labels})
+
+        results = [None] * len(updates)
+        variables = {}
+        for i, (issue, fields) in enumerate(updates):
+            update = {"id": issue.node_id}
+            if "assignees" in fields:
+                update["assigneeIds"] = [self._user_ids.get(user) for user in sorted(issue.assignees)]
+            if "labels" in fields:
+                update["labelIds"] = [self._label_ids.get(label) for label in sorted(issue.labels)]
+
+            if issue.node_id is None or None in update.get("assigneeIds", ()) or None in update.get("labelIds", ()):
+                results[i] = super().update_issue(issue, quiet=True, fields=fields)
+                continue
+            variables[f"i{i}"] = update
+
+        if not variables:
+            return results
+
+        declarations = ", ".join(f"${var}: UpdateIssueInput!" for var in variables)
+        mutations = " ".join(f"m{var}: updateIssue(input: ${var}) {{ issue {{ ...GhiaIssue }} }}"
+                             for var in variables)
+        res = self.query(f"mutation GhiaUpdate({declarations}) {{ {mutations} }}" + ISSUE_FIELDS,
+                         variables, operation="GhiaUpdate")
+        data = (res or {}).get("data") or {}
+
+        for i in range(len(updates)):
+            payload = data.get(f"mi{i}")
+            if payload and payload.get("issue"):
+                results[i] = Issue.from_graphql(payload["issue"], self.slug)
+        return results
+
+    def update_issue(self, issue, quiet=False, fields=UPDATE_FIELDS):
+        """Sends the issue fields (assignees, labels), returns the updated issue or None on failure.
+
+        Unless quiet, the failure is reported right away.
+        """
+        updated_issue = self._update_many([(issue, fields)])[0]
+        if updated_issue is None and not quiet:
+            self.print_update_error(issue)
+        return updated_issue
+
+
+BACKENDS = {
+    "rest": GhiaRequests,
+    "graphql": GhiaGraphQL,
+}
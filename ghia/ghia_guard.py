@@ -0,0 +1,74 @@
+import re
+import threading
+
+
+class PatternTimeout(Exception):
+    """The search of a regex took longer than its budget and was abandoned"""
+
+    def __init__(self, source, budget):
+        super().__init__(f"search of {source!r} abandoned after {budget} s")
+        self.source = source
+        self.budget = budget
+
+
+def _serve(conn):
+    conn.send("ready")
+    regexes = {}
+    while True:
+        try:
+            source, value = conn.recv()
+        except EOFError:
+            return
+        regex = regexes.get(source)
+        if regex is None:
+            regex = regexes[source] = re.compile(source, flags=re.IGNORECASE)
+        conn.send(regex.search(value) is not None)
+
+
+class RegexGuard:
+    """Runs regex searches in a helper process and abandons those which exceed the time budget.
+
+    A search in the `re` module cannot be interrupted, so a runaway one is stopped by killing
+    the helper, which is started again for the next search. Searches of all threads go
+    through one helper one at a time, it is meant only for the few risky patterns.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self._process = None
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        # Imported with the first risky search, runs without one do not pay for it
+        import multiprocessing
+        context = multiprocessing.get_context("spawn")
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(target=_serve, args=(child_conn,), daemon=True)
+        self._process.start()
+        child_conn.close()
+        # The start of the helper does not count to the budget of the first search
+        self._conn.recv()
+
+    def _stop(self):
+        self._process.kill()
+        self._process.join()
+        self._conn.close()
+        self._process = None
+        self._conn = None
+
+    def search(self, source, value):
+        """Tells if the case-insensitive regex matches the value, raises PatternTimeout past the budget"""
+        with self._lock:
+            if self._process is None:
+                self._start()
+            self._conn.send((source, value))
+            if self._conn.poll(self.budget):
+                return self._conn.recv()
+            self._stop()
+        raise PatternTimeout(source, self.budget)
+
+    def close(self):
+        with self._lock:
+            if self._process is not None:
+                self._stop()
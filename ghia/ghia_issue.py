@@ -1,17 +1,38 @@
+import functools
 import json
 import re
+import sys
+
+
+REPO_SLUG_RE = re.compile("^.*/([^/]+/[^/]+)$")
+UPDATE_FIELDS = ("assignees", "labels")
+
+
+@functools.lru_cache(maxsize=None)
+def repo_slug_from_url(repository_url):
+    """Returns the owner/repository part of the repository API url"""
+    return sys.intern(REPO_SLUG_RE.match(repository_url).group(1))
 
 
 class Issue:
-    """Issue representation for the purposes of GHIA"""
+    """Issue representation for the purposes of GHIA.
 
-    def __init__(self, data):
-        self.data = data
+    Only the fields used by the rules and the updates are kept. Label and user names repeat
+    across issues, so they are interned. The raw API data are kept only with `keep_raw`.
+    """
+
+    __slots__ = ("data", "number", "body", "title", "repo_slug", "url", "updated_at", "node_id",
+                 "assignees", "labels")
+
+    def __init__(self, data, keep_raw=False):
+        self.data = data if keep_raw else None
         self.number = None
         self.body = None
         self.title = None
         self.repo_slug = None
         self.url = None
+        self.updated_at = None
+        self.node_id = None
         self.assignees = set()
         self.labels = set()
         self.parse(data)
@@ -23,13 +44,30 @@ class Issue:
         self.body = data["body"]
 
         for label in data["labels"]:
-            self.labels.add(label["name"])
+            self.labels.add(sys.intern(label["name"]))
 
         for user in data["assignees"]:
-            self.assignees.add(user["login"])
+            self.assignees.add(sys.intern(user["login"]))
 
         self.url = data["html_url"]
-        self.repo_slug = re.match("^.*/([^/]+/[^/]+)$", data["repository_url"]).group(1)
+        self.updated_at = data.get("updated_at")
+        self.node_id = data.get("node_id")
+        self.repo_slug = repo_slug_from_url(data["repository_url"])
+
+    @classmethod
+    def from_graphql(cls, node, repo_slug):
+        """Creates the issue from a GraphQL Issue node"""
+        return cls({
+            "number": node["number"],
+            "title": node["title"],
+            "body": node["body"],
+            "labels": node["labels"]["nodes"],
+            "assignees": node["assignees"]["nodes"],
+            "html_url": node["url"],
+            "updated_at": node["updatedAt"],
+            "node_id": node["id"],
+            "repository_url": f"https://api.github.com/repos/{repo_slug}",
+        })
 
     def __str__(self):
         """Debug string representation of issue"""
@@ -41,10 +79,7 @@ class Issue:
         res += f"Assigned: {self.assignees}\n"
         return res
 
-    def get_update_json(self):
-        """Returns json to send to Github API to update labels, assignees"""
-        res = {
-            "assignees": list(self.assignees),
-            "labels": list(self.labels),
-        }
+    def get_update_json(self, fields=UPDATE_FIELDS):
+        """Returns json to send to Github API to update the given fields (labels, assignees)"""
+        res = {field: list(getattr(self, field)) for field in fields}
         return json.dumps(res)
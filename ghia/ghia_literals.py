@@ -0,0 +1,119 @@
+import collections
+try:
+    from re import _parser as sre_parse    # Python 3.11+
+except ImportError:
+    import sre_parse
+
+
+# Shortest literal worth prefiltering on, shorter ones occur in almost any text
+MIN_LITERAL = 3
+
+_DOTTED_I = {0x130: "i"}
+_FINAL_SIGMA = {0x3c2: "σ"}
+# Operations which match no text, the literals around them are adjacent in the text
+_ZERO_WIDTH_OPS = {"AT", "ASSERT", "ASSERT_NOT"}
+_REPEAT_OPS = {"MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT"}
+
+
+def fold(text):
+    """Returns the text folded so that all characters equal under re.IGNORECASE fold the same.
+
+    The regex engine compares characters by their simple lowercase, and also equates characters
+    with the same uppercase (like s and long s). Folding is done character by character, so a
+    text matched by a literal ignoring case contains the folded literal in its folded form.
+    Folding can equate more characters than the regex engine does, never fewer.
+    """
+    if "İ" in text:
+        # The only character whose full lowercase differs from the simple one used by the engine
+        text = text.translate(_DOTTED_I)
+    # Lowercase and uppercase depend on the context only for the final sigma
+    return text.lower().upper().lower().translate(_FINAL_SIGMA)
+
+
+def _literal_runs(parsed, runs, run):
+    """Collects the sequences of literal characters every match of the parsed regex contains.
+
+    `run` is the sequence being built, it is returned as it may continue after the subpattern.
+    """
+    for op, av in parsed:
+        op = str(op)
+        if op == "LITERAL":
+            run.append(chr(av))
+        elif op in _ZERO_WIDTH_OPS:
+            continue
+        elif op == "SUBPATTERN":
+            run = _literal_runs(av[-1], runs, run)
+        elif op == "ATOMIC_GROUP":
+            run = _literal_runs(av, runs, run)
+        elif op in _REPEAT_OPS and av[0] >= 1:
+            # The repeated part occurs at least once, but not next to the literals around it
+            runs.append(run)
+            runs.append(_literal_runs(av[2], runs, []))
+            run = []
+        else:
+            runs.append(run)
+            run = []
+    return run
+
+
+def required_literal(source):
+    """Returns the folded literal every match of the regex contains, the longest one found.
+
+    Returns None if the regex has no literal of at least MIN_LITERAL characters.
+    """
+    parsed = sre_parse.parse(source)
+    runs = []
+    runs.append(_literal_runs(parsed, runs, []))
+    literal = max((fold("".join(run)) for run in runs), key=len)
+    return literal if len(literal) >= MIN_LITERAL else None
+
+
+class LiteralMatcher:
+    """Aho-Corasick automaton telling which of the literals occur in a text, in one pass over it"""
+
+    def __init__(self, literals):
+        self.literals = list(literals)
+        goto = [{}]
+        outputs = [()]
+        for index, literal in enumerate(self.literals):
+            state = 0
+            for char in literal:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = goto[state][char] = len(goto)
+                    goto.append({})
+                    outputs.append(())
+                state = next_state
+            outputs[state] += (index,)
+
+        # Failure links in breadth-first order, a state also outputs the literals of its failure state
+        fail = [0] * len(goto)
+        queue = collections.deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                target = fail[state]
+                while target and char not in goto[target]:
+                    target = fail[target]
+                fail[next_state] = goto[target].get(char, 0)
+                outputs[next_state] += outputs[fail[next_state]]
+
+        self._goto = goto
+        self._fail = fail
+        self._outputs = outputs
+
+    def find(self, text):
+        """Returns the indexes of the literals occurring in the folded text"""
+        goto = self._goto
+        fail = self._fail
+        outputs = self._outputs
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if outputs[state]:
+                found.update(outputs[state])
+        return found
@@ -0,0 +1,482 @@
+import collections
+import functools
+import hashlib
+import re
+import threading
+import warnings
+import click
+from .ghia_guard import PatternTimeout, RegexGuard
+from .ghia_literals import LiteralMatcher, fold, required_literal
+try:
+    from re import _parser as sre_parse    # Python 3.11+
+except ImportError:
+    import sre_parse
+
+
+FIELDS = ("title", "text", "label")
+
+
+def parse_regex(source):
+    """Parses the regex source the same way as the Pattern compiles it"""
+    return sre_parse.parse(source, re.IGNORECASE)
+
+
+def validate_regex(source):
+    """Checks the regex without compiling it, raises re.error like re.compile would"""
+    parsed = parse_regex(source)
+    for op, av in iter_ops(parsed):
+        # The only error re.compile finds after parsing
+        if str(op) in ("ASSERT", "ASSERT_NOT") and av[0] < 0:
+            low, high = av[1].getwidth()
+            if low != high:
+                raise re.error("look-behind requires fixed-width pattern")
+
+
+def iter_subpatterns(av):
+    """Yields all subpatterns nested in the argument of a parsed regex item"""
+    if isinstance(av, sre_parse.SubPattern):
+        yield av
+    elif isinstance(av, (tuple, list)):
+        for item in av:
+            yield from iter_subpatterns(item)
+
+
+def iter_ops(parsed):
+    """Walks the parsed regex recursively and yields all (opcode, argument) pairs"""
+    for op, av in parsed:
+        yield op, av
+        for sub in iter_subpatterns(av):
+            yield from iter_ops(sub)
+
+
+_REPEAT_OPS = {"MAX_REPEAT", "MIN_REPEAT"}
+# Nothing inside these is backtracked into
+_ATOMIC_OPS = {"ATOMIC_GROUP", "POSSESSIVE_REPEAT"}
+
+
+def _iter_backtracking_ops(parsed):
+    for op, av in parsed:
+        yield op, av
+        if str(op) not in _ATOMIC_OPS:
+            for sub in iter_subpatterns(av):
+                yield from _iter_backtracking_ops(sub)
+
+
+# Sources of the categories in a character class
+_CATEGORIES = {
+    "CATEGORY_DIGIT": r"\d", "CATEGORY_NOT_DIGIT": r"\D",
+    "CATEGORY_SPACE": r"\s", "CATEGORY_NOT_SPACE": r"\S",
+    "CATEGORY_WORD": r"\w", "CATEGORY_NOT_WORD": r"\W",
+}
+# Characters on which the first characters of alternatives are compared
+_SAMPLE = "".join(map(chr, range(0x250)))
+
+
+def _first_class(parsed):
+    """Returns the source of a character class of the characters the parsed regex starts with.
+
+    Returns None when the first item is not a single character or a group starting with one.
+    """
+    if not parsed:
+        return None
+    op, av = parsed[0]
+    op = str(op)
+    if op == "LITERAL":
+        return f"[{re.escape(chr(av))}]"
+    elif op == "NOT_LITERAL":
+        return f"[^{re.escape(chr(av))}]"
+    elif op == "ANY":
+        return "."
+    elif op == "IN":
+        items = []
+        for item_op, item_av in av:
+            item_op = str(item_op)
+            if item_op == "NEGATE":
+                items.append("^")
+            elif item_op == "LITERAL":
+                items.append(re.escape(chr(item_av)))
+            elif item_op == "RANGE":
+                items.append(f"{re.escape(chr(item_av[0]))}-{re.escape(chr(item_av[1]))}")
+            elif item_op == "CATEGORY" and str(item_av) in _CATEGORIES:
+                items.append(_CATEGORIES[str(item_av)])
+            else:
+                return None
+        return f"[{''.join(items)}]"
+    elif op == "SUBPATTERN":
+        return _first_class(av[-1])
+    elif op in _REPEAT_OPS and av[0] > 0:
+        return _first_class(av[2])
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def _class_chars(source):
+    return frozenset(re.findall(source, _SAMPLE, flags=re.IGNORECASE))
+
+
+def _overlapping(branches):
+    """Tells if a text may be matched by more than one of the alternatives.
+
+    Alternatives overlap when one of them may match nothing or two may start with the same character.
+    """
+    seen = set()
+    for branch in branches:
+        source = _first_class(branch)
+        if branch.getwidth()[0] == 0 or source is None:
+            return True
+        chars = _class_chars(source)
+        if seen & chars:
+            return True
+        seen |= chars
+    return False
+
+
+def is_risky(source):
+    """Tells if the regex may backtrack catastrophically.
+
+    It looks for a repeated group containing an unbounded quantifier, like `(a+)+` or `(ab*)*`,
+    or an alternation whose alternatives overlap, like `(a|aa)+` or `(x|.y)*`. The search time
+    of such a regex can grow exponentially with the text. Some safe regexes are flagged too.
+    """
+    for op, av in _iter_backtracking_ops(parse_regex(source)):
+        if str(op) in _REPEAT_OPS and av[1] > 1:
+            for inner_op, inner_av in _iter_backtracking_ops(av[2]):
+                if str(inner_op) in _REPEAT_OPS and inner_av[1] == sre_parse.MAXREPEAT:
+                    return True
+                if str(inner_op) == "BRANCH" and _overlapping(inner_av[1]):
+                    return True
+    return False
+
+
+def cap_text(value, cap):
+    """Returns the value cut to at most `cap` bytes of UTF-8, without splitting a character"""
+    if len(value) * 4 <= cap:
+        return value
+    head = value[:cap]
+    encoded = head.encode("utf-8", "surrogatepass")
+    if len(encoded) <= cap:
+        return head
+    return encoded[:cap].decode("utf-8", "ignore")
+
+
+def report_abandoned(field, error, issue):
+    click.secho("WARNING", fg="yellow", bold=True, nl=False, err=True)
+    click.echo(f": Pattern {field}:{error.source} abandoned on issue {issue.repo_slug}#{issue.number} "
+               f"after {error.budget} s", err=True)
+
+
+_BASE_FLAGS = parse_regex("").state.flags
+_GROUPREF_OPS = {str(op) for op in ("GROUPREF", "GROUPREF_EXISTS", "GROUPREF_IGNORE",
+                                    "GROUPREF_LOC_IGNORE", "GROUPREF_UNI_IGNORE")}
+
+
+def is_combinable(source):
+    """Checks if the regex keeps its meaning when it is a branch of a bigger regex.
+
+    Named groups, backreferences and global inline flags would clash with other branches.
+    """
+    try:
+        parsed = parse_regex(source)
+        # A global inline flag is rejected inside a group even when it changes nothing, like (?i)
+        # (an error since Python 3.11, a deprecation warning before)
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", DeprecationWarning)
+            parse_regex(f"(?:{source})")
+    except (re.error, DeprecationWarning):
+        return False
+
+    if parsed.state.groupdict or parsed.state.flags != _BASE_FLAGS:
+        return False
+
+    return not any(str(op) in _GROUPREF_OPS for op, _ in iter_ops(parsed))
+
+
+class _Entry:
+    """Single distinct regex of a field together with the users whose patterns use it.
+
+    The regex is compiled only when it is needed, an entry of a bucket alternation is not
+    until the alternation matches. `cap` limits the bytes of the text it searches.
+    """
+
+    __slots__ = ("source", "_regex", "users", "cap")
+
+    def __init__(self, source, cap=None):
+        self.source = source
+        self._regex = None
+        self.users = set()
+        self.cap = cap
+
+    @property
+    def regex(self):
+        if self._regex is None:
+            self._regex = re.compile(self.source, flags=re.IGNORECASE)
+        return self._regex
+
+
+class _GuardedRegex:
+    """Regex searched by the RegexGuard within its time budget"""
+
+    __slots__ = ("source", "guard")
+
+    def __init__(self, source, guard):
+        self.source = source
+        self.guard = guard
+
+    def search(self, value):
+        return self.guard.search(self.source, value)
+
+
+class _Bucket:
+    """Group of entries with the same cap scanned at once by a single alternation"""
+
+    __slots__ = ("regex", "entries", "users", "cap")
+
+    def __init__(self, entries, guard=None):
+        self.entries = entries
+        self.users = frozenset().union(*(entry.users for entry in entries))
+        self.cap = entries[0].cap
+        if guard is not None:
+            self.regex = _GuardedRegex(entries[0].source, guard)
+        elif len(entries) > 1:
+            self.regex = re.compile("|".join(f"(?:{entry.source})" for entry in entries),
+                                    flags=re.IGNORECASE)
+        else:
+            self.regex = entries[0].regex
+
+
+class _Prefilter:
+    """Entries of a field with a required literal, found by one Aho-Corasick pass over the field.
+
+    Only the entries whose literal occurs in the field are searched, each by its own regex.
+    """
+
+    __slots__ = ("matcher", "buckets", "cap")
+
+    def __init__(self, entry_literals, guard=None, guard_all=False):
+        buckets = {}
+        for entry, literal in entry_literals:
+            guarded = guard_all or is_risky(entry.source)
+            buckets.setdefault(literal, []).append(_Bucket([entry], guard if guarded else None))
+        self.matcher = LiteralMatcher(buckets)
+        self.buckets = list(buckets.values())
+        # Literals are looked for only in the text the entries search
+        caps = [entry.cap for entry, _ in entry_literals]
+        self.cap = None if None in caps else max(caps)
+
+    def candidates(self, values):
+        """Returns the buckets whose literal occurs in any of the values"""
+        found = set()
+        for value in values:
+            found |= self.matcher.find(fold(value))
+        return [bucket for index in sorted(found) for bucket in self.buckets[index]]
+
+
+class RuleEngine:
+    """Compiled form of the whole rule set.
+
+    Patterns are grouped by the issue field they read, identical regexes of different
+    users are scanned only once and the regexes of a field are merged into alternations,
+    so a field which does not match a bucket rejects all of its patterns in one scan.
+
+    Risky regexes (see is_risky) are searched alone, by a RegexGuard when there is a `budget`
+    in seconds. Searches over the budget are abandoned, reported by `abandoned` and do not match.
+    With `guard_all` all regexes of the text field are searched that way, as is_risky may miss some.
+
+    When a field has at least `prefilter_min` regexes with a required literal, they are left
+    out of the alternations and only those whose literal occurs in the field are searched.
+    Scanning for the literals costs a pass in Python, so it pays off only for many regexes.
+    """
+
+    BUCKET_SIZE = 32
+    # Provisional: with the synthetic rules of benchmarks/bench_rules.py the prefilter is slower
+    # below about 200 regexes per field and within about 15 % either way above; real rule sets
+    # with rarer literals should gain more
+    PREFILTER_MIN = 800
+
+    def __init__(self, patterns, bucket_size=None, budget=None, abandoned=report_abandoned,
+                 prefilter_min=PREFILTER_MIN, guard_all=False):
+        self.bucket_size = bucket_size or self.BUCKET_SIZE
+        self.prefilter_min = prefilter_min
+        self.buckets = {field: [] for field in FIELDS}
+        self.prefilters = {field: None for field in FIELDS}
+        self.guard = RegexGuard(budget) if budget else None
+        self.abandoned = abandoned
+        self.guard_all = guard_all
+        self._build(patterns)
+
+    def _build(self, patterns):
+        entries = {field: {} for field in FIELDS}
+        for username, user_patterns in patterns.items():
+            for pattern in user_patterns:
+                for field in pattern.fields:
+                    # Only the issue body is capped
+                    cap = pattern.cap if field == "text" else None
+                    entry = entries[field].get((pattern.str_regex, cap))
+                    if entry is None:
+                        entry = _Entry(pattern.str_regex, cap)
+                        entries[field][(pattern.str_regex, cap)] = entry
+                    entry.users.add(username)
+
+        for field in FIELDS:
+            field_entries = list(entries[field].values())
+            guard_all = self.guard_all and field == "text"
+            if self.prefilter_min is not None:
+                literals = [(entry, required_literal(entry.source)) for entry in field_entries]
+                literals = [(entry, literal) for entry, literal in literals if literal is not None]
+                if literals and len(literals) >= self.prefilter_min:
+                    self.prefilters[field] = _Prefilter(literals, self.guard, guard_all)
+                    prefiltered = {id(entry) for entry, _ in literals}
+                    field_entries = [entry for entry in field_entries if id(entry) not in prefiltered]
+
+            combinable = {}
+            for entry in field_entries:
+                if guard_all or is_risky(entry.source):
+                    self.buckets[field].append(_Bucket([entry], self.guard))
+                elif is_combinable(entry.source):
+                    combinable.setdefault(entry.cap, []).append(entry)
+                else:
+                    self.buckets[field].append(_Bucket([entry]))
+
+            for group in combinable.values():
+                for i in range(0, len(group), self.bucket_size):
+                    chunk = group[i:i + self.bucket_size]
+                    try:
+                        self.buckets[field].append(_Bucket(chunk))
+                    except re.error:
+                        # The regexes which did not combine are searched one by one
+                        self.buckets[field].extend(_Bucket([entry]) for entry in chunk)
+
+    @staticmethod
+    def field_values(field, issue):
+        """Returns the strings of the issue the patterns of the field are searched in"""
+        if field == "title":
+            return [issue.title or ""]
+        elif field == "text":
+            return [issue.body or ""]
+        return list(issue.labels)
+
+    def match_field(self, field, issue, matched=None):
+        """Returns the users with a pattern matching the given field of the issue.
+
+        Users already in `matched` are not searched for again.
+        """
+        matched = set() if matched is None else matched
+        found = set()
+        values = self.field_values(field, issue)
+        capped = {None: values}
+
+        def capped_values(cap):
+            if cap not in capped:
+                capped[cap] = [cap_text(value, cap) for value in values]
+            return capped[cap]
+
+        buckets = self.buckets[field]
+        prefilter = self.prefilters[field]
+        if prefilter is not None:
+            buckets = buckets + prefilter.candidates(capped_values(prefilter.cap))
+
+        for bucket in buckets:
+            if bucket.users <= matched or bucket.users <= found:
+                continue
+            for value in capped_values(bucket.cap):
+                try:
+                    if bucket.regex.search(value):
+                        self._match_entries(bucket, value, matched, found)
+                except PatternTimeout as e:
+                    self.abandoned(field, e, issue)
+                    break
+
+        return found
+
+    def close(self):
+        """Stops the helper process of the RegexGuard, a later search starts it again"""
+        if self.guard is not None:
+            self.guard.close()
+
+    def iter_buckets(self):
+        """Yields (field, bucket) of all buckets, those of the prefilters included"""
+        for field in FIELDS:
+            for bucket in self.buckets[field]:
+                yield field, bucket
+            if self.prefilters[field] is not None:
+                for buckets in self.prefilters[field].buckets:
+                    for bucket in buckets:
+                        yield field, bucket
+
+    @staticmethod
+    def _match_entries(bucket, value, matched, found):
+        if len(bucket.entries) == 1:
+            found.update(bucket.users - matched)
+            return
+
+        for entry in bucket.entries:
+            if entry.users <= matched or entry.users <= found:
+                continue
+            if entry.regex.search(value):
+                found.update(entry.users - matched)
+
+    def match(self, issue):
+        """Returns the set of users having at least one pattern matching the issue"""
+        matched = set()
+        for field in FIELDS:
+            matched |= self.match_field(field, issue, matched)
+        return matched
+
+
+class MatchCache:
+    """Users matched by each field of recently evaluated issues, keyed by e.g. (reposlug, number).
+
+    An event re-runs only the patterns of the fields it `changed` (None for all of them) and
+    reuses the cached results of the others. A cached result is reused only if the field still
+    has the same value, so results stay right even when events are merged or come out of order.
+    The `size` most recently used issues are kept for the current engine, a new engine (reloaded
+    rules) clears the cache. `observe(field, result)` is called with "reused" or "evaluated".
+    """
+
+    SIZE = 10000
+
+    def __init__(self, size=SIZE, observe=None):
+        self.size = size
+        self.observe = observe
+        self.engine = None
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(field, issue):
+        """Returns a small value which changes whenever the field of the issue does"""
+        if field == "title":
+            return issue.title or ""
+        elif field == "text":
+            return hashlib.blake2b((issue.body or "").encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        return frozenset(issue.labels)
+
+    def match(self, engine, key, issue, changed=None):
+        """Returns the set of users having at least one pattern matching the issue"""
+        with self._lock:
+            if engine is not self.engine:
+                self.engine = engine
+                self._entries.clear()
+            cached = self._entries.get(key, {})
+
+        results = {}
+        matched = set()
+        for field in FIELDS:
+            digest = self.digest(field, issue)
+            result = None
+            if changed is not None and field not in changed and field in cached and cached[field][0] == digest:
+                result = cached[field][1]
+            if self.observe is not None:
+                self.observe(field, "evaluated" if result is None else "reused")
+            if result is None:
+                result = frozenset(engine.match_field(field, issue))
+            results[field] = (digest, result)
+            matched |= result
+
+        with self._lock:
+            if engine is self.engine:
+                self._entries[key] = results
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.size:
+                    self._entries.popitem(last=False)
+        return matched
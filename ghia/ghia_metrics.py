@@ -0,0 +1,150 @@
+import bisect
+import threading
+from .ghia_profile import endpoint
+
+# Upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter by label values"""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self.values.items())
+        for label_values, value in values:
+            yield self.name, _labels(self.labels, label_values), value
+
+
+class Gauge:
+    """Value read by a function when the metrics are collected, it is left out while it is None"""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, read):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def samples(self):
+        value = self.read()
+        if value is not None:
+            yield self.name, "", value
+
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets, by label values"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self.values.get(label_values)
+            if counts is None:
+                # Per bucket counts with the +Inf bucket last, then the sum
+                counts = self.values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = sorted((label_values, list(counts)) for label_values, counts in self.values.items())
+        for label_values, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                labels = _labels(self.labels + ("le",), label_values + (bound,))
+                yield f"{self.name}_bucket", labels, cumulative
+            labels = _labels(self.labels, label_values)
+            yield f"{self.name}_sum", labels, counts[-1]
+            yield f"{self.name}_count", labels, cumulative
+
+
+class WebMetrics:
+    """Metrics of the webhook server rendered in the Prometheus text format.
+
+    Observing is a dict update under a lock, the text is built only when it is scraped.
+    It also observes the API calls of the GitHub clients (`add_call`, `add`).
+    """
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, rate_remaining=lambda: None, queue_depth=lambda: None):
+        self.deliveries = Counter("ghia_webhook_deliveries_total", "Webhook deliveries by event, action and status.",
+                                  ("event", "action", "status"))
+        self.delivery_seconds = Histogram("ghia_webhook_delivery_seconds", "Time of handling webhook deliveries.",
+                                          ("event", "action"))
+        self.evaluation_seconds = Histogram("ghia_rules_evaluation_seconds", "Time of evaluating the rules of an issue.")
+        self.field_evaluations = Counter("ghia_rules_field_evaluations_total",
+                                         "Issue fields matched against the rules or reused from the cache.",
+                                         ("field", "result"))
+        self.github_calls = Counter("ghia_github_requests_total", "GitHub API calls by endpoint and status.",
+                                    ("endpoint", "status"))
+        self.github_seconds = Histogram("ghia_github_request_seconds", "Latency of GitHub API calls by endpoint.",
+                                        ("endpoint",))
+        self.phase_seconds = Counter("ghia_github_phase_seconds_total", "Time spent in other phases of API calls.",
+                                     ("phase",))
+        self.updates = Counter("ghia_issue_updates_total", "Issue evaluations by result: updated, skipped, failed.",
+                               ("result",))
+        self.rate_remaining = Gauge("ghia_github_rate_limit_remaining",
+                                    "Remaining GitHub API rate limit seen in the last response.", rate_remaining)
+        self.queue_depth = Gauge("ghia_webhook_queue_depth", "Events waiting in the queue of the async mode.",
+                                 queue_depth)
+        self.metrics = [self.deliveries, self.delivery_seconds, self.evaluation_seconds, self.field_evaluations,
+                        self.github_calls, self.github_seconds, self.phase_seconds, self.updates, self.rate_remaining,
+                        self.queue_depth]
+
+    def add_call(self, method, url, status, seconds):
+        name = endpoint(method, url)
+        self.github_calls.inc(name, status)
+        self.github_seconds.observe(seconds, name)
+
+    def add(self, phase, seconds):
+        self.phase_seconds.inc(phase, amount=seconds)
+
+    def render(self):
+        """Returns all metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_number(value)}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,111 @@
+import collections
+import itertools
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from .ghia_issue import Issue
+from .ghia_patterns import Decision
+
+# Below this number of issues the rules are evaluated in the calling process, starting the
+# workers and pickling the issues costs more than it saves (see benchmarks/bench_workers.py)
+MIN_ISSUES = 1000
+CHUNK_SIZE = 100
+
+# GhiaPatterns of the worker process, set by _init_worker
+_patterns = None
+
+
+def issue_record(issue):
+    """Returns the fields of the issue the rules need, a tuple which is cheap to pickle"""
+    return issue.repo_slug, issue.number, issue.title, issue.body, tuple(issue.labels), tuple(issue.assignees)
+
+
+def record_issue(record):
+    """Returns an issue with only the fields of the record set"""
+    issue = Issue.__new__(Issue)
+    issue.data = issue.url = issue.updated_at = issue.node_id = None
+    issue.repo_slug, issue.number, issue.title, issue.body, labels, assignees = record
+    issue.labels = set(labels)
+    issue.assignees = set(assignees)
+    return issue
+
+
+def decision_record(decision):
+    return (tuple(decision.assignees_added), tuple(decision.assignees_removed), tuple(decision.labels_added),
+            decision.fallback)
+
+
+def record_decision(record):
+    added, removed, labels_added, fallback = record
+    return Decision(frozenset(added), frozenset(removed), frozenset(labels_added),
+                    bool(added or removed or labels_added), fallback)
+
+
+def _init_worker(ghia_patterns):
+    global _patterns
+    _patterns = ghia_patterns
+    # Compiled once per worker, not per chunk
+    _patterns.engine
+
+
+def _decide_chunk(records):
+    return [decision_record(_patterns.decide(record_issue(record))) for record in records]
+
+
+class ProcessEvaluator:
+    """Evaluates the rules in a pool of worker processes, past the GIL.
+
+    Issues are sent in chunks of compact records and the decisions come back in the issue
+    order. The pool is started with the first input of at least `min_issues` issues and
+    shared by all following ones; smaller inputs are evaluated in the calling thread.
+    Workers are spawned rather than forked, as the process runs other threads meanwhile.
+    """
+
+    def __init__(self, ghia_patterns, workers, chunk_size=CHUNK_SIZE, min_issues=MIN_ISSUES):
+        self.ghia_patterns = ghia_patterns
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.min_issues = min_issues
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                                 initializer=_init_worker, initargs=(self.ghia_patterns,))
+            return self._pool
+
+    def evaluate(self, issues):
+        """Yields (issue, decision) of the issues in order"""
+        issues = iter(issues)
+        head = list(itertools.islice(issues, self.min_issues))
+        if len(head) < self.min_issues:
+            for issue in head:
+                yield issue, self.ghia_patterns.decide(issue)
+            return
+
+        pool = self.pool()
+        pending = collections.deque()
+        issues = itertools.chain(head, issues)
+        # A few chunks per worker are in flight, so the workers do not wait for the next one
+        while True:
+            chunk = list(itertools.islice(issues, self.chunk_size))
+            if not chunk:
+                break
+            pending.append((chunk, pool.submit(_decide_chunk, [issue_record(issue) for issue in chunk])))
+            if len(pending) > 2 * self.workers:
+                yield from self._results(*pending.popleft())
+        while pending:
+            yield from self._results(*pending.popleft())
+
+    @staticmethod
+    def _results(chunk, future):
+        for issue, record in zip(chunk, future.result()):
+            yield issue, record_decision(record)
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
@@ -1,19 +1,45 @@
+import collections
+import hashlib
+import json
 import re
 import click
 import copy
+import threading
+from .ghia_matcher import RuleEngine, cap_text, is_risky, validate_regex
 
 
 class Pattern:
 
     PATTERN_TYPES = ["title", "text", "label", "any"]
+    PATTERN_FIELDS = {
+        "title": ("title",),
+        "text": ("text",),
+        "label": ("label",),
+        "any": ("title", "text", "label"),
+    }
+    # Type with an optional cap of the body bytes searched, e.g. text[4096]
+    TYPE_RE = re.compile(r"^(\w+)(?:\[([1-9][0-9]*)\])?$")
 
     def __init__(self, text):
         self.text = text
-        self.regex = None
+        self._regex = None
         self.str_regex = None
         self.type = None
+        self.cap = None
         self.parse()
 
+    @property
+    def regex(self):
+        """Compiled regex, the pattern is only validated until it is used"""
+        if self._regex is None:
+            self._regex = re.compile(self.str_regex, flags=re.IGNORECASE)
+        return self._regex
+
+    @property
+    def fields(self):
+        """Issue fields the pattern is matched against"""
+        return self.PATTERN_FIELDS[self.type]
+
     def parse(self):
         parts = self.text.split(":", 1)
 
@@ -21,16 +47,21 @@ class Pattern:
         if len(parts) != 2:
             raise click.BadParameter(GhiaPatterns.CONFIG_VALIDATION_ERR)
 
-        self.type = parts[0]
+        type_match = self.TYPE_RE.match(parts[0])
         self.str_regex = parts[1]
 
-        # Check pattern type
-        if parts[0] not in self.PATTERN_TYPES:
+        # Check pattern type, only patterns reading the body can be capped
+        if type_match is None or type_match.group(1) not in self.PATTERN_TYPES:
             raise click.BadParameter(GhiaPatterns.CONFIG_VALIDATION_ERR)
+        self.type = type_match.group(1)
+        if type_match.group(2) is not None:
+            if "text" not in self.fields:
+                raise click.BadParameter(GhiaPatterns.CONFIG_VALIDATION_ERR)
+            self.cap = int(type_match.group(2))
 
         # Check regex validity
         try:
-            self.regex = re.compile(parts[1], flags=re.IGNORECASE)
+            validate_regex(parts[1])
         except re.error:
             raise click.BadParameter(GhiaPatterns.CONFIG_VALIDATION_ERR)
 
@@ -38,7 +69,8 @@ class Pattern:
         return self.regex.search(issue.title)
 
     def _match_text(self, issue):
-        return self.regex.search(issue.body)
+        body = issue.body if self.cap is None else cap_text(issue.body or "", self.cap)
+        return self.regex.search(body)
 
     def _match_label(self, issue):
         for label in issue.labels:
@@ -59,8 +91,46 @@ class Pattern:
                    or self._match_label(issue)
 
 
+class Decision(collections.namedtuple("Decision", ["assignees_added", "assignees_removed",
+                                                   "labels_added", "changed", "fallback"],
+                                        defaults=(None,))):
+    """Changes of the issue assignees and labels decided by the patterns.
+
+    `fallback` is the fallback label if the issue is left with no assignees, None otherwise.
+    """
+
+    __slots__ = ()
+
+    @property
+    def fields(self):
+        """Names of the issue fields which change"""
+        fields = []
+        if self.assignees_added or self.assignees_removed:
+            fields.append("assignees")
+        if self.labels_added:
+            fields.append("labels")
+        return tuple(fields)
+
+    def assignees(self, issue):
+        """Returns the assignees of the issue after the change"""
+        return (issue.assignees - self.assignees_removed) | self.assignees_added
+
+    def labels(self, issue):
+        """Returns the labels of the issue after the change"""
+        return issue.labels | self.labels_added
+
+    def apply(self, issue):
+        """Returns a changed shallow copy of the issue"""
+        updated_issue = copy.copy(issue)
+        updated_issue.assignees = self.assignees(issue)
+        updated_issue.labels = self.labels(issue)
+        return updated_issue
+
+
 class GhiaPatterns:
     CONFIG_VALIDATION_ERR = "incorrect configuration format"
+    # Seconds a search of a risky pattern may take on one issue
+    BUDGET = 1.0
 
     class AssigneeState:
         REMOVED = -1
@@ -77,22 +147,69 @@ class GhiaPatterns:
         self.strategy = None
         self.dry_run = False
         self.patterns = {}
+        self.text_bytes = 0
+        self.budget = self.BUDGET
+        self.guard_all = False
+        self._engine = None
+        self._engine_lock = threading.Lock()
         self._parse()
 
+    def __getstate__(self):
+        # Pickled for worker processes: the parsed patterns are enough, the engine is compiled there
+        state = dict(self.__dict__, conf=None, _engine=None)
+        del state["_engine_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._engine_lock = threading.Lock()
+
     def set_strategy(self, strategy):
         self.strategy = strategy
 
     def set_dry_run(self, dry_run):
         self.dry_run = dry_run
 
+    def fingerprint(self):
+        """Returns a hash of the rules and the strategy, it changes whenever the results could"""
+        content = {
+            "patterns": {username: [pattern.text for pattern in patterns]
+                         for username, patterns in self.patterns.items()},
+            "fallback": self.fallback,
+            "strategy": self.strategy,
+            "limits": [self.text_bytes, self.budget, self.guard_all],
+        }
+        return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
     def validate_username(self, username):
         res = re.match('^[A-Za-z0-9.\-_]+$', username)
         if res is None:
             raise click.BadParameter(self.CONFIG_VALIDATION_ERR)
 
+    def _parse_limits(self):
+        """Reads the [limits] section.
+
+        `text_bytes` caps the body bytes searched by text patterns (0 for no cap), `budget` limits
+        the seconds a search of a risky pattern may take (0 for no limit), `guard_all` applies
+        the budget to all text patterns.
+        """
+        if "limits" not in self.conf:
+            return
+
+        try:
+            self.text_bytes = self.conf["limits"].getint("text_bytes", fallback=0)
+            self.budget = self.conf["limits"].getfloat("budget", fallback=self.BUDGET)
+            self.guard_all = self.conf["limits"].getboolean("guard_all", fallback=False)
+        except ValueError:
+            raise click.BadParameter(self.CONFIG_VALIDATION_ERR)
+
+        if self.text_bytes < 0 or self.budget < 0:
+            raise click.BadParameter(self.CONFIG_VALIDATION_ERR)
+
     def _parse(self):
         """Initializes the patterns from the configuration dictionary."""
 
+        self._parse_limits()
         patterns_conf = self.conf["patterns"]
         for username in patterns_conf:
             self.validate_username(username)
@@ -103,30 +220,50 @@ class GhiaPatterns:
 
             for rule in rules:
                 pattern_obj = Pattern(rule)
+                if pattern_obj.cap is None and self.text_bytes and "text" in pattern_obj.fields:
+                    pattern_obj.cap = self.text_bytes
+                if is_risky(pattern_obj.str_regex):
+                    self.print_risky(username, pattern_obj)
                 self.patterns[username].append(pattern_obj)
 
         if "fallback" in self.conf and "label" in self.conf["fallback"]:
             self.fallback = self.conf["fallback"]["label"]
 
-    def apply_to(self, orig_issue):
-        """Applies the patterns to the given issue."""
+    def print_risky(self, username, pattern):
+        click.secho("WARNING", fg="yellow", bold=True, nl=False, err=True)
+        limit = f"its searches are abandoned after {self.budget} s" if self.budget else "with no time limit"
+        click.echo(f": Pattern {pattern.text} of {username} may backtrack catastrophically, {limit}", err=True)
+
+    @property
+    def engine(self):
+        """RuleEngine of the patterns, compiled on the first use"""
+        if self._engine is None:
+            with self._engine_lock:
+                if self._engine is None:
+                    self._engine = RuleEngine(self.patterns, budget=self.budget, guard_all=self.guard_all)
+        return self._engine
 
-        issue = copy.deepcopy(orig_issue)
+    def close(self):
+        """Releases the compiled engine's resources, if it has been compiled"""
+        with self._engine_lock:
+            if self._engine is not None:
+                self._engine.close()
 
-        click.secho("-> ", nl=False)
-        click.secho(f"{issue.repo_slug}#{issue.number} ", bold=True, nl=False)
-        click.secho(f"({issue.url})")
+    def decide(self, issue, matched=None):
+        """Decides how the patterns change the given issue, the issue itself is not touched.
+
+        `matched` are the users with a matching pattern if they are already known.
+        """
+
+        if matched is None:
+            matched = self.engine.match(issue)
 
         to_add = set()
         assignees = {}
 
-        for username in self.patterns:
-            patterns = self.patterns[username]
-
-            for pattern in patterns:
-                if pattern.match(issue):
-                    username_correct_case = self._get_username_case(username, issue)
-                    to_add.add(username_correct_case)
+        for username in matched:
+            username_correct_case = self._get_username_case(username, issue)
+            to_add.add(username_correct_case)
 
         # Process users assigned to the issue prior GHIA
         default_state = self.AssigneeState.REMOVED if self.strategy == "change" else self.AssigneeState.KEPT
@@ -143,60 +280,27 @@ class GhiaPatterns:
                     # User matched in GHIA and was NOT assigned => Add user
                     assignees[user] = self.AssigneeState(user, self.AssigneeState.ADDED)
 
-        res = list(filter(lambda x: assignees[x].state >= self.AssigneeState.KEPT, assignees))
-        issue.assignees = set(res)
-
-        changed = False
+        added = frozenset(x for x in assignees if assignees[x].state == self.AssigneeState.ADDED)
+        removed = frozenset(x for x in assignees if assignees[x].state == self.AssigneeState.REMOVED)
 
         # Check for FALLBACK label
-        if len(issue.assignees) == 0 and self.fallback:
-            click.secho("   FALLBACK", bold=True, fg='yellow', nl=False)
-            click.echo(": ", nl=False)
-            if self.fallback in issue.labels:
-                click.echo(f"already has label \"{self.fallback}\"")
-            else:
-                click.echo(f"added label \"{self.fallback}\"")
-                issue.labels.add(self.fallback)
-                changed = True
+        labels_added = frozenset()
+        fallback = None
+        kept_any = any(assignees[x].state >= self.AssigneeState.KEPT for x in assignees)
+        if not kept_any and self.fallback:
+            fallback = self.fallback
+            if self.fallback not in issue.labels:
+                labels_added = frozenset([self.fallback])
 
-        kept_count = sum(1 for x in assignees if assignees[x].state == self.AssigneeState.KEPT)
-        if kept_count != len(assignees):
-            changed = True
+        return Decision(added, removed, labels_added, bool(added or removed or labels_added), fallback)
 
-        return issue if changed else None
-
-    def print_report(self, issue, updated_issue):
-        """Prints colored diff report about assignee changes"""
-
-        # If there was an error updating the issue, show no difference from original issue
-        if updated_issue is None:
-            updated_issue = issue
-
-        assignees = {}
-
-        for user in issue.assignees:
-            assignees[user] = self.AssigneeState(user, self.AssigneeState.REMOVED)
+    def apply_to(self, orig_issue):
+        """Applies the patterns to the given issue without any output, the reporters print the results.
 
-        # Process users to be added
-        for user in updated_issue.assignees:
-            if user in issue.assignees:
-                assignees[user].state = self.AssigneeState.KEPT
-            else:
-                assignees[user] = self.AssigneeState(user, self.AssigneeState.ADDED)
-
-        # Get sorted report
-        sorted_assignees_report = sorted(list(assignees), key=str.casefold)
-        for user in sorted_assignees_report:
-            state = assignees[user].state
-
-            if state == self.AssigneeState.REMOVED:
-                click.secho("   - ", bold=True, fg='red', nl=False)
-            elif state == self.AssigneeState.KEPT:
-                click.secho("   = ", bold=True, fg='blue', nl=False)
-            elif state == self.AssigneeState.ADDED:
-                click.secho("   + ", bold=True, fg='green', nl=False)
-
-            click.echo(f"{user}")
+        Returns the updated issue or None if the issue does not need to change.
+        """
+        decision = self.decide(orig_issue)
+        return decision.apply(orig_issue) if decision.changed else None
 
     @staticmethod
     def _get_username_case(username_ci, issue):
@@ -0,0 +1,93 @@
+import collections
+import queue
+import threading
+from concurrent.futures import Future
+
+
+QUEUE_SIZE = 100
+
+_DONE = object()
+
+
+def pipeline_stage(source, func=None, maxsize=QUEUE_SIZE):
+    """Starts consuming the source iterable in a background thread, returns an iterator of func(item) in order.
+
+    Results are handed over through a bounded queue, so the stage runs ahead of its consumer
+    by at most `maxsize` items. Exceptions (including SystemExit) raised by the source or by
+    the function are re-raised in the consuming thread.
+    """
+    results = queue.Queue(maxsize)
+
+    def worker():
+        try:
+            for item in source:
+                results.put((func(item) if func else item, None))
+        except BaseException as e:
+            results.put((None, e))
+        else:
+            results.put(_DONE)
+
+    threading.Thread(target=worker, daemon=True).start()
+    return _stage_results(results)
+
+
+def _stage_results(results):
+    while True:
+        result = results.get()
+        if result is _DONE:
+            return
+        value, error = result
+        if error is not None:
+            raise error
+        yield value
+
+
+def run_ahead(items, start, ahead):
+    """Yields (item, start(item)) in order, with start() already called for up to `ahead` items.
+
+    The started work of the following items runs while the consumer handles the current one.
+    """
+    started = collections.deque()
+    for item in items:
+        started.append((item, start(item)))
+        if len(started) >= ahead:
+            yield started.popleft()
+    while started:
+        yield started.popleft()
+
+
+class BatchSubmitter:
+    """Collects items into batches and processes each batch by one call in the executor.
+
+    `func` takes a list of items and returns the list of their results. Every added item
+    gets its own future, resolved when its batch is done.
+    """
+
+    def __init__(self, executor, func, batch_size):
+        self.executor = executor
+        self.func = func
+        self.batch_size = batch_size
+        self._batch = []
+
+    def add(self, item):
+        future = Future()
+        self._batch.append((item, future))
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+        return future
+
+    def flush(self):
+        """Submits the incomplete batch"""
+        if self._batch:
+            self.executor.submit(self._run, self._batch)
+            self._batch = []
+
+    def _run(self, batch):
+        try:
+            results = self.func([item for item, _ in batch])
+        except BaseException as e:
+            for _, future in batch:
+                future.set_exception(e)
+        else:
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
@@ -0,0 +1,193 @@
+import collections
+import contextlib
+import cProfile
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import urllib.parse
+import click
+
+_SLUG_RE = re.compile(r"^/repos/[^/]+/[^/]+")
+_ORG_RE = re.compile(r"^/orgs/[^/]+")
+_NUMBER_RE = re.compile(r"/\d+(?=/|$)")
+
+
+def endpoint(method, url):
+    """Returns the method and the url path with the repository, organization and numbers left out"""
+    path = urllib.parse.urlsplit(url).path
+    path = _SLUG_RE.sub("/repos/{slug}", path)
+    path = _ORG_RE.sub("/orgs/{org}", path)
+    return f"{method} {_NUMBER_RE.sub('/{number}', path)}"
+
+
+def percentile(sorted_values, share):
+    """Returns the nearest-rank percentile of the sorted values"""
+    index = max(0, min(len(sorted_values) - 1, round(share * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class _TimedRegex:
+    """Compiled regex wrapper adding the time of every search to the profile"""
+
+    __slots__ = ("regex", "label", "profile")
+
+    def __init__(self, regex, label, profile):
+        self.regex = regex
+        self.label = label
+        self.profile = profile
+
+    def search(self, value):
+        start = time.perf_counter()
+        result = self.regex.search(value)
+        self.profile.add_pattern(self.label, time.perf_counter() - start)
+        return result
+
+
+class RunProfile:
+    """Timings of a CLI run: busy time of the phases, API calls and regex searches.
+
+    Pipeline stages run concurrently, so the phase times overlap and may add up to more
+    than the wall time. With `cprofile_path` all threads are profiled by cProfile, with
+    `tracemalloc_path` the allocations are traced; both are written to the files by `finish`.
+    """
+
+    TOP_PATTERNS = 10
+
+    def __init__(self, cprofile_path=None, tracemalloc_path=None):
+        self.cprofile_path = cprofile_path
+        self.tracemalloc_path = tracemalloc_path
+        self.phases = collections.defaultdict(float)
+        self.calls = collections.defaultdict(list)
+        self.patterns = collections.defaultdict(float)
+        self.issues = 0
+        self._lock = threading.Lock()
+        self._profilers = []
+        self._start = None
+        self.wall = None
+
+    def start(self):
+        self._start = time.perf_counter()
+        if self.tracemalloc_path:
+            tracemalloc.start()
+        if self.cprofile_path:
+            if sys.version_info < (3, 12):
+                # Threads started from now on get their own profiler, cProfile sees only its thread
+                threading.setprofile(self._profile_thread)
+            # Since Python 3.12 one profiler sees all threads and no other one can be enabled
+            self._profile_thread()
+
+    def _profile_thread(self, *args):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiling tool is active, the thread runs unprofiled
+            sys.setprofile(None)
+            return
+        with self._lock:
+            self._profilers.append(profiler)
+
+    def add(self, phase, seconds):
+        with self._lock:
+            self.phases[phase] += seconds
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def timed_iter(self, name, iterable):
+        """Yields from the iterable, adding the time spent waiting for the items to the phase"""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(name, time.perf_counter() - start)
+                return
+            self.add(name, time.perf_counter() - start)
+            yield item
+
+    def timed(self, name, func):
+        """Returns func adding its time to the phase"""
+        def wrapper(*args, **kwargs):
+            with self.phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def evaluated(self, count=1):
+        with self._lock:
+            self.issues += count
+
+    def add_call(self, method, url, status, seconds):
+        with self._lock:
+            self.calls[endpoint(method, url)].append(seconds)
+
+    def add_pattern(self, label, seconds):
+        with self._lock:
+            self.patterns[label] += seconds
+
+    def instrument(self, engine):
+        """Times every regex search of the RuleEngine, the alternations and single patterns"""
+        for field, bucket in engine.iter_buckets():
+            if len(bucket.entries) == 1:
+                bucket.regex = _TimedRegex(bucket.regex, f"{field}:{bucket.entries[0].source}", self)
+                continue
+            bucket.regex = _TimedRegex(bucket.regex, f"{field}: alternation of {len(bucket.entries)} patterns "
+                                                     f"from {bucket.entries[0].source}", self)
+            for entry in bucket.entries:
+                entry._regex = _TimedRegex(entry.regex, f"{field}:{entry.source}", self)
+
+    def finish(self):
+        """Stops profiling and writes the profiler outputs"""
+        self.wall = time.perf_counter() - self._start
+        # Memory first, so the allocations of the profiler output are not counted
+        if self.tracemalloc_path:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with open(self.tracemalloc_path, "w") as file:
+                file.write(f"current {current} B, peak {peak} B\n")
+                for stat in snapshot.statistics("lineno")[:50]:
+                    file.write(f"{stat}\n")
+        if self.cprofile_path:
+            threading.setprofile(None)
+            for profiler in self._profilers:
+                profiler.disable()
+            if self._profilers:
+                pstats.Stats(*self._profilers).dump_stats(self.cprofile_path)
+
+    def print_summary(self):
+        """Prints the timings to stderr"""
+        def echo(line=""):
+            click.echo(line, err=True)
+
+        echo()
+        click.secho("PROFILE", bold=True, err=True)
+        echo(f"   wall time {self.wall:.3f} s, busy time of the phases (they overlap):")
+        for name, seconds in sorted(self.phases.items(), key=lambda item: -item[1]):
+            echo(f"   {name:<10} {seconds:10.3f} s busy")
+
+        rate = self.issues / self.wall if self.wall else 0
+        echo(f"   {self.issues} issues evaluated, {rate:.1f} issues/s")
+
+        if self.calls:
+            echo("   API calls       count     p50 ms     p90 ms     p99 ms     max ms")
+            for name, samples in sorted(self.calls.items()):
+                samples = sorted(samples)
+                echo(f"   {name}")
+                echo(f"   {'':<12}{len(samples):8}" + "".join(
+                    f"{percentile(samples, share) * 1000:11.1f}" for share in (0.5, 0.9, 0.99, 1.0)))
+
+        if self.patterns:
+            echo("   Most expensive patterns (cumulative search time):")
+            top = sorted(self.patterns.items(), key=lambda item: -item[1])[:self.TOP_PATTERNS]
+            for label, seconds in top:
+                echo(f"   {seconds * 1000:10.1f} ms  {label}")
@@ -0,0 +1,121 @@
+import collections
+import datetime
+import email.utils
+import threading
+import time
+
+
+RateBudget = collections.namedtuple("RateBudget", ["limit", "remaining", "reset"])
+
+
+def retry_after(value, now):
+    """Returns the seconds to wait by a Retry-After value, seconds or an HTTP date, None if it is neither"""
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, date.timestamp() - now)
+
+
+class RateLimiter:
+    """Schedules the requests made with one GitHub token.
+
+    The budget is read from the X-RateLimit-* headers of every response. While plenty of it
+    is left the requests go out right away, when it runs low they are spread evenly until the
+    reset. Rate limited responses (Retry-After, exhausted budget, secondary rate limits) make
+    all requests wait, secondary limits with an exponentially growing backoff.
+    """
+
+    HTTP_FORBIDDEN = 403
+    HTTP_TOO_MANY_REQUESTS = 429
+
+    # Fraction of the budget from which requests are paced to last until the reset
+    PACING_THRESHOLD = 0.1
+    SECONDARY_BACKOFF = 60
+    MAX_BACKOFF = 15 * 60
+    MAX_RETRIES = 5
+
+    def __init__(self, clock=time.time, sleep=time.sleep):
+        self.clock = clock
+        self.sleep = sleep
+        self.limit = None
+        self.remaining = None
+        self.reset = None
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self._blocked_until = 0.0
+        self._secondary_hits = 0
+
+    def budget(self):
+        """Returns the last known RateBudget, its fields are None until the first response"""
+        with self._lock:
+            return RateBudget(self.limit, self.remaining, self.reset)
+
+    def _pacing(self):
+        return self.remaining is not None and self.limit \
+               and self.remaining < self.limit * self.PACING_THRESHOLD
+
+    def suggested_workers(self, requested):
+        """Returns how many concurrent requests make sense with the current budget"""
+        with self._lock:
+            if self.remaining is None:
+                return requested
+            if self.remaining <= 0 or self._pacing():
+                return 1
+            return max(1, min(requested, self.remaining))
+
+    def acquire(self):
+        """Blocks until a request may be sent"""
+        with self._lock:
+            now = self.clock()
+            start = max(now, self._blocked_until)
+
+            if self.remaining is not None and self.reset is not None and self.reset > now:
+                if self.remaining <= 0:
+                    start = max(start, self.reset)
+                elif self._pacing():
+                    start = max(start, self._next_slot)
+                    self._next_slot = start + (self.reset - now) / self.remaining
+                    self.remaining -= 1
+
+        if start > now:
+            self.sleep(start - now)
+
+    def update(self, response):
+        """Records the budget from the response.
+
+        Returns the number of seconds to wait before retrying, None if the response
+        was not rate limited.
+        """
+        headers = response.headers
+        with self._lock:
+            if "X-RateLimit-Remaining" in headers:
+                self.limit = int(headers.get("X-RateLimit-Limit", 0)) or self.limit
+                self.remaining = int(headers["X-RateLimit-Remaining"])
+                self.reset = float(headers.get("X-RateLimit-Reset", 0)) or self.reset
+
+            if response.status_code not in (self.HTTP_FORBIDDEN, self.HTTP_TOO_MANY_REQUESTS):
+                self._secondary_hits = 0
+                return None
+
+            now = self.clock()
+            # A Retry-After which cannot be parsed is ignored, the other headers tell the wait then
+            wait = retry_after(headers["Retry-After"], now) if "Retry-After" in headers else None
+            if wait is None:
+                if headers.get("X-RateLimit-Remaining") == "0" and self.reset:
+                    wait = max(0.0, self.reset - now)
+                elif "secondary rate limit" in response.text.lower() or "abuse" in response.text.lower():
+                    wait = min(self.SECONDARY_BACKOFF * 2 ** self._secondary_hits, self.MAX_BACKOFF)
+                    self._secondary_hits += 1
+                else:
+                    # Forbidden for other reasons than the rate limit
+                    return None
+
+            self._blocked_until = max(self._blocked_until, now + wait)
+            return wait
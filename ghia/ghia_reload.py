@@ -0,0 +1,79 @@
+import configparser
+import os
+import re
+import signal
+import threading
+import click
+
+
+class RulesHolder:
+    """Holds the current rules of the app and replaces them when their config files change.
+
+    `load` returns a new GhiaPatterns read from the `paths`. The rules are swapped by one
+    assignment, so code which took `holder.patterns` keeps using the rules it started with.
+    When loading fails, the old rules stay and the error is reported.
+    """
+
+    def __init__(self, patterns, load=None, paths=()):
+        self.patterns = patterns
+        self.load = load
+        self.paths = list(paths)
+        self._mtimes = self._stat()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _stat(self):
+        mtimes = []
+        for path in self.paths:
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return mtimes
+
+    def reload(self):
+        """Loads the rules again, returns True if the new rules are in use"""
+        if self.load is None:
+            return False
+
+        with self._lock:
+            self._mtimes = self._stat()
+            try:
+                patterns = self.load()
+                # Compiled here, so that the first event with the new rules does not wait for it
+                patterns.engine
+            except (OSError, configparser.Error, click.BadParameter, re.error) as e:
+                click.secho("ERROR", fg="red", bold=True, nl=False, err=True)
+                click.echo(f": Could not reload the rules, keeping the old ones: {e}", err=True)
+                return False
+
+            old, self.patterns = self.patterns, patterns
+        # Events still using the old rules start the guard again if they need it
+        old.close()
+        click.echo("Rules reloaded.", err=True)
+        return True
+
+    def changed(self):
+        """Tells if any of the config files changed since the last load"""
+        return self._stat() != self._mtimes
+
+    def watch(self, interval):
+        """Checks the config files every `interval` seconds in the background, reloads changed rules"""
+        def poll():
+            while not self._stop.wait(interval):
+                if self.changed():
+                    self.reload()
+
+        threading.Thread(target=poll, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def install_signal_handler(self):
+        """Reloads the rules on SIGHUP, returns False where it is not possible"""
+        if not hasattr(signal, "SIGHUP") or threading.current_thread() is not threading.main_thread():
+            return False
+
+        # The handler must not block the interrupted thread, the rules are loaded in a new one
+        signal.signal(signal.SIGHUP, lambda signum, frame: threading.Thread(target=self.reload, daemon=True).start())
+        return True
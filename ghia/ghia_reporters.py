@@ -0,0 +1,179 @@
+import collections
+import json
+import threading
+import time
+import click
+
+
+class Reporter:
+    """Receives the outcome of every evaluated issue, `report` may be called from several threads.
+
+    `updated_issue` is the issue after the change, None when it did not change or the update
+    failed (`failed`). `close` is called once all issues are reported.
+    """
+
+    def report(self, issue, decision, updated_issue=None, failed=False):
+        pass
+
+    def close(self):
+        pass
+
+
+class QuietReporter(Reporter):
+    """Reports nothing"""
+
+
+class HumanReporter(Reporter):
+    """Colored report of the assignee changes, one block of lines per issue"""
+
+    MARKS = {"removed": ("   - ", "red"), "kept": ("   = ", "blue"), "added": ("   + ", "green")}
+
+    def __init__(self, file=None):
+        self.file = file
+        self._lock = threading.Lock()
+
+    def report(self, issue, decision, updated_issue=None, failed=False):
+        # The lines of the issue are written at once, so that they are not mixed with other threads
+        text = self.header(issue) + self.fallback(issue, decision)
+        report = self.assignees(issue, updated_issue)
+        with self._lock:
+            if failed:
+                click.echo(text, file=self.file, nl=False)
+                click.secho("   ERROR", fg="red", bold=True, nl=False, err=True)
+                click.echo(f": Could not update issue {issue.repo_slug}#{issue.number}", err=True)
+                text = ""
+            click.echo(text + report, file=self.file, nl=False)
+
+    @staticmethod
+    def header(issue):
+        return "-> " + click.style(f"{issue.repo_slug}#{issue.number} ", bold=True) + f"({issue.url})\n"
+
+    @staticmethod
+    def fallback(issue, decision):
+        if decision.fallback is None:
+            return ""
+        text = click.style("   FALLBACK", bold=True, fg="yellow") + ": "
+        if decision.fallback in issue.labels:
+            return text + f"already has label \"{decision.fallback}\"\n"
+        return text + f"added label \"{decision.fallback}\"\n"
+
+    @classmethod
+    def assignees(cls, issue, updated_issue):
+        # If the issue did not change or updating failed, show no difference from the original issue
+        after = (updated_issue or issue).assignees
+        lines = []
+        for user in sorted(issue.assignees | after, key=str.casefold):
+            if user not in after:
+                state = "removed"
+            elif user in issue.assignees:
+                state = "kept"
+            else:
+                state = "added"
+            mark, color = cls.MARKS[state]
+            lines.append(click.style(mark, bold=True, fg=color) + f"{user}\n")
+        return "".join(lines)
+
+
+class JsonLinesReporter(Reporter):
+    """One JSON object per issue, written in chunks of `buffer_size` lines.
+
+    The buffer is also written when a report comes `flush_interval` seconds after the last write.
+    """
+
+    def __init__(self, file=None, buffer_size=1000, flush_interval=1.0):
+        self.file = file
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._flushed = time.monotonic()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def record(issue, decision, updated_issue, failed):
+        after = (updated_issue or issue).assignees
+        return {
+            "repo": issue.repo_slug,
+            "number": issue.number,
+            "url": issue.url,
+            "assignees": sorted(after, key=str.casefold),
+            "added": sorted(after - issue.assignees, key=str.casefold),
+            "removed": sorted(issue.assignees - after, key=str.casefold),
+            "labels_added": sorted(decision.labels_added),
+            "fallback": decision.fallback,
+            "changed": decision.changed,
+            "failed": failed,
+        }
+
+    def report(self, issue, decision, updated_issue=None, failed=False):
+        line = json.dumps(self.record(issue, decision, updated_issue, failed))
+        with self._lock:
+            self._buffer.append(line + "\n")
+            if (len(self._buffer) >= self.buffer_size
+                    or time.monotonic() - self._flushed >= self.flush_interval):
+                self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            click.echo("".join(self._buffer), file=self.file, nl=False)
+            self._buffer = []
+        self._flushed = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+
+
+class SummaryReporter(Reporter):
+    """Counts the issues and the changes per user, prints them when closed"""
+
+    def __init__(self, file=None):
+        self.file = file
+        self.issues = 0
+        self.changed = 0
+        self.failed = 0
+        self.fallback = 0
+        self.users = collections.defaultdict(lambda: {"added": 0, "removed": 0, "kept": 0})
+        self._lock = threading.Lock()
+
+    def report(self, issue, decision, updated_issue=None, failed=False):
+        after = (updated_issue or issue).assignees
+        with self._lock:
+            self.issues += 1
+            self.changed += decision.changed and not failed
+            self.failed += failed
+            self.fallback += decision.fallback is not None
+            for user in issue.assignees | after:
+                if user not in after:
+                    self.users[user]["removed"] += 1
+                elif user in issue.assignees:
+                    self.users[user]["kept"] += 1
+                else:
+                    self.users[user]["added"] += 1
+
+    def close(self):
+        def echo(line=""):
+            click.echo(line, file=self.file)
+
+        click.secho("SUMMARY", bold=True, file=self.file)
+        echo(f"   {self.issues} issues, {self.changed} changed, {self.failed} failed, "
+             f"{self.fallback} fallback")
+        if self.users:
+            echo(f"   {'user':<30} {'added':>8} {'removed':>8} {'kept':>8}")
+            for user in sorted(self.users, key=str.casefold):
+                counts = self.users[user]
+                echo(f"   {user:<30} {counts['added']:8} {counts['removed']:8} {counts['kept']:8}")
+
+
+REPORTERS = {
+    "human": HumanReporter,
+    "jsonl": JsonLinesReporter,
+    "summary": SummaryReporter,
+    "quiet": QuietReporter,
+}
+
+
+def get_reporter(reporter):
+    """Returns the reporter given by its name in REPORTERS, reporter objects are returned as they are"""
+    if isinstance(reporter, Reporter):
+        return reporter
+    return REPORTERS[reporter]()
@@ -1,19 +1,45 @@
+import collections
+import copy
+import itertools
+import threading
+import time
 import requests
 import click
-from .ghia_issue import Issue
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from .ghia_issue import Issue, UPDATE_FIELDS
+from .ghia_ratelimit import RateLimiter
 
 
 class GhiaRequests:
     CONFIG_VALIDATION_ERR = "incorrect configuration format"
     HTTP_OK = 200
     EXIT_CODE_ISSUES_NA = 10
+    MAX_PER_PAGE = 100
+    API_URL = 'https://api.github.com'
+    # How many issue updates the backend sends in one request
+    BATCH_SIZE = 1
 
-    def __init__(self, token, slug=None, session=None):
+    def __init__(self, token, slug=None, session=None, pool_size=None, limiter=None, cache=None, api_url=None,
+                 observer=None):
         self.token = token
         self.slug = slug
+        self.api_url = (api_url or self.API_URL).rstrip('/')
+        self.limiter = limiter or RateLimiter()
+        self.cache = cache
+        # Collects timings of the API calls, with add_call(method, url, status, seconds)
+        # and add(phase, seconds), e.g. RunProfile or WebMetrics
+        self.observer = observer
 
         # Init the requests Session
-        self.session = session or requests.Session()
+        if session is None:
+            session = requests.Session()
+            if pool_size:
+                # Keep a connection for each thread using the session
+                adapter = requests.adapters.HTTPAdapter(pool_maxsize=pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+        self.session = session
         self.session.headers = {'User-Agent': 'GHIA-Python v0.1'}
         self.session.auth = self.token_auth
 
@@ -21,10 +47,52 @@ class GhiaRequests:
         req.headers['Authorization'] = f'token {self.token}'
         return req
 
+    def for_repo(self, slug):
+        """Returns a client of another repository sharing the session, rate limiter and cache"""
+        client = copy.copy(self)
+        client.slug = slug
+        return client
+
+    def request(self, method, url, **kwargs):
+        """Sends the request when the rate limit allows it, retries rate limited requests.
+
+        With a cache, GET requests are conditional and unchanged responses come from the cache.
+        """
+        cache_key = None
+        if self.cache is not None and method == 'GET':
+            cache_key = self.cache.key(self.token, url, kwargs.get('params'))
+            kwargs['headers'] = dict(kwargs.get('headers') or {}, **self.cache.conditional_headers(cache_key))
+
+        for _ in range(self.limiter.MAX_RETRIES):
+            self.limiter.acquire()
+            start = time.perf_counter()
+            try:
+                r = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException:
+                if self.observer is not None:
+                    self.observer.add_call(method, url, "error", time.perf_counter() - start)
+                raise
+            if self.observer is not None:
+                self.observer.add_call(method, url, r.status_code, time.perf_counter() - start)
+            if self.limiter.update(r) is None:
+                break
+
+        if cache_key is not None:
+            r = self.cache.process(cache_key, r)
+        return r
+
+    def rate_budget(self):
+        """Returns the current RateBudget of the token"""
+        return self.limiter.budget()
+
+    def suggested_workers(self, requested):
+        """Returns how many concurrent requests the remaining rate limit budget allows"""
+        return self.limiter.suggested_workers(requested)
+
     def get_user(self):
         success = True
         try:
-            r = self.session.get(f'https://api.github.com/user')
+            r = self.request('GET', f'{self.api_url}/user')
         except requests.exceptions.RequestException:
             success = False
 
@@ -34,44 +102,163 @@ class GhiaRequests:
         user_data = r.json()
         return user_data
 
-    def get_issues(self, issues=[], url=None):
-        success = True
+    def _fetch(self, url, params=None):
+        """GETs the url, returns the response or None if the request failed"""
         try:
-            r = self.session.get(f'https://api.github.com/repos/{self.slug}/issues' if url is None else url)
+            r = self.request('GET', url, params=params)
         except requests.exceptions.RequestException:
-            success = False
+            return None
 
-        if not success or r.status_code != self.HTTP_OK:
-            click.secho("ERROR", fg="red", bold=True, nl=False, err=True)
-            click.echo(f": Could not list issues for repository {self.slug}", err=True)
-            exit(self.EXIT_CODE_ISSUES_NA)
-
-        raw_issues = r.json()
-        for raw_issue in raw_issues:
-            if raw_issue["state"] == "closed":
-                continue
-            issue = Issue(raw_issue)
-            issues.append(issue)
-
-        if "next" in r.links:
-            url = r.links["next"]["url"]
-            return self.get_issues(issues, url)
-        else:
-            return issues
-
-    def update_issue(self, issue):
-        data = issue.get_update_json()
+        return r if r.status_code == self.HTTP_OK else None
+
+    def iter_org_repos(self, org):
+        """Yields slugs of the organization repositories with issues enabled, skipping archived ones"""
+        r = self._fetch(f'{self.api_url}/orgs/{org}/repos', {"per_page": self.MAX_PER_PAGE})
+        while True:
+            if r is None:
+                click.secho("ERROR", fg="red", bold=True, nl=False, err=True)
+                click.echo(f": Could not list repositories of organization {org}", err=True)
+                exit(self.EXIT_CODE_ISSUES_NA)
+
+            for repo in r.json():
+                if repo.get("has_issues", True) and not repo.get("archived") and not repo.get("disabled"):
+                    yield repo["full_name"]
+
+            if "next" not in r.links:
+                return
+            r = self._fetch(r.links["next"]["url"])
+
+    def _issues_error(self):
+        click.secho("ERROR", fg="red", bold=True, nl=False, err=True)
+        click.echo(f": Could not list issues for repository {self.slug}", err=True)
+        exit(self.EXIT_CODE_ISSUES_NA)
+
+    def _parse_issues(self, r):
+        """Returns the open issues from the issue listing response"""
+        start = time.perf_counter()
+        issues = [Issue(raw_issue) for raw_issue in r.json() if raw_issue["state"] != "closed"]
+        if self.observer is not None:
+            self.observer.add("decode", time.perf_counter() - start)
+        return issues
+
+    @staticmethod
+    def _page_urls(last_url):
+        """Returns urls of the pages from the second to the last one given by the `last` link"""
+        parts = urllib.parse.urlsplit(last_url)
+        query = urllib.parse.parse_qs(parts.query)
+        last_page = int(query["page"][0])
+
+        urls = []
+        for page in range(2, last_page + 1):
+            query["page"] = [str(page)]
+            urls.append(parts._replace(query=urllib.parse.urlencode(query, doseq=True)).geturl())
+        return urls
+
+    def iter_issues(self, workers=1, since=None):
+        """Yields open issues of the repository page by page as the pages arrive.
+
+        With more than one worker the largest pages are requested and, once the first
+        page tells the page count, the remaining pages are fetched concurrently.
+        With `since` only issues updated at or after that time are listed, oldest first.
+        """
+        url = f'{self.api_url}/repos/{self.slug}/issues'
+        params = {}
+        if workers > 1:
+            params["per_page"] = self.MAX_PER_PAGE
+        if since:
+            params.update(since=since, sort="updated", direction="asc")
+
+        r = self._fetch(url, params or None)
+        if r is None:
+            self._issues_error()
+        yield from self._parse_issues(r)
+
+        if workers > 1 and "last" in r.links:
+            urls = iter(self._page_urls(r.links["last"]["url"]))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                # Only a few pages per worker are in flight, the next one is requested as one is consumed
+                pending = collections.deque(executor.submit(self._fetch, url)
+                                            for url in itertools.islice(urls, workers * 2))
+                while pending:
+                    page = pending.popleft().result()
+                    for url in itertools.islice(urls, 1):
+                        pending.append(executor.submit(self._fetch, url))
+                    if page is None:
+                        self._issues_error()
+                    yield from self._parse_issues(page)
+            return
+
+        while "next" in r.links:
+            r = self._fetch(r.links["next"]["url"])
+            if r is None:
+                self._issues_error()
+            yield from self._parse_issues(r)
+
+    def get_issues(self, workers=1, since=None):
+        """Returns all open issues of the repository"""
+        return list(self.iter_issues(workers, since))
+
+    def print_update_error(self, issue):
+        click.secho("   ERROR", fg="red", bold=True, nl=False, err=True)
+        click.echo(f": Could not update issue {self.slug}#{issue.number}", err=True)
+
+    def update_issue(self, issue, quiet=False, fields=UPDATE_FIELDS):
+        """Sends the issue fields (assignees, labels), returns the updated issue or None on failure.
+
+        Unless quiet, the failure is reported right away.
+        """
+        data = issue.get_update_json(fields)
         success = True
         try:
-            r = self.session.patch(f'https://api.github.com/repos/{self.slug}/issues/{issue.number}', data)
+            r = self.request('PATCH', f'{self.api_url}/repos/{self.slug}/issues/{issue.number}', data=data)
         except requests.exceptions.RequestException:
             success = False
 
         if not success or r.status_code != self.HTTP_OK:
-            click.secho("   ERROR", fg="red", bold=True, nl=False, err=True)
-            click.echo(f": Could not update issue {self.slug}#{issue.number}", err=True)
+            if not quiet:
+                self.print_update_error(issue)
             return None
 
         raw_issue = r.json()
         return Issue(raw_issue)
 
+    def _update_many(self, updates):
+        """Sends the (issue, fields) updates quietly, returns the updated issues with None for failures"""
+        return [self.update_issue(issue, quiet=True, fields=fields) for issue, fields in updates]
+
+    def update_issues(self, issues):
+        """Updates the issues quietly, returns the list of updated issues with None for failures"""
+        return self._update_many([(issue, UPDATE_FIELDS) for issue in issues])
+
+    def apply_decision(self, issue, decision, quiet=False):
+        """Sends only the fields the decision changes, returns the updated issue or None on failure"""
+        return self.update_issue(decision.apply(issue), quiet=quiet, fields=decision.fields)
+
+    def apply_decisions(self, decisions):
+        """Applies the (issue, decision) pairs quietly, returns the updated issues with None for failures"""
+        return self._update_many([(decision.apply(issue), decision.fields) for issue, decision in decisions])
+
+
+class ClientRegistry:
+    """Thread-safe registry of per-repository clients derived from one base client.
+
+    All clients share the session with its connection pool, the rate limiter and the cache
+    of the base client, so the threads handling webhooks never change a shared slug.
+    """
+
+    def __init__(self, base):
+        self.base = base
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, slug):
+        """Returns the client of the repository, creating it on the first use"""
+        with self._lock:
+            client = self._clients.get(slug)
+            if client is None:
+                client = self._clients[slug] = self.base.for_repo(slug)
+            return client
+
+    def __len__(self):
+        with self._lock:
+            return len(self._clients)
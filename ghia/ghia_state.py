@@ -0,0 +1,47 @@
+import json
+import os
+import tempfile
+
+
+class RunState:
+    """Watermarks of incremental runs persisted in a JSON file.
+
+    For every repository it keeps the highest `updated_at` of the issues seen by the last
+    complete run and the fingerprint of the rules that run used.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.repos = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as file:
+                self.repos = json.load(file).get("repos", {})
+        except FileNotFoundError:
+            self.repos = {}
+        except ValueError:
+            # A broken state only means the next run is a full one
+            self.repos = {}
+
+    def save(self):
+        """Writes the state atomically, so an interrupted run cannot corrupt it"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as file:
+            json.dump({"repos": self.repos}, file, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def watermark(self, reposlug, fingerprint):
+        """Returns the watermark of the repository or None if the rules have changed since"""
+        entry = self.repos.get(reposlug)
+        if entry is None or entry.get("rules") != fingerprint:
+            return None
+        return entry.get("updated_at")
+
+    def set_watermark(self, reposlug, fingerprint, updated_at):
+        if updated_at is None:
+            updated_at = self.watermark(reposlug, fingerprint)
+        self.repos[reposlug] = {"rules": fingerprint, "updated_at": updated_at}
@@ -0,0 +1,147 @@
+import heapq
+import itertools
+import queue
+import threading
+import time
+import zlib
+import click
+
+_STOP = object()
+
+
+class WorkQueue:
+    """Background workers processing keyed items, with a bounded depth.
+
+    Items with the same key always go to the same worker, so they are processed one by one
+    in the order they were submitted. Items with different keys are processed concurrently.
+    """
+
+    DEFAULT_WORKERS = 4
+    DEFAULT_MAX_DEPTH = 1000
+
+    def __init__(self, handler, workers=DEFAULT_WORKERS, max_depth=DEFAULT_MAX_DEPTH):
+        self.handler = handler
+        # Every worker has its own queue with an equal share of the depth limit
+        self.queues = [queue.Queue(max(1, max_depth // workers)) for _ in range(workers)]
+        self.threads = [threading.Thread(target=self._work, args=(q,), daemon=True) for q in self.queues]
+        self.closed = False
+        self._lock = threading.Lock()
+        for thread in self.threads:
+            thread.start()
+
+    def _shard(self, key):
+        # Stable across processes unlike hash() of strings
+        return self.queues[zlib.crc32(repr(key).encode()) % len(self.queues)]
+
+    def submit(self, key, item):
+        """Queues the item, returns False if the queue is full or closed"""
+        with self._lock:
+            if self.closed:
+                return False
+            try:
+                self._shard(key).put_nowait(item)
+            except queue.Full:
+                return False
+        return True
+
+    def depth(self):
+        """Returns the number of items waiting in the queues"""
+        return sum(q.qsize() for q in self.queues)
+
+    def _work(self, q):
+        while True:
+            item = q.get()
+            try:
+                if item is _STOP:
+                    return
+                self.handler(item)
+            except Exception as e:
+                click.secho("ERROR", fg="red", bold=True, nl=False, err=True)
+                click.echo(f": Processing of a queued event failed: {e}", err=True)
+            finally:
+                q.task_done()
+
+    def join(self):
+        """Waits until all queued items are processed"""
+        for q in self.queues:
+            q.join()
+
+    def close(self, timeout=None):
+        """Stops accepting items and waits for the workers to process the queued ones"""
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+        for q in self.queues:
+            # Blocks only while the queue is full, the worker keeps draining it
+            q.put(_STOP)
+        for thread in self.threads:
+            thread.join(timeout)
+
+
+class Coalescer:
+    """Collects items per key for a time window and passes on only the newest one.
+
+    The window of a key starts with its first item. When it ends, the newest item, as told
+    by `newer(a, b)`, goes to `sink`, which returns False when it cannot take it.
+    """
+
+    def __init__(self, sink, window, newer=lambda old, new: True):
+        self.sink = sink
+        self.window = window
+        self.newer = newer
+        self.pending = {}
+        self.deadlines = []
+        self.closed = False
+        self._condition = threading.Condition()
+        self._seq = itertools.count()
+        self.thread = threading.Thread(target=self._work, daemon=True)
+        self.thread.start()
+
+    def submit(self, key, item):
+        """Adds the item to the window of its key, returns False if closed"""
+        with self._condition:
+            if self.closed:
+                return False
+            if key in self.pending:
+                if self.newer(self.pending[key], item):
+                    self.pending[key] = item
+                return True
+            self.pending[key] = item
+            heapq.heappush(self.deadlines, (time.monotonic() + self.window, next(self._seq), key))
+            self._condition.notify()
+        return True
+
+    def _due(self):
+        """Waits for the windows to end, returns the (key, item) pairs to pass on or None when closed"""
+        with self._condition:
+            while True:
+                if self.closed:
+                    due = list(self.pending.items())
+                    self.pending.clear()
+                    return due or None
+                now = time.monotonic()
+                due = []
+                while self.deadlines and self.deadlines[0][0] <= now:
+                    _, _, key = heapq.heappop(self.deadlines)
+                    due.append((key, self.pending.pop(key)))
+                if due:
+                    return due
+                self._condition.wait(self.deadlines[0][0] - now if self.deadlines else None)
+
+    def _work(self):
+        while True:
+            due = self._due()
+            if due is None:
+                return
+            for key, item in due:
+                if not self.sink(key, item):
+                    click.secho("ERROR", fg="red", bold=True, nl=False, err=True)
+                    click.echo(f": Event queue is full, dropped the event of {key}", err=True)
+
+    def close(self, timeout=None):
+        """Ends all windows right away and waits until their items are passed on"""
+        with self._condition:
+            self.closed = True
+            self._condition.notify()
+        self.thread.join(timeout)
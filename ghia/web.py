@@ -1,24 +1,51 @@
+import atexit
 import click
+import collections
 import configparser
 import hmac
 import os
+import threading
+import time
 from flask import Flask
+from flask import Response
 from flask import request
 from flask import render_template
+from .ghia_graphql import BACKENDS
 from .ghia_patterns import GhiaPatterns
-from .ghia_requests import GhiaRequests
 from .ghia_issue import Issue
-
+from .ghia_matcher import MatchCache
+from .ghia_metrics import WebMetrics
+from .ghia_reload import RulesHolder
+from .ghia_reporters import REPORTERS, get_reporter
+from .ghia_requests import ClientRegistry
+from .ghia_workqueue import WorkQueue, Coalescer
+
+ACCEPTED = 202
 BAD_REQUEST = 400
+INTERNAL_SERVER_ERROR = 500
+SERVICE_UNAVAILABLE = 503
+# Connections kept to GitHub by default, the same as requests does
+POOL_SIZE = 10
 ALLOWED_ACTIONS = ["opened", "edited", "transferred", "reopened", "assigned", "unassigned", "labeled", "unlabeled"]
+# Actions GHIA causes itself by updating issues
+ECHO_ACTIONS = ["assigned", "unassigned", "labeled", "unlabeled"]
+# Event types counted by name in the metrics, others are counted together
+KNOWN_EVENTS = ["issues", "ping"]
+# Issue fields read by the rules which the actions change, None for possibly all of them
+ACTION_CHANGES = {"labeled": {"label"}, "unlabeled": {"label"}, "assigned": set(), "unassigned": set()}
+# Fields named in the `changes` of an edited issue
+EDITED_FIELDS = {"title": "title", "body": "text"}
 
 
-def prepare_app():
+def get_config_paths():
     env_conf = os.getenv('GHIA_CONFIG')
     if env_conf is None:
         raise click.BadParameter("GHIA_CONFIG is missing from the environment.")
+    return env_conf.split(":")
 
-    conf_paths = env_conf.split(":")
+
+def read_config(conf_paths):
+    """Reads the config files into one config"""
     config_content = ""
     for path in conf_paths:
         with open(path, 'r') as file:
@@ -27,10 +54,28 @@ def prepare_app():
     config = configparser.ConfigParser()
     config.optionxform = str  # maintain case sensitivity in keys
     config.read_string(config_content)
+    return config
+
+
+def load_patterns(config):
+    """Returns the GhiaPatterns of the web app from the config"""
+    if "patterns" not in config:
+        raise click.BadParameter(GhiaPatterns.CONFIG_VALIDATION_ERR)
+
+    ghia_patterns = GhiaPatterns(config)
+    ghia_patterns.set_strategy('append')
+    return ghia_patterns
+
+
+def prepare_app():
+    config = read_config(get_config_paths())
 
     if "github" not in config or "token" not in config["github"]:
         raise click.BadParameter(GhiaPatterns.CONFIG_VALIDATION_ERR)
 
+    if config["github"].get("backend", "rest") not in BACKENDS:
+        raise click.BadParameter(GhiaPatterns.CONFIG_VALIDATION_ERR)
+
     if "patterns" not in config:
         raise click.BadParameter(GhiaPatterns.CONFIG_VALIDATION_ERR)
 
@@ -43,6 +88,85 @@ def prepare_app():
     return token, secret, config
 
 
+def get_reload_interval(config):
+    """Returns how often the config files are checked for changes, `reload_interval` in the [web] section"""
+    try:
+        interval = config["web"].getfloat("reload_interval", fallback=0) if "web" in config else 0
+    except ValueError:
+        raise click.BadParameter(GhiaPatterns.CONFIG_VALIDATION_ERR)
+
+    if interval < 0:
+        raise click.BadParameter(GhiaPatterns.CONFIG_VALIDATION_ERR)
+    return interval
+
+
+def get_queue_options(config):
+    """Returns (workers, max_depth, coalesce window) of the event queue from the [web] section.
+
+    Returns None if events are not processed asynchronously.
+    """
+    if "web" not in config:
+        return None
+
+    try:
+        if not config["web"].getboolean("async", fallback=False):
+            return None
+        workers = config["web"].getint("workers", fallback=WorkQueue.DEFAULT_WORKERS)
+        max_depth = config["web"].getint("queue_size", fallback=WorkQueue.DEFAULT_MAX_DEPTH)
+        window = config["web"].getfloat("coalesce", fallback=0)
+    except ValueError:
+        raise click.BadParameter(GhiaPatterns.CONFIG_VALIDATION_ERR)
+
+    if workers < 1 or max_depth < 1 or window < 0:
+        raise click.BadParameter(GhiaPatterns.CONFIG_VALIDATION_ERR)
+    return workers, max_depth, window
+
+
+def get_pool_size(config):
+    """Returns the number of connections kept to GitHub, `connections` in the [web] section"""
+    try:
+        pool_size = config["web"].getint("connections", fallback=POOL_SIZE) if "web" in config else POOL_SIZE
+    except ValueError:
+        raise click.BadParameter(GhiaPatterns.CONFIG_VALIDATION_ERR)
+
+    if pool_size < 1:
+        raise click.BadParameter(GhiaPatterns.CONFIG_VALIDATION_ERR)
+    return pool_size
+
+
+def get_reporter_name(config):
+    """Returns the name of the reporter of the evaluated issues, `reporter` in the [web] section"""
+    name = config["web"].get("reporter", "human") if "web" in config else "human"
+    if name not in REPORTERS:
+        raise click.BadParameter(GhiaPatterns.CONFIG_VALIDATION_ERR)
+    return name
+
+
+def get_match_cache_size(config):
+    """Returns the number of issues whose match results are cached, `match_cache` in the [web] section"""
+    try:
+        size = config["web"].getint("match_cache", fallback=MatchCache.SIZE) if "web" in config else MatchCache.SIZE
+    except ValueError:
+        raise click.BadParameter(GhiaPatterns.CONFIG_VALIDATION_ERR)
+
+    if size < 0:
+        raise click.BadParameter(GhiaPatterns.CONFIG_VALIDATION_ERR)
+    return size
+
+
+def changed_fields(data):
+    """Returns the fields read by the rules which the issues event changed, None if it may be all of them"""
+    action = data["action"]
+    if action == "edited" and data.get("changes") is not None:
+        return {EDITED_FIELDS[name] for name in data["changes"] if name in EDITED_FIELDS}
+    return ACTION_CHANGES.get(action)
+
+
+def is_newer_event(old, new):
+    """Tells if the queued (reposlug, issue, patterns, changed) event is at least as recent as the old one"""
+    return (new[1].updated_at or "") >= (old[1].updated_at or "")
+
+
 def prepare_app_test(conf):
     session = conf["session"]
     config = conf["config"]
@@ -51,7 +175,37 @@ def prepare_app_test(conf):
     return token, secret, config, session
 
 
-def create_app(conf):
+class OwnUpdates:
+    """Versions of the issues written by GHIA, to recognize the events its own updates cause.
+
+    A version is (reposlug, number, updated_at) of an update response, the events of one update
+    all carry it. The `size` most recent versions are kept.
+    """
+
+    SIZE = 1000
+
+    def __init__(self, size=SIZE):
+        self.size = size
+        self._versions = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, version):
+        with self._lock:
+            self._versions[version] = None
+            self._versions.move_to_end(version)
+            if len(self._versions) > self.size:
+                self._versions.popitem(last=False)
+
+    def __contains__(self, version):
+        with self._lock:
+            return version in self._versions
+
+
+def create_app(conf, reporter=None):
+    """Creates the webhook app, `reporter` is a name from REPORTERS or a Reporter.
+
+    Without it the reporter is taken from the conf dict or from the [web] section of the config.
+    """
     app = Flask(__name__)
 
     if conf and "test" in conf and conf["test"]:
@@ -60,12 +214,78 @@ def create_app(conf):
         token, secret, config = prepare_app()
         session = None
 
-    ghia_patterns = GhiaPatterns(config)
-    ghia_patterns.set_strategy('append')
-
-    req = GhiaRequests(token, session=session)
+    # Rules are reloaded on SIGHUP and, with reload_interval, when the config files change
+    if conf and conf.get("test"):
+        rules = RulesHolder(load_patterns(config))
+    else:
+        conf_paths = get_config_paths()
+        rules = RulesHolder(load_patterns(config), lambda: load_patterns(read_config(conf_paths)), conf_paths)
+        rules.install_signal_handler()
+        interval = get_reload_interval(config)
+        if interval:
+            rules.watch(interval)
+    app.extensions["ghia_rules"] = rules
+
+    queue_options = get_queue_options(config)
+    pool_size = get_pool_size(config)
+    if queue_options:
+        pool_size = max(pool_size, queue_options[0])
+
+    metrics = WebMetrics(rate_remaining=lambda: req.rate_budget().remaining,
+                         queue_depth=lambda: work_queue.depth() if work_queue else None)
+    app.extensions["ghia_metrics"] = metrics
+
+    if reporter is None:
+        reporter = conf.get("reporter") if conf and conf.get("reporter") else get_reporter_name(config)
+    reporter = get_reporter(reporter)
+    atexit.register(reporter.close)
+    app.extensions["ghia_reporter"] = reporter
+
+    # One pooled session shared by the clients of all repositories and all threads
+    backend = config["github"].get("backend", "rest") if "github" in config else "rest"
+    api_url = config["github"].get("api_url") if "github" in config else None
+    req = BACKENDS[backend](token, session=session, pool_size=pool_size, api_url=api_url, observer=metrics)
+    clients = ClientRegistry(req)
     user = req.get_user()
 
+    # Events re-run only the patterns of the issue fields they change
+    cache_size = get_match_cache_size(config)
+    match_cache = MatchCache(cache_size, metrics.field_evaluations.inc) if cache_size else None
+    own_updates = OwnUpdates()
+
+    def update_issue(event):
+        reposlug, issue, ghia_patterns, changed = event
+        start = time.perf_counter()
+        matched = None
+        if match_cache is not None:
+            matched = match_cache.match(ghia_patterns.engine, (reposlug, issue.number), issue, changed)
+        decision = ghia_patterns.decide(issue, matched)
+        metrics.evaluation_seconds.observe(time.perf_counter() - start)
+
+        result = "skipped"
+        updated_issue = None
+        if decision.changed:
+            updated_issue = clients.get(reposlug).apply_decision(issue, decision, quiet=True)
+            result = "updated" if updated_issue is not None else "failed"
+            if updated_issue is not None and updated_issue.updated_at:
+                own_updates.add((reposlug, issue.number, updated_issue.updated_at))
+        metrics.updates.inc(result)
+        reporter.report(issue, decision, updated_issue, result == "failed")
+
+    # In the async mode events are verified and queued, workers update the issues
+    work_queue = None
+    coalescer = None
+    if queue_options:
+        workers, max_depth, window = queue_options
+        work_queue = WorkQueue(update_issue, workers, max_depth)
+        atexit.register(work_queue.close)
+        if window:
+            # Only the newest event of an issue in the window is processed
+            coalescer = Coalescer(work_queue.submit, window, newer=is_newer_event)
+            atexit.register(coalescer.close)
+    app.extensions["ghia_queue"] = work_queue
+    app.extensions["ghia_coalescer"] = coalescer
+
     def github_verify_request():
         github_signed = request.headers.get('X-Hub-Signature')
         if github_signed is None and secret is None:
@@ -106,12 +326,26 @@ def create_app(conf):
             return "This issue action is ignored."
 
         issue = Issue(data["issue"])
-        req.slug = data["repository"]["full_name"]
-        updated_issue = ghia_patterns.apply_to(issue)
-        if updated_issue:
-            req.update_issue(updated_issue)
-
-        return "Issue update done."
+        reposlug = data["repository"]["full_name"]
+        # Other users may change the issue too, only the events of the version GHIA wrote are echoes
+        if action in ECHO_ACTIONS and (reposlug, issue.number, issue.updated_at) in own_updates:
+            return "Own update is ignored."
+
+        # The event is processed with the rules current when it came, even if they are reloaded meanwhile
+        event = (reposlug, issue, rules.patterns, changed_fields(data))
+        if coalescer is not None:
+            if not coalescer.submit((reposlug, issue.number), event):
+                return "Event queue is closed.", SERVICE_UNAVAILABLE
+            return "Issue update queued.", ACCEPTED
+
+        if work_queue is None:
+            update_issue(event)
+            return "Issue update done."
+
+        # Events of one issue are handled by the same worker in the order they came
+        if not work_queue.submit((reposlug, issue.number), event):
+            return "Event queue is full.", SERVICE_UNAVAILABLE
+        return "Issue update queued.", ACCEPTED
 
     def process_webhook():
         event_type = request.headers.get('X-Github-Event')
@@ -128,12 +362,34 @@ def create_app(conf):
         else:
             return "Event type ignored."
 
+    def observe_delivery(response, seconds):
+        event = request.headers.get('X-Github-Event')
+        event = event if event in KNOWN_EVENTS else "other"
+        data = request.get_json(silent=True)
+        action = data.get("action") if isinstance(data, dict) else None
+        action = action if action in ALLOWED_ACTIONS else "other"
+        status = response[1] if isinstance(response, tuple) else 200
+        metrics.deliveries.inc(event, action, status)
+        metrics.delivery_seconds.observe(seconds, event, action)
+
     @app.route('/', methods=['POST', 'GET'])
     def index():
 
         if request.method == 'POST':
-            return process_webhook()
-
-        return render_template('index.html', user=user, patterns=ghia_patterns)
+            start = time.perf_counter()
+            try:
+                response = process_webhook()
+            except Exception:
+                # Rejected signatures raise, they are counted as the server error they end in
+                observe_delivery(("", INTERNAL_SERVER_ERROR), time.perf_counter() - start)
+                raise
+            observe_delivery(response, time.perf_counter() - start)
+            return response
+
+        return render_template('index.html', user=user, patterns=rules.patterns)
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        return Response(metrics.render(), content_type=WebMetrics.CONTENT_TYPE)
 
     return app
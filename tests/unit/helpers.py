@@ -50,3 +50,138 @@ def betamax_setup():
         # Hide the token in the cassettes
         config.define_cassette_placeholder('<TOKEN>', TOKEN)
     return TOKEN, REPO, USER
+
+
+class FakeResponse:
+    def __init__(self, data, links=None, status_code=200, headers=None, text=''):
+        self.data = data
+        self.links = links or {}
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = text
+
+    def json(self):
+        return self.data
+
+
+class FakeSession:
+    """Session serving a listing of the given number of pages with three issues each, one closed.
+
+    Issue numbers are page * 10 + index, updates of the issues in `fail_updates` are rejected.
+    Listings of the repositories in `fail_repos` fail, organizations have the `org_repos`.
+    The same issues are served by the GraphQL operations of the GraphQL backend, where only
+    the `known_labels` exist in the repository.
+    """
+
+    BASE = 'https://api.github.com/repositories/1/issues'
+
+    def __init__(self, pages, fail_page=None, fail_updates=(), known_labels=("bug",), fail_repos=(), org_repos=()):
+        self.pages = pages
+        self.fail_repos = fail_repos
+        self.org_repos = org_repos
+        self.fail_page = fail_page
+        self.fail_updates = fail_updates
+        self.known_labels = known_labels
+        self.requested = []
+        self.headers = {}
+        self.auth = None
+        self.adapters = {}
+
+    def mount(self, prefix, adapter):
+        self.adapters[prefix] = adapter
+
+    def request(self, method, url, **kwargs):
+        return getattr(self, method.lower())(url, **kwargs)
+
+    def get(self, url, params=None):
+        self.requested.append((url, params))
+        if url.endswith('/user'):
+            return FakeResponse({"login": "tumapav", "html_url": "https://github.com/tumapav", "avatar_url": ""})
+        if '/orgs/' in url:
+            return FakeResponse(list(self.org_repos))
+        if any(f'/repos/{slug}/' in url for slug in self.fail_repos):
+            return FakeResponse(None, status_code=404)
+        page = int(url.split('&page=')[1]) if '&page=' in url else 1
+        if page == self.fail_page:
+            return FakeResponse(None, status_code=500)
+
+        links = {}
+        if page < self.pages:
+            links["next"] = {"url": f"{self.BASE}?per_page=100&page={page + 1}"}
+            links["last"] = {"url": f"{self.BASE}?per_page=100&page={self.pages}"}
+        issues = self.page_issues(page)
+        if '/repos/' in url:
+            for issue in issues:
+                issue["repository_url"] = url.rsplit('/', 1)[0]
+        return FakeResponse(issues, links)
+
+    @staticmethod
+    def page_issues(page):
+        return [dict(get_issue('issue1.json'), number=page * 10 + i, node_id=f"I_{page * 10 + i}",
+                     state="closed" if i == 2 else "open")
+                for i in range(3)]
+
+    @staticmethod
+    def graphql_node(issue):
+        return {
+            "id": issue["node_id"],
+            "number": issue["number"],
+            "title": issue["title"],
+            "body": issue["body"],
+            "url": issue["html_url"],
+            "updatedAt": issue["updated_at"],
+            "labels": {"nodes": [{"name": label["name"]} for label in issue["labels"]]},
+            "assignees": {"nodes": [{"login": user["login"]} for user in issue["assignees"]]},
+        }
+
+    def post(self, url, json=None):
+        self.requested.append((url, json))
+        operation = json["operationName"]
+        variables = json["variables"]
+
+        if operation == "GhiaViewer":
+            data = {"viewer": {"login": "tumapav", "url": "https://github.com/tumapav", "avatarUrl": ""}}
+        elif operation == "GhiaIssues":
+            page = int(variables["cursor"] or 1)
+            if page == self.fail_page:
+                return FakeResponse(None, status_code=502)
+            nodes = [self.graphql_node(issue) for issue in self.page_issues(page) if issue["state"] == "open"]
+            data = {"repository": {"issues": {
+                "pageInfo": {"hasNextPage": page < self.pages, "endCursor": str(page + 1)},
+                "nodes": nodes,
+            }}}
+        elif operation == "GhiaUsers":
+            data = {var: {"id": f"U_{login}"} for var, login in variables.items()}
+        elif operation == "GhiaLabels":
+            data = {"repository": {var: {"id": f"L_{name}"} if name in self.known_labels else None
+                                   for var, name in variables.items() if var not in ("owner", "name")}}
+        elif operation == "GhiaUpdate":
+            data = {}
+            for var, update in variables.items():
+                number = int(update["id"][2:])
+                if number in self.fail_updates:
+                    data["m" + var] = None
+                    continue
+                issue = dict(get_issue('issue1.json'), number=number, node_id=update["id"])
+                if "assigneeIds" in update:
+                    issue["assignees"] = [{"login": user_id[2:]} for user_id in update["assigneeIds"]]
+                if "labelIds" in update:
+                    issue["labels"] = [{"name": label_id[2:]} for label_id in update["labelIds"]]
+                data["m" + var] = {"issue": self.graphql_node(issue)}
+        else:
+            return FakeResponse(None, status_code=400)
+        return FakeResponse({"data": data})
+
+    def patch(self, url, data):
+        self.requested.append((url, data))
+        number = int(url.rsplit('/', 1)[1])
+        if number in self.fail_updates:
+            return FakeResponse(None, status_code=422)
+
+        update = json.loads(data)
+        issue = dict(get_issue('issue1.json'), number=number)
+        if "assignees" in update:
+            issue["assignees"] = [{"login": login} for login in update["assignees"]]
+        if "labels" in update:
+            issue["labels"] = [{"name": name} for name in update["labels"]]
+        return FakeResponse(issue)
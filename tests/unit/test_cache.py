@@ -0,0 +1,88 @@
+from ghia import ghia_cache
+from ghia import ghia_requests
+from tests.unit.helpers import FakeResponse, FakeSession
+import json
+import pytest
+
+
+def text_response(body, status_code=200, headers=None):
+    data = json.loads(body) if body else None
+    response = FakeResponse(data, status_code=status_code, headers=headers, text=body)
+    response.url = "https://api.github.com/repos/octocat/Hello-World/issues"
+    return response
+
+
+@pytest.fixture
+def cache(tmpdir):
+    return ghia_cache.HttpCache(str(tmpdir.join("cache")), max_bytes=10000)
+
+
+def test_key_depends_on_token_and_url():
+    key = ghia_cache.HttpCache.key
+    url = "https://api.github.com/repos/octocat/Hello-World/issues"
+    assert key("a", url) == key("a", url)
+    assert key("a", url) != key("b", url)
+    assert key("a", url, {"page": 2}) == key("a", url + "?page=2")
+    assert key("a", url, {"page": 2}) != key("a", url)
+
+
+def test_store_and_not_modified(cache):
+    key = cache.key("token", "https://example.com")
+    assert cache.conditional_headers(key) == {}
+
+    headers = {"ETag": '"abc"', "Last-Modified": "Wed, 21 Oct 2015 07:28:00 GMT",
+               "Link": '<https://example.com?page=2>; rel="next"'}
+    fresh = text_response('[{"number": 1}]', headers=headers)
+    assert cache.process(key, fresh) is fresh
+    assert cache.conditional_headers(key) == {
+        "If-None-Match": '"abc"',
+        "If-Modified-Since": "Wed, 21 Oct 2015 07:28:00 GMT",
+    }
+
+    cached = cache.process(key, text_response("", 304, headers={"X-RateLimit-Remaining": "42"}))
+    assert cached.status_code == 200
+    assert cached.json() == [{"number": 1}]
+    assert cached.links["next"]["url"] == "https://example.com?page=2"
+    assert cached.headers["X-RateLimit-Remaining"] == "42"
+
+
+def test_no_validators_not_stored(cache):
+    key = cache.key("token", "https://example.com")
+    cache.process(key, text_response("[]"))
+    assert cache.load(key) is None
+
+
+def test_size_cap(cache):
+    body = json.dumps(["x" * 100] * 20)
+    keys = [cache.key("token", f"https://example.com/{i}") for i in range(10)]
+    for i, key in enumerate(keys):
+        cache.process(key, text_response(body, headers={"ETag": f'"{i}"'}))
+
+    stored = [key for key in keys if cache.load(key) is not None]
+    assert 0 < len(stored) < len(keys)
+    assert stored == keys[-len(stored):]
+    assert cache._size <= cache.max_bytes
+
+
+class EtagSession(FakeSession):
+    """Session answering 304 when the request carries the ETag of the page"""
+
+    def __init__(self):
+        super().__init__(pages=1)
+        self.not_modified = 0
+
+    def get(self, url, params=None, headers=None):
+        if (headers or {}).get("If-None-Match") == '"v1"':
+            self.not_modified += 1
+            return text_response("", 304)
+        response = super().get(url, params)
+        return text_response(json.dumps(response.data), headers={"ETag": '"v1"'})
+
+
+def test_requests_use_cache(cache):
+    session = EtagSession()
+    g = ghia_requests.GhiaRequests("token", "octocat/Hello-World", session=session, cache=cache)
+    first = [issue.number for issue in g.get_issues()]
+    second = [issue.number for issue in g.get_issues()]
+    assert first == second == [10, 11]
+    assert session.not_modified == 1
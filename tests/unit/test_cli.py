@@ -1,10 +1,17 @@
 from ghia import ghia_patterns
+from ghia import ghia_requests
 from ghia import cli
-from tests.unit.helpers import fixtures_path
+from ghia import ghia_parallel
+from click.testing import CliRunner
+from tests.unit.helpers import fixtures_path, get_issue, FakeResponse, FakeSession
 import pytest
 import click
 import configparser
 import flexmock
+import json
+import subprocess
+import sys
+import time
 
 
 def get_config_string(name):
@@ -74,3 +81,227 @@ def test_validate_config_file(rules_config_1):
     assert len(res.patterns) == 2
     assert len(res.patterns["tumapav"]) == 5
     assert len(res.patterns["octocat"]) == 1
+
+
+@pytest.mark.parametrize('jobs', ['1', '3'])
+def test_ghia_report_order(monkeypatch, jobs):
+    session = FakeSession(pages=4, fail_updates=(21,))
+    monkeypatch.setattr(ghia_requests.requests, 'Session', lambda: session)
+
+    result = CliRunner().invoke(cli.ghia, [
+        '-a', fixtures_path() + 'credentials.sample.cfg',
+        '-r', fixtures_path() + 'rules.sample2.cfg',
+        '-s', 'change', '--jobs', jobs, 'octocat/Hello-World',
+    ])
+    assert result.exit_code == 0
+    headers = [line.split()[1] for line in result.output.splitlines() if line.startswith('->')]
+    assert headers == [f'octocat/Hello-World#{n}' for n in (10, 11, 20, 21, 30, 31, 40, 41)]
+    assert 'ERROR: Could not update issue octocat/Hello-World#21' in result.output
+    assert result.output.count('   + tumapav') == 7
+
+
+def test_ghia_incremental(monkeypatch, tmpdir):
+    session = FakeSession(pages=2)
+    monkeypatch.setattr(ghia_requests.requests, 'Session', lambda: session)
+    state_file = str(tmpdir.join('state.json'))
+
+    def run(rules, *args):
+        session.requested.clear()
+        result = CliRunner().invoke(cli.ghia, [
+            '-a', fixtures_path() + 'credentials.sample.cfg',
+            '-r', fixtures_path() + rules,
+            '--incremental', '--state-file', state_file, *args, 'octocat/Hello-World',
+        ])
+        assert result.exit_code == 0
+        return session.requested[0][1]
+
+    assert run('rules.sample.cfg') is None
+    assert run('rules.sample.cfg') == {"since": "2011-04-22T13:33:48Z", "sort": "updated", "direction": "asc"}
+    # Changed rules or strategy mean a full run
+    assert run('rules.sample2.cfg') is None
+    assert run('rules.sample2.cfg', '--strategy', 'set') is None
+    assert run('rules.sample2.cfg', '--strategy', 'set') is not None
+
+
+class UpdatedOrderSession(FakeSession):
+    """Session listing open issues two per page, each page is slow to fetch.
+
+    Issues are listed by number, or by `updated_at` with `since`. An update of an issue bumps
+    its `updated_at`, moving it to the end of the incremental listing.
+    """
+
+    def __init__(self, count):
+        super().__init__(pages=1)
+        self.updated = {number: f"2020-01-01T00:00:{number:02}Z" for number in range(1, count + 1)}
+        self.clock = 0
+
+    def get(self, url, params=None):
+        if url.endswith('/user'):
+            return super().get(url, params)
+        self.requested.append((url, params))
+        since = (params or {}).get("since") or (url.split('since=')[1].split('&')[0] if 'since=' in url else '')
+        page = int(url.split('&page=')[1]) if '&page=' in url else 1
+        time.sleep(0.05)
+
+        listed = sorted((updated_at, number) for number, updated_at in self.updated.items() if updated_at >= since)
+        if not since:
+            listed.sort(key=lambda item: item[1])
+        last = max(1, (len(listed) + 1) // 2)
+        links = {}
+        if page < last:
+            links["next"] = {"url": f"{self.BASE}?since={since}&page={page + 1}"}
+            links["last"] = {"url": f"{self.BASE}?since={since}&page={last}"}
+        issues = [dict(get_issue('issue1.json'), number=number, updated_at=updated_at)
+                  for updated_at, number in listed[(page - 1) * 2:page * 2]]
+        return FakeResponse(issues, links)
+
+    def patch(self, url, data):
+        response = super().patch(url, data)
+        self.clock += 1
+        self.updated[response.data["number"]] = response.data["updated_at"] = f"2020-01-02T00:00:{self.clock:02}Z"
+        return response
+
+
+def test_ghia_incremental_updates_do_not_skip(monkeypatch, tmpdir):
+    session = UpdatedOrderSession(8)
+    monkeypatch.setattr(ghia_requests.requests, 'Session', lambda: session)
+    state_file = str(tmpdir.join('state.json'))
+
+    def run():
+        result = CliRunner().invoke(cli.ghia, [
+            '-a', fixtures_path() + 'credentials.sample.cfg',
+            '-r', fixtures_path() + 'rules.sample2.cfg',
+            '--incremental', '--state-file', state_file, 'octocat/Hello-World',
+        ])
+        assert result.exit_code == 0
+        return sorted(int(line.split()[1].split('#')[1]) for line in result.output.splitlines()
+                      if line.startswith('->'))
+
+    assert run() == list(range(1, 9))
+    # All issues were updated after the watermark, the updates of this run move them again
+    assert run() == list(range(1, 9))
+
+
+def test_ghia_multiple_repos(monkeypatch, tmpdir):
+    session = FakeSession(pages=1, fail_repos=('octocat/broken',), org_repos=[
+        {"full_name": "github/one"},
+        {"full_name": "github/archived", "archived": True},
+        {"full_name": "github/no-issues", "has_issues": False},
+    ])
+    monkeypatch.setattr(ghia_requests.requests, 'Session', lambda: session)
+    repos_file = tmpdir.join('repos.txt')
+    repos_file.write('# repositories\noctocat/broken\n\noctocat/Hello-World  # twice\n')
+
+    result = CliRunner().invoke(cli.ghia, [
+        '-a', fixtures_path() + 'credentials.sample.cfg',
+        '-r', fixtures_path() + 'rules.sample2.cfg',
+        '--org', 'github', '--repos-file', str(repos_file), '--repo-jobs', '2',
+        'octocat/Hello-World', 'octocat/Spoon-Knife',
+    ])
+    assert result.exit_code == 10
+    assert 'ERROR: Could not list issues for repository octocat/broken' in result.output
+    headers = [line.split()[1] for line in result.output.splitlines() if line.startswith('->')]
+    assert headers == [f'{slug}#{n}' for slug in ('octocat/Hello-World', 'octocat/Spoon-Knife', 'github/one')
+                       for n in (10, 11)]
+
+
+def test_ghia_no_repos():
+    result = CliRunner().invoke(cli.ghia, [
+        '-a', fixtures_path() + 'credentials.sample.cfg',
+        '-r', fixtures_path() + 'rules.sample2.cfg',
+    ])
+    assert result.exit_code == 2
+    assert "Missing argument 'REPOSLUG'." in result.output
+
+
+def test_ghia_reposlug_usage_and_errors():
+    result = CliRunner().invoke(cli.ghia, ['--help'])
+    assert result.output.startswith('Usage: ghia [OPTIONS] REPOSLUG...')
+
+    result = CliRunner().invoke(cli.ghia, [
+        '-a', fixtures_path() + 'credentials.sample.cfg',
+        '-r', fixtures_path() + 'rules.sample2.cfg',
+        'octocat/Hello-World', 'invalid',
+    ])
+    assert result.exit_code == 2
+    assert "Invalid value for 'REPOSLUG': not in owner/repository format" in result.output
+
+
+def test_cli_does_not_import_flask():
+    code = ("import sys, ghia; assert 'flask' not in sys.modules; "
+            "ghia.create_app; assert 'flask' in sys.modules")
+    subprocess.run([sys.executable, '-c', code], check=True)
+
+
+def test_cli_does_not_import_optional_modules():
+    # Needed only by --workers, --profile and --profile-memory
+    modules = ['multiprocessing', 'concurrent.futures.process', 'cProfile', 'pstats', 'tracemalloc']
+    code = f"import sys, ghia.cli; loaded = [m for m in {modules!r} if m in sys.modules]; assert not loaded, loaded"
+    subprocess.run([sys.executable, '-c', code], check=True)
+
+
+def test_ghia_profile(monkeypatch, tmpdir):
+    session = FakeSession(pages=2)
+    monkeypatch.setattr(ghia_requests.requests, 'Session', lambda: session)
+    profile_path = str(tmpdir.join('run.pstats'))
+
+    result = CliRunner().invoke(cli.ghia, [
+        '-a', fixtures_path() + 'credentials.sample.cfg',
+        '-r', fixtures_path() + 'rules.sample2.cfg',
+        '--profile', profile_path, '--jobs', '2', 'octocat/Hello-World',
+    ])
+    assert result.exit_code == 0
+    assert 'PROFILE' in result.output
+    assert '4 issues evaluated' in result.output
+    assert 'PATCH /repos/{slug}/issues/{number}' in result.output
+    assert tmpdir.join('run.pstats').check()
+
+
+@pytest.mark.parametrize('jobs', ['1', '3'])
+def test_ghia_reporter_jsonl(monkeypatch, jobs):
+    session = FakeSession(pages=4, fail_updates=(21,))
+    monkeypatch.setattr(ghia_requests.requests, 'Session', lambda: session)
+
+    result = CliRunner().invoke(cli.ghia, [
+        '-a', fixtures_path() + 'credentials.sample.cfg',
+        '-r', fixtures_path() + 'rules.sample2.cfg',
+        '-s', 'change', '--jobs', jobs, '--reporter', 'jsonl', 'octocat/Hello-World',
+    ])
+    assert result.exit_code == 0
+    records = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [record["number"] for record in records] == [10, 11, 20, 21, 30, 31, 40, 41]
+    assert [record["number"] for record in records if record["failed"]] == [21]
+    assert sum("tumapav" in record["added"] for record in records) == 7
+
+
+def test_ghia_reporter_summary(monkeypatch):
+    session = FakeSession(pages=2)
+    monkeypatch.setattr(ghia_requests.requests, 'Session', lambda: session)
+
+    result = CliRunner().invoke(cli.ghia, [
+        '-a', fixtures_path() + 'credentials.sample.cfg',
+        '-r', fixtures_path() + 'rules.sample2.cfg',
+        '--reporter', 'summary', 'octocat/Hello-World',
+    ])
+    assert result.exit_code == 0
+    assert '->' not in result.output
+    assert '   4 issues, 4 changed, 0 failed, 0 fallback' in result.output.splitlines()
+
+
+def test_ghia_workers(monkeypatch):
+    session = FakeSession(pages=4, fail_updates=(21,))
+    monkeypatch.setattr(ghia_requests.requests, 'Session', lambda: session)
+    evaluator = ghia_parallel.ProcessEvaluator
+    monkeypatch.setattr(ghia_parallel, 'ProcessEvaluator', lambda patterns, workers: evaluator(
+        patterns, workers, chunk_size=3, min_issues=2))
+
+    def run(*args):
+        return CliRunner().invoke(cli.ghia, [
+            '-a', fixtures_path() + 'credentials.sample.cfg',
+            '-r', fixtures_path() + 'rules.sample2.cfg',
+            '-s', 'change', '--dry-run', *args, 'octocat/Hello-World',
+        ])
+
+    result = run('--workers', '2')
+    assert result.exit_code == 0
+    assert result.output == run().output
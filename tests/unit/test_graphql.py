@@ -0,0 +1,98 @@
+from ghia import ghia_graphql
+from ghia import ghia_issue
+from ghia import ghia_requests
+from ghia import cli
+from click.testing import CliRunner
+from tests.unit.helpers import fixtures_path, get_issue, FakeSession
+import pytest
+
+
+def get_graphql(session):
+    return ghia_graphql.GhiaGraphQL("token", "octocat/Hello-World", session=session)
+
+
+def operations(session):
+    return [json["operationName"] for url, json in session.requested if url.endswith('/graphql')]
+
+
+def test_get_user():
+    user = get_graphql(FakeSession(pages=1)).get_user()
+    assert user["login"] == "tumapav"
+    assert user["html_url"] == "https://github.com/tumapav"
+
+
+def test_get_issues():
+    session = FakeSession(pages=3)
+    issues = get_graphql(session).get_issues()
+    assert [issue.number for issue in issues] == [10, 11, 20, 21, 30, 31]
+    issue = issues[0]
+    assert issue.repo_slug == "octocat/Hello-World"
+    assert issue.node_id == "I_10"
+    assert issue.labels == {"bug"}
+    assert issue.assignees == {"octocat"}
+    assert operations(session) == ["GhiaIssues"] * 3
+
+
+def test_get_issues_since():
+    session = FakeSession(pages=1)
+    get_graphql(session).get_issues(since="2019-01-01T00:00:00Z")
+    assert session.requested[0][1]["variables"]["since"] == "2019-01-01T00:00:00Z"
+
+
+def test_get_issues_fail():
+    with pytest.raises(SystemExit) as e:
+        get_graphql(FakeSession(pages=3, fail_page=2)).get_issues()
+    assert e.value.code == 10
+
+
+def test_update_issues_batch():
+    session = FakeSession(pages=1, fail_updates=(2,))
+    g = get_graphql(session)
+    issues = []
+    for number in (1, 2, 3):
+        issue = ghia_issue.Issue(dict(get_issue('issue1.json'), number=number, node_id=f"I_{number}"))
+        issue.assignees.add("tumapav")
+        issues.append(issue)
+
+    results = g.update_issues(issues)
+    assert results[0].assignees == {"octocat", "tumapav"}
+    assert results[1] is None
+    assert results[2].number == 3
+    assert operations(session) == ["GhiaUsers", "GhiaLabels", "GhiaUpdate"]
+
+    # Node ids are cached
+    g.update_issues(issues[:1])
+    assert operations(session)[3:] == ["GhiaUpdate"]
+
+
+def test_update_issue_unknown_label_uses_rest():
+    session = FakeSession(pages=1)
+    issue = ghia_issue.Issue(dict(get_issue('issue1.json'), node_id="I_5"))
+    issue.labels.add("Need assignment")
+    updated = get_graphql(session).update_issue(issue)
+    assert updated.labels == {"bug", "Need assignment"}
+    assert "GhiaUpdate" not in operations(session)
+    assert session.requested[-1][0].endswith("/issues/1347")
+
+
+def test_backends():
+    assert ghia_graphql.BACKENDS["rest"] is ghia_requests.GhiaRequests
+    assert ghia_graphql.BACKENDS["graphql"] is ghia_graphql.GhiaGraphQL
+
+
+def test_ghia_graphql_backend(monkeypatch):
+    session = FakeSession(pages=4, fail_updates=(21,))
+    monkeypatch.setattr(ghia_requests.requests, 'Session', lambda: session)
+
+    result = CliRunner().invoke(cli.ghia, [
+        '-a', fixtures_path() + 'credentials.sample.cfg',
+        '-r', fixtures_path() + 'rules.sample2.cfg',
+        '-s', 'change', '--backend', 'graphql', 'octocat/Hello-World',
+    ])
+    assert result.exit_code == 0
+    headers = [line.split()[1] for line in result.output.splitlines() if line.startswith('->')]
+    assert headers == [f'octocat/Hello-World#{n}' for n in (10, 11, 20, 21, 30, 31, 40, 41)]
+    assert 'ERROR: Could not update issue octocat/Hello-World#21' in result.output
+    assert result.output.count('   + tumapav') == 7
+    # All updates went out in one batch
+    assert operations(session).count("GhiaUpdate") == 1
@@ -1,4 +1,5 @@
 from ghia import ghia_issue
+import copy
 import json
 import pytest
 import os
@@ -28,3 +29,34 @@ def test_issue_class(issue1_fixture):
     j = json.loads(update_json)
     assert j["labels"] == ['bug']
     assert j["assignees"] == ['octocat']
+
+
+def test_issue_drops_raw_data(issue1_fixture):
+    issue = ghia_issue.Issue(issue1_fixture)
+    assert issue.data is None
+    assert not hasattr(issue, '__dict__')
+
+    raw_issue = ghia_issue.Issue(issue1_fixture, keep_raw=True)
+    assert raw_issue.data is issue1_fixture
+
+
+def test_issue_interns_names(issue1_fixture):
+    first = ghia_issue.Issue(json.loads(json.dumps(issue1_fixture)))
+    second = ghia_issue.Issue(json.loads(json.dumps(issue1_fixture)))
+    assert next(iter(first.labels)) is next(iter(second.labels))
+    assert next(iter(first.assignees)) is next(iter(second.assignees))
+    assert first.repo_slug is second.repo_slug
+
+
+def test_issue_deepcopy(issue1_fixture):
+    issue = ghia_issue.Issue(issue1_fixture)
+    copied = copy.deepcopy(issue)
+    copied.labels.add('other')
+    assert copied.number == issue.number
+    assert issue.labels == {'bug'}
+
+
+def test_issue_update_json_fields(issue1_fixture):
+    issue = ghia_issue.Issue(issue1_fixture)
+    assert json.loads(issue.get_update_json(("labels",))) == {"labels": ["bug"]}
+    assert set(json.loads(issue.get_update_json())) == {"assignees", "labels"}
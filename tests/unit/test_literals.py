@@ -0,0 +1,86 @@
+from ghia import ghia_issue
+from ghia import ghia_literals
+from ghia import ghia_matcher
+from ghia import ghia_patterns
+from tests.unit.helpers import get_config_object, get_issue
+import collections
+import re
+import sys
+import pytest
+
+
+@pytest.mark.parametrize(
+    ['source', 'literal'],
+    [("network", "network"),
+     ("NetWork\\s+tools", "network"),
+     ("crash.*login", "crash"),
+     ("^(network|networking)$", "network"),
+     ("\\bbugs?\\b", "bug"),
+     ("(?:abc)+xyz", "abc"),
+     ("a(?=b)bcd", "abcd"),
+     ("(?>abcd)e", "abcde"),
+     ("x*network", "network"),
+     ("(foo|bar)", None),
+     ("ab.cd", None),
+     ("[a-z]+", None)],
+)
+def test_required_literal(source, literal):
+    assert ghia_literals.required_literal(source) == literal
+
+
+def test_fold_is_not_finer_than_ignorecase():
+    """Characters equal for re.IGNORECASE must fold the same"""
+    groups = collections.defaultdict(set)
+    for code in range(sys.maxunicode + 1):
+        char = chr(code)
+        if char.lower() != char or char.upper() != char or ghia_literals.fold(char) != char:
+            for key in ("l" + char.lower(), "u" + char.upper(), "f" + ghia_literals.fold(char)):
+                groups[key].add(char)
+
+    for group in groups.values():
+        for char in group:
+            regex = re.compile(re.escape(char), re.IGNORECASE)
+            for other in group:
+                if regex.fullmatch(other):
+                    assert ghia_literals.fold(char) == ghia_literals.fold(other), (char, other)
+
+
+def test_fold_text():
+    assert ghia_literals.fold("İSTANBUL ΣΟΦΟΣ ſ K") == "istanbul σοφοσ s k"
+
+
+def test_literal_matcher_overlapping():
+    matcher = ghia_literals.LiteralMatcher(["he", "she", "his", "hers", "network", "net"])
+    assert matcher.find("ushers and a network") == {0, 1, 3, 4, 5}
+    assert matcher.find("xnetx") == {5}
+    assert matcher.find("") == set()
+
+
+@pytest.mark.parametrize('rules', ['rules.sample.cfg', 'rules.sample2.cfg', 'rules.sample3.cfg'])
+def test_engine_prefilter_same_results(rules):
+    g = ghia_patterns.GhiaPatterns(get_config_object(rules))
+    prefiltered = ghia_matcher.RuleEngine(g.patterns, prefilter_min=0)
+    plain = ghia_matcher.RuleEngine(g.patterns, prefilter_min=None)
+    assert any(prefilter is not None for prefilter in prefiltered.prefilters.values())
+
+    issue = ghia_issue.Issue(get_issue('issue1.json'))
+    for title, body in [("Found a bug", "I'm having a problem with this."),
+                        ("NETWORK down", "see http://localhost:8080 PROTOCOL"),
+                        ("ſome ΣΟΦΟΣ", "İ networkK"),
+                        ("", "")]:
+        issue.title, issue.body = title, body
+        assert prefiltered.match(issue) == plain.match(issue)
+
+
+def test_engine_prefilter_skips_absent_literals():
+    patterns = {"anna": [ghia_patterns.Pattern("text:network.*error")],
+                "john": [ghia_patterns.Pattern("text:[0-9]+")]}
+    engine = ghia_matcher.RuleEngine(patterns, prefilter_min=1)
+    assert len(engine.buckets["text"]) == 1
+
+    issue = ghia_issue.Issue(get_issue('issue1.json'))
+    issue.body = "error 42 in the NETWORK error"
+    assert engine.match(issue) == {"anna", "john"}
+    issue.body = "error 42"
+    assert engine.prefilters["text"].candidates([issue.body]) == []
+    assert engine.match(issue) == {"john"}
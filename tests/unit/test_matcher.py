@@ -0,0 +1,254 @@
+from ghia import ghia_matcher
+from ghia import ghia_patterns
+from ghia import ghia_issue
+from tests.unit.helpers import get_config_object, get_issue
+import pytest
+
+
+def naive_match(patterns, issue):
+    """Reference implementation matching every pattern on its own"""
+    return {username for username in patterns
+            if any(pattern.match(issue) for pattern in patterns[username])}
+
+
+@pytest.fixture(params=['issue1.json', 'issue2.empty.json'])
+def issue(request):
+    return ghia_issue.Issue(get_issue(request.param))
+
+
+@pytest.mark.parametrize('rules', ['rules.sample.cfg', 'rules.sample2.cfg', 'rules.sample3.cfg'])
+@pytest.mark.parametrize('bucket_size', [1, 2, 32])
+def test_engine_same_as_patterns(rules, bucket_size, issue):
+    g = ghia_patterns.GhiaPatterns(get_config_object(rules))
+    engine = ghia_matcher.RuleEngine(g.patterns, bucket_size=bucket_size)
+    assert engine.match(issue) == naive_match(g.patterns, issue)
+
+
+@pytest.mark.parametrize(
+    ['res', 'source'],
+    [(True,  "network"),
+     (True,  "^(network|networking)$"),
+     (True,  "(?i:bug)"),
+     (False, "(a)\\1"),
+     (False, "(?P<name>a)"),
+     (False, "(?s)bug.*"),
+     (False, "(?i)bug"),
+     (False, "(?u)bug"),
+     (False, "(a)?(?(1)b|c)")],
+)
+def test_is_combinable(res, source):
+    assert ghia_matcher.is_combinable(source) == res
+
+
+def test_engine_redundant_global_flag():
+    patterns = {
+        "anna": [ghia_patterns.Pattern("title:(?i)FOO")],
+        "john": [ghia_patterns.Pattern("title:bar")],
+    }
+    engine = ghia_matcher.RuleEngine(patterns)
+    assert len(engine.buckets["title"]) == 2
+
+    issue = ghia_issue.Issue(get_issue('issue1.json'))
+    issue.title = "foo bar"
+    assert engine.match(issue) == naive_match(patterns, issue) == {"anna", "john"}
+
+
+def test_engine_falls_back_to_single_buckets(monkeypatch):
+    patterns = {
+        "anna": [ghia_patterns.Pattern("title:(?i)foo")],
+        "john": [ghia_patterns.Pattern("title:bar")],
+    }
+    monkeypatch.setattr(ghia_matcher, 'is_combinable', lambda source: True)
+    engine = ghia_matcher.RuleEngine(patterns)
+    assert [len(bucket.entries) for bucket in engine.buckets["title"]] == [1, 1]
+
+    issue = ghia_issue.Issue(get_issue('issue1.json'))
+    issue.title = "foo bar"
+    assert engine.match(issue) == {"anna", "john"}
+
+
+def test_engine_shared_regex_scanned_once():
+    patterns = {
+        "anna": [ghia_patterns.Pattern("text:problem")],
+        "john": [ghia_patterns.Pattern("any:problem")],
+        "peter": [ghia_patterns.Pattern("title:problem")],
+    }
+    engine = ghia_matcher.RuleEngine(patterns)
+    text_buckets = engine.buckets["text"]
+    assert len(text_buckets) == 1
+    assert len(text_buckets[0].entries) == 1
+    assert text_buckets[0].users == {"anna", "john"}
+
+    issue = ghia_issue.Issue(get_issue('issue1.json'))
+    assert engine.match(issue) == {"anna", "john"}
+
+
+def test_engine_uncombinable_patterns():
+    patterns = {
+        "anna": [ghia_patterns.Pattern("title:(bu)(g)\\2?")],
+        "john": [ghia_patterns.Pattern("title:(?s)found.a")],
+        "peter": [ghia_patterns.Pattern("title:(?P<x>missing)")],
+        "tom": [ghia_patterns.Pattern("title:found")],
+    }
+    engine = ghia_matcher.RuleEngine(patterns)
+    assert len(engine.buckets["title"]) == 4
+
+    issue = ghia_issue.Issue(get_issue('issue1.json'))
+    assert engine.match(issue) == {"anna", "john", "tom"}
+
+
+def test_engine_label_field(issue):
+    patterns = {"anna": [ghia_patterns.Pattern("label:^BUG$")]}
+    engine = ghia_matcher.RuleEngine(patterns)
+    expected = {"anna"} if "bug" in issue.labels else set()
+    assert engine.match_field("label", issue) == expected
+    assert engine.match_field("title", issue) == set()
+
+
+@pytest.mark.parametrize(
+    ['res', 'source'],
+    [(True,  "(a+)+$"),
+     (True,  "(\\w+\\s?)*x"),
+     (True,  "(?:x|y*)+z"),
+     (True,  "(a|aa)+$"),
+     (True,  "(\\w|\\d\\d)+$"),
+     (True,  "(x|.y)*z"),
+     (False, "(foo|bar)+"),
+     (False, "(.|\n)*x"),
+     (False, "^(network|networking)$"),
+     (False, "a+b*.*"),
+     (False, "(ab)+"),
+     (False, "(a+)?"),
+     (False, "(?>a+)+"),
+     (False, "(a++)+")],
+)
+def test_is_risky(res, source):
+    assert ghia_matcher.is_risky(source) == res
+
+
+@pytest.mark.parametrize(
+    ['value', 'cap', 'res'],
+    [("short", 10, "short"),
+     ("abcdef", 3, "abc"),
+     ("žluťoučký", 3, "žl"),
+     ("žluťoučký", 5, "žlu"),
+     ("😀😀", 5, "😀")],
+)
+def test_cap_text(value, cap, res):
+    assert ghia_matcher.cap_text(value, cap) == res
+
+
+def test_engine_text_caps():
+    patterns = {
+        "anna": [ghia_patterns.Pattern("text[5]:word")],
+        "john": [ghia_patterns.Pattern("text:word")],
+        "peter": [ghia_patterns.Pattern("any[20]:word")],
+    }
+    engine = ghia_matcher.RuleEngine(patterns)
+    assert len(engine.buckets["text"]) == 3
+    assert len(engine.buckets["title"]) == 1
+
+    issue = ghia_issue.Issue(get_issue('issue1.json'))
+    issue.title = "nothing"
+    issue.body = "0123456789 word"
+    assert engine.match(issue) == naive_match(patterns, issue) == {"john", "peter"}
+
+
+def test_engine_guard_all():
+    patterns = {
+        "anna": [ghia_patterns.Pattern("text:(\\w|\\d)+$")],
+        "john": [ghia_patterns.Pattern("any:aaa")],
+    }
+    engine = ghia_matcher.RuleEngine(patterns, budget=1)
+    assert not any(isinstance(bucket.regex, ghia_matcher._GuardedRegex) for bucket in engine.buckets["text"])
+
+    engine = ghia_matcher.RuleEngine(patterns, budget=1, guard_all=True)
+    try:
+        assert [bucket.regex.guard for bucket in engine.buckets["text"]] == [engine.guard, engine.guard]
+        assert len(engine.buckets["title"]) == 1
+        assert not isinstance(engine.buckets["title"][0].regex, ghia_matcher._GuardedRegex)
+
+        issue = ghia_issue.Issue(get_issue('issue1.json'))
+        issue.body = "aaaa"
+        assert engine.match(issue) == {"anna", "john"}
+    finally:
+        engine.guard.close()
+
+
+def test_engine_abandons_slow_pattern():
+    patterns = {
+        "anna": [ghia_patterns.Pattern("text:(a+)+$")],
+        "john": [ghia_patterns.Pattern("text:aaa")],
+    }
+    abandoned = []
+    engine = ghia_matcher.RuleEngine(patterns, budget=0.2, abandoned=lambda *args: abandoned.append(args))
+    issue = ghia_issue.Issue(get_issue('issue1.json'))
+    try:
+        issue.body = "a" * 40 + "!"
+        assert engine.match(issue) == {"john"}
+        field, error, reported_issue = abandoned[0]
+        assert (field, error.source, reported_issue) == ("text", "(a+)+$", issue)
+
+        # The guard is started again for the next search
+        issue.body = "aaaa"
+        assert engine.match(issue) == {"anna", "john"}
+        assert len(abandoned) == 1
+    finally:
+        engine.guard.close()
+
+
+class CountingEngine(ghia_matcher.RuleEngine):
+    def __init__(self, patterns):
+        super().__init__(patterns)
+        self.calls = []
+
+    def match_field(self, field, issue, matched=None):
+        self.calls.append(field)
+        return super().match_field(field, issue, matched)
+
+
+@pytest.fixture
+def counting_engine():
+    return CountingEngine(ghia_patterns.GhiaPatterns(get_config_object('rules.sample.cfg')).patterns)
+
+
+def test_match_cache_reuses_unchanged_fields(counting_engine):
+    observed = []
+    cache = ghia_matcher.MatchCache(observe=lambda field, result: observed.append((field, result)))
+    issue = ghia_issue.Issue(get_issue('issue1.json'))
+    expected = counting_engine.match(issue)
+    counting_engine.calls.clear()
+
+    assert cache.match(counting_engine, ("octocat/Hello-World", 1), issue) == expected
+    assert counting_engine.calls == ["title", "text", "label"]
+
+    counting_engine.calls.clear()
+    issue.labels.add("networking")
+    assert cache.match(counting_engine, ("octocat/Hello-World", 1), issue, {"label"}) == expected | {"tumapav"}
+    assert counting_engine.calls == ["label"]
+    assert observed[3:] == [("title", "reused"), ("text", "reused"), ("label", "evaluated")]
+
+    # The body changed though the event did not say so, e.g. an edit merged with a later event
+    counting_engine.calls.clear()
+    issue.body = "protocol"
+    cache.match(counting_engine, ("octocat/Hello-World", 1), issue, set())
+    assert counting_engine.calls == ["text"]
+
+    counting_engine.calls.clear()
+    cache.match(counting_engine, ("octocat/Hello-World", 1), issue, None)
+    assert counting_engine.calls == ["title", "text", "label"]
+
+
+def test_match_cache_size_and_engine(counting_engine):
+    cache = ghia_matcher.MatchCache(size=1)
+    issue = ghia_issue.Issue(get_issue('issue1.json'))
+    cache.match(counting_engine, 1, issue)
+    cache.match(counting_engine, 2, issue)
+    counting_engine.calls.clear()
+    cache.match(counting_engine, 1, issue, set())
+    assert counting_engine.calls == ["title", "text", "label"]
+
+    # Results of other rules are never reused
+    other = CountingEngine(ghia_patterns.GhiaPatterns(get_config_object('rules.sample2.cfg')).patterns)
+    cache.match(other, 1, issue, set())
+    assert other.calls == ["title", "text", "label"]
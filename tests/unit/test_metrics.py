@@ -0,0 +1,30 @@
+from ghia import ghia_metrics
+
+
+def test_counter_and_histogram_render():
+    metrics = ghia_metrics.WebMetrics(rate_remaining=lambda: 4999)
+    metrics.deliveries.inc("issues", "opened", 200)
+    metrics.deliveries.inc("issues", "opened", 200)
+    metrics.evaluation_seconds.observe(0.003)
+    metrics.evaluation_seconds.observe(20)
+    metrics.add_call("PATCH", "https://api.github.com/repos/octocat/Hello-World/issues/7", 200, 0.2)
+
+    text = metrics.render()
+    lines = text.splitlines()
+    assert '# TYPE ghia_webhook_deliveries_total counter' in lines
+    assert 'ghia_webhook_deliveries_total{event="issues",action="opened",status="200"} 2' in lines
+    assert 'ghia_rules_evaluation_seconds_bucket{le="0.001"} 0' in lines
+    assert 'ghia_rules_evaluation_seconds_bucket{le="0.005"} 1' in lines
+    assert 'ghia_rules_evaluation_seconds_bucket{le="10.0"} 1' in lines
+    assert 'ghia_rules_evaluation_seconds_bucket{le="+Inf"} 2' in lines
+    assert 'ghia_rules_evaluation_seconds_count 2' in lines
+    assert 'ghia_github_requests_total{endpoint="PATCH /repos/{slug}/issues/{number}",status="200"} 1' in lines
+    assert 'ghia_github_rate_limit_remaining 4999' in lines
+    # Gauges without a value are left out
+    assert not any(line.startswith('ghia_webhook_queue_depth') for line in lines)
+
+
+def test_label_escaping():
+    counter = ghia_metrics.Counter("c", "help", ("label",))
+    counter.inc('say "hi"\n')
+    assert list(counter.samples()) == [("c", '{label="say \\"hi\\"\\n"}', 1)]
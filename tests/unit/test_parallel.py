@@ -0,0 +1,52 @@
+from ghia import ghia_issue
+from ghia import ghia_parallel
+from ghia import ghia_patterns
+from tests.unit.helpers import get_config_object, get_issue
+import pytest
+
+
+def make_issues(count):
+    issues = []
+    for number in range(count):
+        data = dict(get_issue('issue1.json'), number=number)
+        data["title"] = ["Network error", "Protocol problem", "Docs"][number % 3]
+        data["assignees"] = [] if number % 2 else data["assignees"]
+        issues.append(ghia_issue.Issue(data))
+    return issues
+
+
+@pytest.fixture
+def patterns():
+    g = ghia_patterns.GhiaPatterns(get_config_object('rules.sample.cfg'))
+    g.set_strategy('change')
+    return g
+
+
+def test_records_round_trip(patterns):
+    issue = make_issues(1)[0]
+    copy = ghia_parallel.record_issue(ghia_parallel.issue_record(issue))
+    assert (copy.title, copy.body, copy.labels, copy.assignees) == (issue.title, issue.body, issue.labels,
+                                                                    issue.assignees)
+
+    decision = patterns.decide(issue)
+    assert ghia_parallel.record_decision(ghia_parallel.decision_record(decision)) == decision
+
+
+def test_process_evaluator_same_as_serial(patterns):
+    issues = make_issues(25)
+    evaluator = ghia_parallel.ProcessEvaluator(patterns, workers=2, chunk_size=4, min_issues=10)
+    try:
+        evaluated = list(evaluator.evaluate(issues))
+    finally:
+        evaluator.close()
+
+    assert [issue for issue, _ in evaluated] == issues
+    assert [decision for _, decision in evaluated] == [patterns.decide(issue) for issue in issues]
+
+
+def test_process_evaluator_small_input_is_serial(patterns):
+    issues = make_issues(5)
+    evaluator = ghia_parallel.ProcessEvaluator(patterns, workers=2, min_issues=10)
+    evaluated = list(evaluator.evaluate(issues))
+    assert evaluator._pool is None
+    assert [decision for _, decision in evaluated] == [patterns.decide(issue) for issue in issues]
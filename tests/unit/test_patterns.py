@@ -3,6 +3,7 @@ from ghia import ghia_issue
 from tests.unit.helpers import get_config_object, get_issue
 import pytest
 import click
+import pickle
 
 
 @pytest.fixture
@@ -56,6 +57,18 @@ def test_pattern_error_invalid_regex():
     with pytest.raises(click.BadParameter) as e:
         p = ghia_patterns.Pattern("title:.**")
     assert str(e.value) == "incorrect configuration format"
+    with pytest.raises(click.BadParameter):
+        ghia_patterns.Pattern("title:(?<=a+)b")
+
+
+def test_patterns_compile_lazily(rules_config_1, issue1_fixture):
+    g = ghia_patterns.GhiaPatterns(rules_config_1)
+    assert g._engine is None
+    assert all(p._regex is None for patterns in g.patterns.values() for p in patterns)
+
+    g.decide(ghia_issue.Issue(issue1_fixture))
+    assert g._engine is not None
+    assert g.engine is g._engine
 
 
 @pytest.mark.parametrize(
@@ -180,3 +193,105 @@ def test_apply_patterns_strategy_append_no_match(rules_config_1, issue2_empty):
     assert res is not None
     assert res.assignees == set()
     assert res.labels == set(['Need assignment'])
+
+
+def test_decision_fallback(rules_config_only_fallback, issue2_empty):
+    g = ghia_patterns.GhiaPatterns(rules_config_only_fallback)
+    issue = ghia_issue.Issue(issue2_empty)
+    assert g.decide(issue).fallback == "Need assignment"
+    assert g.decide(issue).labels_added == {"Need assignment"}
+
+    issue.labels.add("Need assignment")
+    assert g.decide(issue).fallback == "Need assignment"
+    assert g.decide(issue).labels_added == set()
+
+
+def test_fingerprint(rules_config_1, rules_config_2):
+    g1 = ghia_patterns.GhiaPatterns(rules_config_1)
+    assert g1.fingerprint() == ghia_patterns.GhiaPatterns(rules_config_1).fingerprint()
+    assert g1.fingerprint() != ghia_patterns.GhiaPatterns(rules_config_2).fingerprint()
+
+    fingerprint = g1.fingerprint()
+    g1.set_strategy("change")
+    assert g1.fingerprint() != fingerprint
+
+
+def test_decide_does_not_copy(rules_config_1, issue1_fixture):
+    g = ghia_patterns.GhiaPatterns(rules_config_1)
+    issue = ghia_issue.Issue(issue1_fixture)
+    assignees, labels = set(issue.assignees), set(issue.labels)
+
+    decision = g.decide(issue)
+    assert (issue.assignees, issue.labels) == (assignees, labels)
+    assert decision.changed == bool(decision.assignees_added or decision.assignees_removed
+                                    or decision.labels_added)
+    assert decision.assignees(issue) == (assignees - decision.assignees_removed) | decision.assignees_added
+
+
+def test_decision_fields(rules_config_only_fallback, issue2_empty):
+    g = ghia_patterns.GhiaPatterns(rules_config_only_fallback)
+    issue = ghia_issue.Issue(issue2_empty)
+    decision = g.decide(issue)
+    assert decision.fields == ("labels",)
+
+    updated = decision.apply(issue)
+    assert updated is not issue
+    assert updated.labels == {"Need assignment"}
+    assert issue.labels == set()
+
+
+def test_pickle_without_engine(rules_config_1):
+    g = ghia_patterns.GhiaPatterns(rules_config_1)
+    g.set_strategy("change")
+    g.engine
+    copy = pickle.loads(pickle.dumps(g))
+    assert copy._engine is None
+    assert copy.fingerprint() == g.fingerprint()
+    issue = ghia_issue.Issue(get_issue('issue1.json'))
+    assert copy.decide(issue) == g.decide(issue)
+
+
+@pytest.mark.parametrize(['text', 'cap'], [("text[4096]:log", 4096), ("any[10]:log", 10), ("text:log", None)])
+def test_pattern_cap(text, cap):
+    assert ghia_patterns.Pattern(text).cap == cap
+
+
+@pytest.mark.parametrize('text', ["title[10]:log", "label[10]:log", "text[0]:log", "text[x]:log", "text[]:log"])
+def test_pattern_cap_invalid(text):
+    with pytest.raises(click.BadParameter):
+        ghia_patterns.Pattern(text)
+
+
+def test_limits(rules_config_1):
+    rules_config_1.read_dict({"limits": {"text_bytes": "100", "budget": "0.5"},
+                              "patterns": {"anna": "text[10]:log\ntitle:log\nany:log"}})
+    g = ghia_patterns.GhiaPatterns(rules_config_1)
+    assert (g.text_bytes, g.budget) == (100, 0.5)
+    assert [pattern.cap for pattern in g.patterns["anna"]] == [10, None, 100]
+    assert [pattern.cap for pattern in g.patterns["tumapav"]] == [None, 100, 100, 100, None]
+    assert g.engine.guard is not None
+    assert g.fingerprint() != ghia_patterns.GhiaPatterns(get_config_object('rules.sample.cfg')).fingerprint()
+
+
+def test_limits_guard_all(rules_config_1):
+    fingerprint = ghia_patterns.GhiaPatterns(rules_config_1).fingerprint()
+    rules_config_1.read_dict({"limits": {"guard_all": "yes"}})
+    g = ghia_patterns.GhiaPatterns(rules_config_1)
+    assert g.guard_all
+    assert g.engine.guard_all
+    assert g.fingerprint() != fingerprint
+
+
+@pytest.mark.parametrize('limits', [{"text_bytes": "-1"}, {"text_bytes": "many"}, {"budget": "-1"},
+                                    {"guard_all": "maybe"}])
+def test_limits_invalid(rules_config_1, limits):
+    rules_config_1.read_dict({"limits": limits})
+    with pytest.raises(click.BadParameter):
+        ghia_patterns.GhiaPatterns(rules_config_1)
+
+
+def test_risky_pattern_warning(rules_config_1, capsys):
+    rules_config_1.read_dict({"patterns": {"anna": "text:(a+)+b"}})
+    ghia_patterns.GhiaPatterns(rules_config_1)
+    assert capsys.readouterr().err == ("WARNING: Pattern text:(a+)+b of anna may backtrack catastrophically, "
+                                       "its searches are abandoned after 1.0 s\n")
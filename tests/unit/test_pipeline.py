@@ -0,0 +1,65 @@
+from ghia import ghia_pipeline
+import pytest
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def test_pipeline_stage_order():
+    stage = ghia_pipeline.pipeline_stage(range(1000), lambda x: x * 2, maxsize=3)
+    assert list(stage) == [x * 2 for x in range(1000)]
+
+
+def test_pipeline_stage_chained():
+    first = ghia_pipeline.pipeline_stage(iter("abc"))
+    second = ghia_pipeline.pipeline_stage(first, str.upper)
+    assert list(second) == ["A", "B", "C"]
+
+
+def test_pipeline_stage_reraises_exit():
+    def source():
+        yield 1
+        exit(10)
+
+    stage = ghia_pipeline.pipeline_stage(ghia_pipeline.pipeline_stage(source()))
+    assert next(stage) == 1
+    with pytest.raises(SystemExit) as e:
+        next(stage)
+    assert e.value.code == 10
+
+
+def test_batch_submitter():
+    calls = []
+
+    def double(items):
+        calls.append(items)
+        return [item * 2 for item in items]
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        batches = ghia_pipeline.BatchSubmitter(executor, double, batch_size=3)
+        futures = [batches.add(i) for i in range(7)]
+        batches.flush()
+        assert [future.result() for future in futures] == [i * 2 for i in range(7)]
+    assert calls == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_pipeline_stage_starts_eagerly():
+    consumed = []
+    ghia_pipeline.pipeline_stage(iter(range(3)), consumed.append)
+    for _ in range(100):
+        if len(consumed) == 3:
+            break
+        time.sleep(0.01)
+    assert consumed == [0, 1, 2]
+
+
+def test_run_ahead():
+    started = []
+
+    def start(item):
+        started.append(item)
+        return item * 2
+
+    results = ghia_pipeline.run_ahead(range(5), start, ahead=3)
+    assert next(results) == (0, 0)
+    assert started == [0, 1, 2]
+    assert list(results) == [(1, 2), (2, 4), (3, 6), (4, 8)]
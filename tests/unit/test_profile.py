@@ -0,0 +1,72 @@
+from ghia import ghia_issue
+from ghia import ghia_patterns
+from ghia import ghia_profile
+from tests.unit.helpers import get_config_object, get_issue
+import pstats
+import pytest
+
+
+@pytest.mark.parametrize(('method', 'url', 'expected'), [
+    ('GET', 'https://api.github.com/user', 'GET /user'),
+    ('GET', 'https://api.github.com/repos/octocat/Hello-World/issues?page=2', 'GET /repos/{slug}/issues'),
+    ('PATCH', 'http://127.0.0.1:8000/repos/octocat/Hello-World/issues/42', 'PATCH /repos/{slug}/issues/{number}'),
+    ('GET', 'https://api.github.com/orgs/github/repos', 'GET /orgs/{org}/repos'),
+])
+def test_endpoint(method, url, expected):
+    assert ghia_profile.endpoint(method, url) == expected
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert ghia_profile.percentile(values, 0.5) == 50
+    assert ghia_profile.percentile(values, 0.99) == 99
+    assert ghia_profile.percentile(values, 1.0) == 100
+    assert ghia_profile.percentile([7], 0.9) == 7
+
+
+def test_profile_patterns_and_summary(capsys):
+    g = ghia_patterns.GhiaPatterns(get_config_object('rules.sample.cfg'))
+    g.set_strategy('append')
+    issue = ghia_issue.Issue(get_issue('issue1.json'))
+    expected = g.decide(issue)
+
+    profile = ghia_profile.RunProfile()
+    profile.instrument(g.engine)
+    profile.start()
+    with profile.phase('evaluate'):
+        assert g.decide(issue) == expected
+    profile.evaluated()
+    profile.add_call('GET', 'https://api.github.com/user', 200, 0.02)
+    profile.finish()
+    profile.print_summary()
+
+    assert profile.patterns
+    err = capsys.readouterr().err
+    assert 'PROFILE' in err
+    assert '1 issues evaluated' in err
+    assert 'GET /user' in err
+    assert 'Most expensive patterns' in err
+
+
+def test_profile_files(tmpdir):
+    cprofile_path = str(tmpdir.join('run.pstats'))
+    memory_path = str(tmpdir.join('memory.txt'))
+    profile = ghia_profile.RunProfile(cprofile_path, memory_path)
+    profile.start()
+    sorted(range(1000), key=str)
+    profile.finish()
+
+    assert pstats.Stats(cprofile_path).total_calls > 0
+    with open(memory_path) as file:
+        assert file.readline().startswith('current ')
+
+
+def test_profile_thread_other_profiler_active(monkeypatch):
+    class ActiveProfile:
+        def enable(self):
+            raise ValueError("Another profiling tool is already active")
+
+    profile = ghia_profile.RunProfile('unused.pstats')
+    monkeypatch.setattr(ghia_profile.cProfile, 'Profile', ActiveProfile)
+    profile._profile_thread()
+    assert profile._profilers == []
@@ -0,0 +1,126 @@
+from ghia import ghia_ratelimit
+from ghia import ghia_requests
+from tests.unit.helpers import FakeResponse, FakeSession
+import pytest
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def rate_headers(remaining, limit=5000, reset=4600):
+    return {
+        "X-RateLimit-Limit": str(limit),
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset": str(reset),
+    }
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def limiter(clock):
+    return ghia_ratelimit.RateLimiter(clock=clock, sleep=clock.sleep)
+
+
+def test_budget_unknown(limiter):
+    assert limiter.budget() == (None, None, None)
+    assert limiter.suggested_workers(8) == 8
+    limiter.acquire()
+
+
+def test_budget_from_headers(limiter, clock):
+    assert limiter.update(FakeResponse(None, headers=rate_headers(4000))) is None
+    assert limiter.budget() == ghia_ratelimit.RateBudget(5000, 4000, 4600.0)
+    assert limiter.suggested_workers(8) == 8
+    limiter.acquire()
+    limiter.acquire()
+    assert clock.slept == []
+
+
+def test_pacing_low_budget(limiter, clock):
+    limiter.update(FakeResponse(None, headers=rate_headers(100, reset=clock.now + 100)))
+    assert limiter.suggested_workers(8) == 1
+    limiter.acquire()
+    limiter.acquire()
+    limiter.acquire()
+    assert len(clock.slept) == 2
+    assert all(0.9 < s < 1.1 for s in clock.slept)
+
+
+def test_exhausted_budget_waits_for_reset(limiter, clock):
+    wait = limiter.update(FakeResponse(None, status_code=403, headers=rate_headers(0, reset=clock.now + 30)))
+    assert wait == 30
+    limiter.acquire()
+    assert clock.slept == [30]
+
+
+def test_retry_after(limiter, clock):
+    assert limiter.update(FakeResponse(None, status_code=429, headers={"Retry-After": "7"})) == 7
+    limiter.acquire()
+    assert clock.slept == [7]
+
+
+def test_retry_after_http_date(limiter, clock):
+    clock.now = 1445412480.0
+    response = FakeResponse(None, status_code=429, headers={"Retry-After": "Wed, 21 Oct 2015 07:28:30 GMT"})
+    assert limiter.update(response) == 30
+
+
+def test_retry_after_invalid_uses_reset(limiter, clock):
+    response = FakeResponse(None, status_code=403, headers={
+        "Retry-After": "soon", "X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "1060"})
+    assert limiter.update(response) == 60
+
+
+def test_secondary_limit_backoff(limiter):
+    secondary = FakeResponse(None, status_code=403, text='{"message": "You have exceeded a secondary rate limit."}')
+    assert limiter.update(secondary) == 60
+    assert limiter.update(secondary) == 120
+    assert limiter.update(FakeResponse(None)) is None
+    assert limiter.update(secondary) == 60
+
+
+def test_forbidden_not_rate_limited(limiter):
+    assert limiter.update(FakeResponse(None, status_code=403, headers=rate_headers(10), text="Forbidden")) is None
+
+
+class LimitedSession(FakeSession):
+    """Session rejecting the first requests with a secondary rate limit"""
+
+    def __init__(self, rejected):
+        super().__init__(pages=1)
+        self.rejected = rejected
+
+    def get(self, url, params=None):
+        if self.rejected:
+            self.rejected -= 1
+            return FakeResponse(None, status_code=403, text="secondary rate limit")
+        return super().get(url, params)
+
+
+def test_requests_retry_rate_limited(clock, limiter):
+    session = LimitedSession(rejected=2)
+    g = ghia_requests.GhiaRequests("token", "octocat/Hello-World", session=session, limiter=limiter)
+    assert len(g.get_issues()) == 2
+    assert clock.slept == [60, 120]
+
+
+def test_requests_give_up_rate_limited(clock, limiter):
+    session = LimitedSession(rejected=10)
+    g = ghia_requests.GhiaRequests("token", "octocat/Hello-World", session=session, limiter=limiter)
+    with pytest.raises(SystemExit):
+        g.get_issues()
+    assert len(clock.slept) == limiter.MAX_RETRIES - 1
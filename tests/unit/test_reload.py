@@ -0,0 +1,106 @@
+from ghia import ghia_patterns
+from ghia import ghia_reload
+from ghia import web
+import os
+import re
+import time
+
+
+RULES = """
+[patterns]
+{user}=
+    title:network
+"""
+
+
+def write_rules(path, content, mtime):
+    path.write(content)
+    os.utime(str(path), (mtime, mtime))
+
+
+def load_from(path):
+    return lambda: web.load_patterns(web.read_config([str(path)]))
+
+
+def test_reload_swaps_rules(tmpdir, capsys):
+    path = tmpdir.join('rules.cfg')
+    write_rules(path, RULES.format(user='alice'), 1000)
+    holder = ghia_reload.RulesHolder(load_from(path)(), load_from(path), [str(path)])
+    old = holder.patterns
+    assert not holder.changed()
+
+    write_rules(path, RULES.format(user='bob'), 2000)
+    assert holder.changed()
+    assert holder.reload()
+    assert list(holder.patterns.patterns) == ['bob']
+    assert list(old.patterns) == ['alice']
+    assert not holder.changed()
+    assert 'Rules reloaded.' in capsys.readouterr().err
+
+
+def test_reload_compiles_rules_and_closes_old(tmpdir):
+    path = tmpdir.join('rules.cfg')
+    write_rules(path, RULES.format(user='alice'), 1000)
+    holder = ghia_reload.RulesHolder(load_from(path)(), load_from(path), [str(path)])
+    old = holder.patterns
+    closed = []
+    old.engine.close = lambda: closed.append(True)
+
+    write_rules(path, RULES.format(user='bob'), 2000)
+    assert holder.reload()
+    assert holder.patterns._engine is not None
+    assert closed == [True]
+
+
+def test_reload_keeps_rules_on_error(tmpdir, capsys):
+    path = tmpdir.join('rules.cfg')
+    write_rules(path, RULES.format(user='alice'), 1000)
+    holder = ghia_reload.RulesHolder(load_from(path)(), load_from(path), [str(path)])
+    old = holder.patterns
+
+    write_rules(path, RULES.format(user='bad user'), 2000)
+    assert not holder.reload()
+    assert holder.patterns is old
+    assert 'Could not reload the rules' in capsys.readouterr().err
+
+    path.remove()
+    assert holder.changed()
+    assert not holder.reload()
+    assert holder.patterns is old
+
+
+def test_reload_keeps_rules_on_compile_error(tmpdir, monkeypatch, capsys):
+    path = tmpdir.join('rules.cfg')
+    write_rules(path, RULES.format(user='alice'), 1000)
+    holder = ghia_reload.RulesHolder(load_from(path)(), load_from(path), [str(path)])
+    old = holder.patterns
+
+    def uncompilable(*args, **kwargs):
+        raise re.error("global flags not at the start of the expression")
+
+    monkeypatch.setattr(ghia_patterns, 'RuleEngine', uncompilable)
+    write_rules(path, RULES.format(user='bob'), 2000)
+    assert not holder.reload()
+    assert holder.patterns is old
+    assert 'keeping the old ones: global flags' in capsys.readouterr().err
+
+
+def test_reload_watch(tmpdir):
+    path = tmpdir.join('rules.cfg')
+    write_rules(path, RULES.format(user='alice'), 1000)
+    holder = ghia_reload.RulesHolder(load_from(path)(), load_from(path), [str(path)])
+    holder.watch(0.01)
+    try:
+        write_rules(path, RULES.format(user='bob'), 2000)
+        for _ in range(200):
+            if 'bob' in holder.patterns.patterns:
+                break
+            time.sleep(0.01)
+        assert list(holder.patterns.patterns) == ['bob']
+    finally:
+        holder.stop()
+
+
+def test_reload_without_loader():
+    holder = ghia_reload.RulesHolder(None)
+    assert not holder.reload()
@@ -0,0 +1,97 @@
+from ghia import ghia_issue
+from ghia import ghia_reporters
+from ghia.ghia_patterns import Decision
+from tests.unit.helpers import get_issue
+import io
+import json
+import pytest
+
+HEADER = "-> octocat/Hello-World#1347 (https://github.com/octocat/Hello-World/issues/1347)\n"
+
+
+@pytest.fixture
+def issue():
+    # Assigned to octocat, labeled bug
+    return ghia_issue.Issue(get_issue('issue1.json'))
+
+
+@pytest.fixture
+def change():
+    return Decision(frozenset(["Alice"]), frozenset(["octocat"]), frozenset(), True)
+
+
+@pytest.fixture
+def fallback():
+    return Decision(frozenset(), frozenset(["octocat"]), frozenset(["Need assignment"]), True, "Need assignment")
+
+
+def test_human(issue, change, capsys):
+    ghia_reporters.HumanReporter().report(issue, change, change.apply(issue))
+    assert capsys.readouterr().out == HEADER + "   + Alice\n   - octocat\n"
+
+
+def test_human_fallback(issue, fallback, capsys):
+    reporter = ghia_reporters.HumanReporter()
+    reporter.report(issue, fallback, fallback.apply(issue))
+    assert capsys.readouterr().out == HEADER + '   FALLBACK: added label "Need assignment"\n   - octocat\n'
+
+    issue.labels.add("Need assignment")
+    reporter.report(issue, fallback._replace(labels_added=frozenset()), fallback.apply(issue))
+    assert capsys.readouterr().out == HEADER + '   FALLBACK: already has label "Need assignment"\n   - octocat\n'
+
+
+def test_human_failed(issue, change, capsys):
+    ghia_reporters.HumanReporter().report(issue, change, None, failed=True)
+    captured = capsys.readouterr()
+    # The failed update shows no difference from the original issue
+    assert captured.out == HEADER + "   = octocat\n"
+    assert captured.err == "   ERROR: Could not update issue octocat/Hello-World#1347\n"
+
+
+def test_jsonl_buffered(issue, change):
+    file = io.StringIO()
+    reporter = ghia_reporters.JsonLinesReporter(file, buffer_size=2, flush_interval=60)
+    reporter.report(issue, change, change.apply(issue))
+    assert file.getvalue() == ""
+
+    reporter.report(issue, change, None, failed=True)
+    reporter.report(issue, change, None)
+    assert len(file.getvalue().splitlines()) == 2
+    reporter.close()
+
+    records = [json.loads(line) for line in file.getvalue().splitlines()]
+    assert len(records) == 3
+    assert records[0] == {
+        "repo": "octocat/Hello-World", "number": 1347, "url": "https://github.com/octocat/Hello-World/issues/1347",
+        "assignees": ["Alice"], "added": ["Alice"], "removed": ["octocat"], "labels_added": [],
+        "fallback": None, "changed": True, "failed": False,
+    }
+    assert records[1]["failed"] is True
+    assert records[1]["assignees"] == ["octocat"]
+
+
+def test_summary(issue, change, fallback, capsys):
+    reporter = ghia_reporters.SummaryReporter()
+    reporter.report(issue, change, change.apply(issue))
+    reporter.report(issue, fallback, fallback.apply(issue))
+    reporter.report(issue, change, None, failed=True)
+    assert capsys.readouterr().out == ""
+
+    reporter.close()
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[1] == "   3 issues, 2 changed, 1 failed, 1 fallback"
+    assert lines[3].split() == ["Alice", "1", "0", "0"]
+    assert lines[4].split() == ["octocat", "0", "2", "1"]
+
+
+def test_quiet(issue, change, capsys):
+    reporter = ghia_reporters.get_reporter("quiet")
+    reporter.report(issue, change, change.apply(issue))
+    reporter.close()
+    assert capsys.readouterr() == ("", "")
+
+
+def test_get_reporter():
+    assert isinstance(ghia_reporters.get_reporter("jsonl"), ghia_reporters.JsonLinesReporter)
+    reporter = ghia_reporters.SummaryReporter()
+    assert ghia_reporters.get_reporter(reporter) is reporter
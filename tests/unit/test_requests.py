@@ -1,8 +1,11 @@
 from ghia import ghia_issue
+from ghia import ghia_patterns
 from ghia import ghia_requests
 import json
 import pytest
-from tests.unit.helpers import betamax_setup, fixtures_path
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tests.unit.helpers import betamax_setup, fixtures_path, FakeSession
 
 
 @pytest.fixture
@@ -106,3 +109,99 @@ def test_get_issues_update_issue(betamax_session):
 
     assert orig_labels_count == len(updated_issue.labels)
     assert orig_assignees_count == len(updated_issue.assignees)
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_get_issues_pages(workers):
+    session = FakeSession(pages=5)
+    g = ghia_requests.GhiaRequests(TOKEN, REPO, session=session)
+    issues = g.get_issues(workers=workers)
+    assert [i.number for i in issues] == [p * 10 + i for p in range(1, 6) for i in range(2)]
+    assert len(session.requested) == 5
+
+
+def test_get_issues_parallel_per_page():
+    session = FakeSession(pages=3)
+    g = ghia_requests.GhiaRequests(TOKEN, REPO, session=session)
+    g.get_issues(workers=2)
+    assert session.requested[0][1] == {"per_page": 100}
+    assert sorted(url for url, _ in session.requested[1:]) == [
+        f"{FakeSession.BASE}?per_page=100&page=2",
+        f"{FakeSession.BASE}?per_page=100&page=3",
+    ]
+
+
+def test_iter_issues_bounded_window():
+    session = FakeSession(pages=20)
+    g = ghia_requests.GhiaRequests(TOKEN, REPO, session=session)
+    issues = g.iter_issues(workers=2)
+    # The two open issues of the first page and of the second one
+    for _ in range(4):
+        next(issues)
+    time.sleep(0.1)
+    # Four pages in flight and one requested in place of the consumed one
+    assert len(session.requested) <= 1 + 4 + 1
+    assert len(list(issues)) == 20 * 2 - 4
+    assert len(session.requested) == 20
+
+
+def test_get_issues_no_shared_default():
+    g = ghia_requests.GhiaRequests(TOKEN, REPO, session=FakeSession(pages=1))
+    assert len(g.get_issues()) == 2
+    assert len(g.get_issues()) == 2
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_get_issues_page_fail(workers):
+    g = ghia_requests.GhiaRequests(TOKEN, REPO, session=FakeSession(pages=4, fail_page=3))
+    with pytest.raises(SystemExit) as e:
+        g.get_issues(workers=workers)
+    assert e.value.code == 10
+
+
+def test_apply_decision_sends_changed_fields():
+    session = FakeSession(pages=1)
+    g = ghia_requests.GhiaRequests(TOKEN, REPO, session=session)
+    issue = g.get_issues()[0]
+    decision = ghia_patterns.Decision(frozenset(), frozenset(), frozenset({"Need assignment"}), True)
+
+    updated = g.apply_decision(issue, decision)
+    url, data = session.requested[-1]
+    assert url.endswith(f"/issues/{issue.number}")
+    assert list(json.loads(data)) == ["labels"]
+    assert set(json.loads(data)["labels"]) == issue.labels | {"Need assignment"}
+    assert "Need assignment" in updated.labels
+
+
+def test_for_repo_shares_session():
+    session = FakeSession(pages=1)
+    g = ghia_requests.GhiaRequests(TOKEN, REPO, session=session)
+    other = g.for_repo('octocat/Spoon-Knife')
+    assert (other.slug, g.slug) == ('octocat/Spoon-Knife', REPO)
+    assert other.session is g.session and other.limiter is g.limiter
+
+    other.get_issues()
+    assert session.requested[-1][0] == 'https://api.github.com/repos/octocat/Spoon-Knife/issues'
+
+
+def test_client_registry():
+    g = ghia_requests.GhiaRequests(TOKEN, REPO, session=FakeSession(pages=1))
+    registry = ghia_requests.ClientRegistry(g)
+    slugs = [f'octocat/repo-{i % 5}' for i in range(100)]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        clients = list(executor.map(registry.get, slugs))
+
+    assert len(registry) == 5
+    assert [client.slug for client in clients] == slugs
+    assert clients[0] is registry.get('octocat/repo-0')
+    assert all(client.session is g.session for client in clients)
+    assert g.slug == REPO
+
+
+def test_api_url():
+    session = FakeSession(pages=1)
+    g = ghia_requests.GhiaRequests(TOKEN, REPO, session=session, api_url='http://127.0.0.1:8000/')
+    g.get_issues()
+    assert session.requested[0][0] == f'http://127.0.0.1:8000/repos/{REPO}/issues'
+    assert g.for_repo('octocat/other').api_url == 'http://127.0.0.1:8000'
@@ -0,0 +1,29 @@
+from ghia import ghia_state
+
+
+def test_state_roundtrip(tmpdir):
+    path = str(tmpdir.join("sub", "state.json"))
+    state = ghia_state.RunState(path)
+    assert state.watermark("octocat/Hello-World", "rules1") is None
+
+    state.set_watermark("octocat/Hello-World", "rules1", "2019-11-30T10:00:00Z")
+    state.save()
+
+    state = ghia_state.RunState(path)
+    assert state.watermark("octocat/Hello-World", "rules1") == "2019-11-30T10:00:00Z"
+    assert state.watermark("octocat/Hello-World", "rules2") is None
+    assert state.watermark("octocat/Other", "rules1") is None
+
+
+def test_state_keeps_watermark_without_issues(tmpdir):
+    state = ghia_state.RunState(str(tmpdir.join("state.json")))
+    state.set_watermark("octocat/Hello-World", "rules1", "2019-11-30T10:00:00Z")
+    state.set_watermark("octocat/Hello-World", "rules1", None)
+    assert state.watermark("octocat/Hello-World", "rules1") == "2019-11-30T10:00:00Z"
+
+
+def test_state_broken_file(tmpdir):
+    path = tmpdir.join("state.json")
+    path.write("{not json")
+    state = ghia_state.RunState(str(path))
+    assert state.repos == {}
@@ -1,6 +1,9 @@
 from ghia import create_app
+from ghia.web import changed_fields
+import click
+import json
 import pytest
-from tests.unit.helpers import betamax_setup, get_config_object
+from tests.unit.helpers import betamax_setup, get_config_object, FakeSession
 
 
 TOKEN, REPO, USER = betamax_setup()
@@ -34,6 +37,18 @@ def test_client_with_secret(betamax_session):
     return app.test_client()
 
 
+@pytest.fixture
+def make_app():
+    """Returns a factory of apps using a FakeSession, the rules.sample3.cfg rules and the given [web] section"""
+    def make(session=None, web=None, secret=None, reporter=None):
+        config = get_config_object('rules.sample3.cfg')
+        if web:
+            config.read_dict({"web": web})
+        return create_app({"test": True, "session": session or FakeSession(pages=1), "config": config,
+                           "TOKEN": TOKEN, "REPO": REPO, "SECRET": secret}, reporter=reporter)
+    return make
+
+
 @pytest.fixture
 def opened_issue():
     return {
@@ -121,6 +136,19 @@ def test_webhook_ping_signature_error_bad_signature_format(test_client_with_secr
     assert str(e.value) == "Signature header has incorrect format."
 
 
+def test_webhook_signature_error_metrics(make_app):
+    client = make_app(secret="test_secret").test_client()
+    res = client.post('/', json={}, headers={'X-GitHub-Event': 'ping', 'X-Hub-Signature': 'test'})
+    assert res.status_code == 500
+    res = client.post('/', json={}, headers={'X-GitHub-Event': 'ping', 'X-Hub-Signature': 'sha1=wrong'})
+    assert res.status_code == 400
+
+    lines = client.get('/metrics').get_data(as_text=True).splitlines()
+    assert 'ghia_webhook_deliveries_total{event="ping",action="other",status="500"} 1' in lines
+    assert 'ghia_webhook_deliveries_total{event="ping",action="other",status="400"} 1' in lines
+    assert 'ghia_webhook_delivery_seconds_count{event="ping",action="other"} 2' in lines
+
+
 def test_webhook_ping_signature_error_unsupported_digest(test_client_with_secret):
     with pytest.raises(ValueError) as e:
         test_client_with_secret.post('/', json={}, headers={'X-GitHub-Event': 'ping',
@@ -155,3 +183,119 @@ def test_webhook_update_issue_ok(test_client, opened_issue):
     text = res.get_data(as_text=True)
     assert text == "Issue update done."
     assert res.status_code == 200
+
+
+def test_webhook_async_update(make_app, opened_issue):
+    session = FakeSession(pages=1)
+    app = make_app(session, web={"async": "true", "workers": "2"})
+    app.config['TESTING'] = True
+
+    res = app.test_client().post('/', json=opened_issue, headers={'X-GitHub-Event': 'issues'})
+    assert res.status_code == 202
+    assert res.get_data(as_text=True) == "Issue update queued."
+
+    app.extensions["ghia_queue"].close()
+    url, data = session.requested[-1]
+    assert url == f"https://api.github.com/repos/{REPO}/issues/7"
+    assert json.loads(data) == {"labels": ["Need assignment"]}
+
+
+def test_webhook_async_bad_config(make_app):
+    with pytest.raises(click.BadParameter):
+        make_app(web={"async": "true", "workers": "none"})
+
+
+def test_webhook_coalesce(make_app, opened_issue):
+    session = FakeSession(pages=1)
+    app = make_app(session, web={"async": "true", "coalesce": "60"})
+    client = app.test_client()
+
+    for action in ("labeled", "edited", "unlabeled"):
+        res = client.post('/', json=dict(opened_issue, action=action), headers={'X-GitHub-Event': 'issues'})
+        assert res.status_code == 202
+
+    app.extensions["ghia_coalescer"].close()
+    app.extensions["ghia_queue"].close()
+    patches = [url for url, _ in session.requested if url.endswith('/issues/7')]
+    assert patches == [f"https://api.github.com/repos/{REPO}/issues/7"]
+
+
+def test_webhook_drop_echo(make_app, opened_issue):
+    session = FakeSession(pages=1)
+    app = make_app(session)
+    client = app.test_client()
+    sender = {"login": "tumapav"}
+
+    def post(updated_at):
+        issue = dict(opened_issue["issue"], updated_at=updated_at)
+        res = client.post('/', json=dict(opened_issue, issue=issue, sender=sender),
+                          headers={'X-GitHub-Event': 'issues'})
+        return res.get_data(as_text=True)
+
+    assert post("2011-04-22T13:00:00Z") == "Issue update done."
+    # The version the update wrote, as in the response of the fake session
+    assert post("2011-04-22T13:33:48Z") == "Own update is ignored."
+    # A later change made by the same user
+    assert post("2011-04-22T14:00:00Z") == "Issue update done."
+    patches = [url for url, _ in session.requested if url.endswith('/issues/7')]
+    assert len(patches) == 2
+
+
+def test_metrics_endpoint(make_app, opened_issue):
+    client = make_app().test_client()
+    client.post('/', json=opened_issue, headers={'X-GitHub-Event': 'issues'})
+    client.post('/', json={}, headers={'X-GitHub-Event': 'ping'})
+
+    res = client.get('/metrics')
+    assert res.status_code == 200
+    assert res.content_type.startswith('text/plain')
+    lines = res.get_data(as_text=True).splitlines()
+    assert 'ghia_webhook_deliveries_total{event="issues",action="labeled",status="200"} 1' in lines
+    assert 'ghia_webhook_deliveries_total{event="ping",action="other",status="200"} 1' in lines
+    assert 'ghia_issue_updates_total{result="updated"} 1' in lines
+    assert 'ghia_rules_evaluation_seconds_count 1' in lines
+    assert 'ghia_github_requests_total{endpoint="PATCH /repos/{slug}/issues/{number}",status="200"} 1' in lines
+
+
+@pytest.mark.parametrize('source', ['config', 'argument'])
+def test_webhook_reporter(make_app, opened_issue, source, capsys):
+    if source == 'config':
+        app = make_app(web={"reporter": "jsonl"})
+    else:
+        app = make_app(reporter="jsonl")
+    app.extensions["ghia_reporter"].flush_interval = 0
+    res = app.test_client().post('/', json=opened_issue, headers={'X-GitHub-Event': 'issues'})
+    assert res.status_code == 200
+
+    record = json.loads(capsys.readouterr().out)
+    assert (record["number"], record["fallback"], record["failed"]) == (7, "Need assignment", False)
+
+
+def test_webhook_bad_reporter(make_app):
+    with pytest.raises(click.BadParameter):
+        make_app(web={"reporter": "fancy"})
+
+
+@pytest.mark.parametrize(
+    ['data', 'changed'],
+    [({"action": "labeled"}, {"label"}),
+     ({"action": "unassigned"}, set()),
+     ({"action": "edited", "changes": {"body": {"from": "x"}}}, {"text"}),
+     ({"action": "edited", "changes": {"title": {"from": "x"}, "body": {"from": "y"}}}, {"title", "text"}),
+     ({"action": "edited"}, None),
+     ({"action": "opened"}, None)],
+)
+def test_changed_fields(data, changed):
+    assert changed_fields(data) == changed
+
+
+def test_webhook_label_event_reuses_matches(make_app, opened_issue):
+    client = make_app().test_client()
+    client.post('/', json=dict(opened_issue, action="opened"), headers={'X-GitHub-Event': 'issues'})
+    client.post('/', json=opened_issue, headers={'X-GitHub-Event': 'issues'})
+
+    lines = client.get('/metrics').get_data(as_text=True).splitlines()
+    assert 'ghia_rules_field_evaluations_total{field="label",result="evaluated"} 2' in lines
+    assert 'ghia_rules_field_evaluations_total{field="text",result="evaluated"} 1' in lines
+    assert 'ghia_rules_field_evaluations_total{field="text",result="reused"} 1' in lines
+    assert 'ghia_rules_field_evaluations_total{field="title",result="reused"} 1' in lines
@@ -0,0 +1,70 @@
+from ghia import ghia_workqueue
+import threading
+import time
+
+
+def test_work_queue_keeps_order_per_key():
+    handled = []
+    lock = threading.Lock()
+
+    def handler(item):
+        with lock:
+            handled.append(item)
+
+    work_queue = ghia_workqueue.WorkQueue(handler, workers=4, max_depth=1000)
+    for i in range(100):
+        assert work_queue.submit(i % 5, (i % 5, i))
+    work_queue.close()
+
+    assert len(handled) == 100
+    for key in range(5):
+        assert [i for k, i in handled if k == key] == list(range(key, 100, 5))
+
+
+def test_work_queue_full():
+    release = threading.Event()
+    work_queue = ghia_workqueue.WorkQueue(lambda item: release.wait(), workers=1, max_depth=2)
+    # The first item is taken by the worker, two more fill the queue
+    assert work_queue.submit('a', 1)
+    while work_queue.depth():
+        pass
+    assert work_queue.submit('a', 2)
+    assert work_queue.submit('a', 3)
+    assert not work_queue.submit('a', 4)
+
+    release.set()
+    work_queue.close()
+    assert work_queue.depth() == 0
+    assert not work_queue.submit('a', 5)
+
+
+def test_work_queue_survives_handler_error(capsys):
+    handled = []
+
+    def handler(item):
+        if item == 1:
+            raise RuntimeError("boom")
+        handled.append(item)
+
+    work_queue = ghia_workqueue.WorkQueue(handler, workers=1)
+    for item in range(3):
+        work_queue.submit('key', item)
+    work_queue.close()
+    assert handled == [0, 2]
+    assert 'Processing of a queued event failed: boom' in capsys.readouterr().err
+
+
+def test_coalescer_keeps_newest():
+    passed = []
+    coalescer = ghia_workqueue.Coalescer(lambda key, item: passed.append((key, item)) or True, window=0.05,
+                                         newer=lambda old, new: new >= old)
+    for item in (1, 3, 2):
+        assert coalescer.submit('a', item)
+    coalescer.submit('b', 1)
+    time.sleep(0.2)
+    assert sorted(passed) == [('a', 3), ('b', 1)]
+
+    coalescer.submit('a', 4)
+    coalescer.close()
+    assert passed[-1] == ('a', 4)
+    assert not coalescer.submit('a', 5)